@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import metrics
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from cache import price_cache
+from database import NAMESPACE_SEP, scoped_name, get_all_alerts, add_alert, remove_alerts, get_portfolio
+from valuation import value_portfolio
+
+logger = logging.getLogger(__name__)
+
+# Two kinds of rule, stored per profile:
+#   {'id', 'kind': 'price', 'token_address', 'symbol', 'direction': 'above'|'below', 'threshold', 'chat_id'}
+#   {'id', 'kind': 'portfolio_drop', 'percent', 'baseline', 'chat_id'}
+# A rule fires once and is then removed. Profile names are the stored
+# (namespaced) names so rules from every user live in one index.
+PRICE = 'price'
+PORTFOLIO_DROP = 'portfolio_drop'
+ABOVE = 'above'
+BELOW = 'below'
+
+stats = {
+    'rules': 0,
+    'evaluations': 0,
+    'fired': 0,
+    'notify_failures': 0,
+    'last_duration': 0.0,
+}
+
+metrics.register_source('alerts', lambda: stats)
+
+class _Thresholds:
+    # Thresholds of one token and direction, kept sorted with the rule ids in
+    # a parallel list so a price tick finds every crossed rule with a single
+    # bisect.
+
+    def __init__(self):
+        self.values = []
+        self.ids = []
+
+    def add(self, threshold, rule_id):
+        index = bisect_right(self.values, threshold)
+        self.values.insert(index, threshold)
+        self.ids.insert(index, rule_id)
+
+    def remove(self, threshold, rule_id):
+        index = bisect_left(self.values, threshold)
+        while index < len(self.values) and self.values[index] == threshold:
+            if self.ids[index] == rule_id:
+                del self.values[index]
+                del self.ids[index]
+                return
+            index += 1
+
+    def take_at_or_below(self, price):
+        index = bisect_right(self.values, price)
+        fired = self.ids[:index]
+        del self.values[:index]
+        del self.ids[:index]
+        return fired
+
+    def take_at_or_above(self, price):
+        index = bisect_left(self.values, price)
+        fired = self.ids[index:]
+        del self.values[index:]
+        del self.ids[index:]
+        return fired
+
+class AlertIndex:
+    # In-memory index over all alert rules. Price rules are grouped by token
+    # address and direction, so evaluating a batch of prices costs
+    # O(log n + fired) per token instead of a scan over every rule.
+    # Portfolio-drop rules are grouped by profile with their trigger values
+    # kept sorted the same way.
+
+    def __init__(self):
+        self.rules = {}
+        self._above = {}
+        self._below = {}
+        self._drops = {}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add(self, profile_name, rule):
+        self.rules[rule['id']] = (profile_name, rule)
+        if rule['kind'] == PRICE:
+            table = self._above if rule['direction'] == ABOVE else self._below
+            table.setdefault(rule['token_address'], _Thresholds()).add(rule['threshold'], rule['id'])
+        elif rule['kind'] == PORTFOLIO_DROP:
+            self._drops.setdefault(profile_name, _Thresholds()).add(drop_trigger(rule), rule['id'])
+
+    def remove(self, rule_id):
+        entry = self.rules.pop(rule_id, None)
+        if entry is None:
+            return None
+        profile_name, rule = entry
+        if rule['kind'] == PRICE:
+            table = self._above if rule['direction'] == ABOVE else self._below
+            thresholds = table.get(rule['token_address'])
+            if thresholds is not None:
+                thresholds.remove(rule['threshold'], rule_id)
+                if not thresholds.values:
+                    del table[rule['token_address']]
+        elif rule['kind'] == PORTFOLIO_DROP:
+            thresholds = self._drops.get(profile_name)
+            if thresholds is not None:
+                thresholds.remove(drop_trigger(rule), rule_id)
+                if not thresholds.values:
+                    del self._drops[profile_name]
+        return entry
+
+    def remove_profile(self, profile_name):
+        # Drops every rule of a deleted profile
+        rule_ids = [rule_id for rule_id, (profile, _) in self.rules.items() if profile == profile_name]
+        for rule_id in rule_ids:
+            self.remove(rule_id)
+        return len(rule_ids)
+
+    def token_addresses(self):
+        return self._above.keys() | self._below.keys()
+
+    def drop_profiles(self):
+        return list(self._drops)
+
+    def _pop_all(self, rule_ids):
+        return [self.rules.pop(rule_id) for rule_id in rule_ids]
+
+    def check_prices(self, prices):
+        # Returns (profile_name, rule, price) for every rule crossed by
+        # `prices`, removing them from the index
+        fired = []
+        for token_address, price in prices.items():
+            if price is None:
+                continue
+            above = self._above.get(token_address)
+            if above is not None and above.values and above.values[0] <= price:
+                fired.extend((profile, rule, price) for profile, rule in self._pop_all(above.take_at_or_below(price)))
+                if not above.values:
+                    del self._above[token_address]
+            below = self._below.get(token_address)
+            if below is not None and below.values and below.values[-1] >= price:
+                fired.extend((profile, rule, price) for profile, rule in self._pop_all(below.take_at_or_above(price)))
+                if not below.values:
+                    del self._below[token_address]
+        return fired
+
+    def check_portfolio(self, profile_name, value):
+        thresholds = self._drops.get(profile_name)
+        if thresholds is None:
+            return []
+        fired = [(profile, rule, value) for profile, rule in self._pop_all(thresholds.take_at_or_above(value))]
+        if not thresholds.values:
+            del self._drops[profile_name]
+        return fired
+
+def drop_trigger(rule):
+    return rule['baseline'] * (1 - rule['percent'] / 100)
+
+def display_name(profile_name):
+    return profile_name.rsplit(NAMESPACE_SEP, 1)[-1]
+
+_index = None
+_load_lock = asyncio.Lock()
+
+async def get_index():
+    # A failed load raises and leaves _index unset, so the next call retries
+    global _index
+    if _index is None:
+        async with _load_lock:
+            if _index is None:
+                index = AlertIndex()
+                for profile_name, rules in (await get_all_alerts()).items():
+                    for rule in rules:
+                        index.add(profile_name, rule)
+                _index = index
+                stats['rules'] = len(index)
+                logger.info(f"Loaded {len(index)} price alerts")
+    return _index
+
+def reset():
+    global _index
+    _index = None
+
+async def watched_token_addresses():
+    return (await get_index()).token_addresses()
+
+def _new_id():
+    return uuid.uuid4().hex[:8]
+
+async def create_price_alert(profile_name, symbol, token_address, threshold, current_price, chat_id, namespace=None):
+    # The direction is whichever side of the current price the threshold is
+    # on, so "notify me when it crosses $X" works both ways
+    rule = {
+        'id': _new_id(),
+        'kind': PRICE,
+        'token_address': token_address,
+        'symbol': symbol,
+        'direction': ABOVE if threshold >= current_price else BELOW,
+        'threshold': threshold,
+        'chat_id': chat_id,
+    }
+    return await _create(profile_name, rule, namespace)
+
+async def create_drop_alert(profile_name, percent, baseline, chat_id, namespace=None):
+    rule = {
+        'id': _new_id(),
+        'kind': PORTFOLIO_DROP,
+        'percent': percent,
+        'baseline': baseline,
+        'chat_id': chat_id,
+    }
+    return await _create(profile_name, rule, namespace)
+
+async def _create(profile_name, rule, namespace):
+    index = await get_index()
+    await add_alert(profile_name, rule, namespace=namespace)
+    index.add(scoped_name(profile_name, namespace), rule)
+    stats['rules'] = len(index)
+    return rule
+
+async def delete_alert(profile_name, rule_id, namespace=None):
+    index = await get_index()
+    removed = await remove_alerts(profile_name, {rule_id}, namespace=namespace)
+    if removed:
+        index.remove(rule_id)
+        stats['rules'] = len(index)
+    return removed
+
+def forget_profile(profile_name, namespace=None):
+    # The storage drops a deleted profile's rules together with the profile;
+    # this drops them from the index so none of them can still fire
+    if _index is None:
+        return 0
+    removed = _index.remove_profile(scoped_name(profile_name, namespace))
+    stats['rules'] = len(_index)
+    return removed
+
+async def delete_asset_alerts(profile_name, symbol, namespace=None):
+    # Price rules on an asset that was removed from the profile go with it
+    index = await get_index()
+    stored_name = scoped_name(profile_name, namespace)
+    rule_ids = {rule_id for rule_id, (profile, rule) in index.rules.items()
+                if profile == stored_name and rule['kind'] == PRICE and rule['symbol'] == symbol}
+    if not rule_ids:
+        return 0
+    await remove_alerts(profile_name, rule_ids, namespace=namespace)
+    for rule_id in rule_ids:
+        index.remove(rule_id)
+    stats['rules'] = len(index)
+    return len(rule_ids)
+
+def describe(rule):
+    if rule['kind'] == PRICE:
+        return f"{rule['symbol']} {rule['direction']} ${rule['threshold']:g}"
+    return f"portfolio drops {rule['percent']:g}% from ${rule['baseline']:.2f}"
+
+def _message(profile_name, rule, value):
+    if rule['kind'] == PRICE:
+        return (f"Alert: {rule['symbol']} is now ${value:g}, {rule['direction']} your "
+                f"${rule['threshold']:g} threshold (profile '{display_name(profile_name)}').")
+    return (f"Alert: portfolio '{display_name(profile_name)}' is now ${value:.2f}, down more than "
+            f"{rule['percent']:g}% from ${rule['baseline']:.2f}.")
+
+async def _portfolio_values(profile_names):
+    # Valued from cached prices only; a profile with an unpriced asset is
+    # skipped rather than reported as a drop
+    values = {}
+    for profile_name in profile_names:
+        portfolio = await get_portfolio(profile_name)
+        token_prices = {asset_data['token_address']: price_cache.peek(asset_data['token_address'])
+                        for asset_data in portfolio.values()}
+        valuation = value_portfolio(portfolio, token_prices)
+        if portfolio and not any(valuation.missing):
+            values[profile_name] = valuation.total
+    return values
+
+async def evaluate(bot, prices):
+    # Called with every batch of fresh prices from the background refresher
+    index = await get_index()
+    started = time.perf_counter()
+    fired = index.check_prices(prices)
+    stats['last_duration'] = time.perf_counter() - started
+    drop_profiles = index.drop_profiles()
+    if drop_profiles:
+        for profile_name, value in (await _portfolio_values(drop_profiles)).items():
+            fired.extend(index.check_portfolio(profile_name, value))
+    stats['evaluations'] += 1
+    stats['rules'] = len(index)
+    if not fired:
+        return 0
+    stats['fired'] += len(fired)
+
+    by_profile = {}
+    for profile_name, rule, _ in fired:
+        by_profile.setdefault(profile_name, set()).add(rule['id'])
+    for profile_name, rule_ids in by_profile.items():
+        try:
+            await remove_alerts(profile_name, rule_ids)
+        except Exception as e:
+            logger.error(f"Error removing fired alerts for profile {profile_name}: {str(e)}")
+
+    if bot is not None:
+        for profile_name, rule, value in fired:
+            try:
+                await bot.send_message(chat_id=rule['chat_id'], text=_message(profile_name, rule, value))
+            except Exception as e:
+                stats['notify_failures'] += 1
+                logger.error(f"Error sending alert {rule['id']}: {str(e)}")
+    logger.info(f"{len(fired)} price alerts fired")
+    return len(fired)
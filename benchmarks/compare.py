@@ -0,0 +1,73 @@
+import argparse
+import json
+
+# Puts the storage operations (the db.* histograms) and scenario latencies of
+# several benchmark reports side by side, e.g. one run per backend:
+#
+#   python -m benchmarks.run --backend sheets --output sheets.json
+#   python -m benchmarks.run --backend sqlite --output sqlite.json
+#   python -m benchmarks.compare sheets.json sqlite.json
+#
+# Reports are only comparable when they were run with the same --assets,
+# --concurrency, --iterations and latency settings; differing settings are
+# listed first.
+
+COMPARED_SETTINGS = ['assets', 'concurrency', 'iterations', 'sheets_latency', 'sheets_quota', 'dex_latency',
+                     'telegram_latency', 'seed']
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare benchmark reports side by side")
+    parser.add_argument('reports', nargs='+', help="Report files written by benchmarks.run")
+    parser.add_argument('--prefix', default='db.', help="Operations from the metrics section to show")
+    return parser.parse_args(argv)
+
+def label(report, path):
+    return f"{report['settings'].get('backend', '?')} ({path})"
+
+def scenario_key(scenario):
+    return (scenario['scenario'], scenario.get('assets'), scenario.get('concurrency'))
+
+def table(title, rows, labels):
+    widths = [max([len(title)] + [len(row[0]) for row in rows])] + [max(14, len(name)) for name in labels]
+    lines = ['  '.join([title.ljust(widths[0])] + [name.rjust(width) for name, width in zip(labels, widths[1:])])]
+    for name, *values in rows:
+        cells = ['-' if value is None else f"{value:.3f}" if isinstance(value, float) else str(value) for value in values]
+        lines.append('  '.join([name.ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(cells, widths[1:])]))
+    return '\n'.join(lines)
+
+def compare(reports, prefix='db.'):
+    # `reports` is a list of (path, report); returns the comparison as text
+    labels = [label(report, path) for path, report in reports]
+    sections = []
+
+    differing = [name for name in COMPARED_SETTINGS
+                 if len({json.dumps(report['settings'].get(name)) for _, report in reports}) > 1]
+    if differing:
+        sections.append("Settings differ, numbers are not directly comparable: " + ', '.join(differing))
+
+    operations = sorted({name for _, report in reports for name in report['metrics'] if name.startswith(prefix)})
+    rows = []
+    for name in operations:
+        for field in ('mean_ms', 'p95_ms'):
+            rows.append([f"{name} {field}"] + [report['metrics'].get(name, {}).get(field) for _, report in reports])
+        rows.append([f"{name} count"] + [report['metrics'].get(name, {}).get('count') for _, report in reports])
+    sections.append(table('operation', rows, labels))
+
+    by_report = [{scenario_key(scenario): scenario for scenario in report['scenarios']} for _, report in reports]
+    rows = []
+    for key in dict.fromkeys(key for scenarios in by_report for key in scenarios):
+        name = ' '.join(str(part) for part in key if part is not None)
+        rows.append([f"{name} p50_ms"] + [scenarios.get(key, {}).get('latency', {}).get('p50_ms') for scenarios in by_report])
+    sections.append(table('scenario', rows, labels))
+    return '\n\n'.join(sections)
+
+def main(argv=None):
+    args = parse_args(argv)
+    reports = []
+    for path in args.reports:
+        with open(path) as f:
+            reports.append((path, json.load(f)))
+    print(compare(reports, args.prefix))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+from aiohttp import web
+import gspread
+from telegram.request import BaseRequest
+
+class FakeWorksheet:
+    # In-memory stand-in for a gspread_asyncio worksheet. Every API call
+    # sleeps for `latency` seconds and counts against a per-minute request
+    # quota; once the quota is used up calls wait for the next window, the
+    # way gspread_asyncio backs off on 429 responses.
+
+    def __init__(self, latency=0.0, quota_per_minute=None, quota_window=60.0):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.quota_window = quota_window
+        self.cells = {}
+        self.calls = Counter()
+        self.throttled = 0
+        self._window_started = time.monotonic()
+        self._window_calls = 0
+
+    async def _request(self, method):
+        self.calls[method] += 1
+        if self.quota_per_minute:
+            now = time.monotonic()
+            if now - self._window_started >= self.quota_window:
+                self._window_started = now
+                self._window_calls = 0
+            if self._window_calls >= self.quota_per_minute:
+                self.throttled += 1
+                await asyncio.sleep(self.quota_window - (now - self._window_started))
+                self._window_started = time.monotonic()
+                self._window_calls = 0
+            self._window_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def cell(self, row, col, *args, **kwargs):
+        await self._request('cell')
+        return gspread.Cell(row, col, self.cells.get((row, col), ''))
+
+    async def range(self, first_row, first_col, last_row, last_col):
+        await self._request('range')
+        return [gspread.Cell(row, col, self.cells.get((row, col), ''))
+                for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
+
+    async def update_cell(self, row, col, value):
+        await self._request('update_cell')
+        self.cells[(row, col)] = value
+
+    async def update_cells(self, cells, *args, **kwargs):
+        await self._request('update_cells')
+        for cell in cells:
+            self.cells[(cell.row, cell.col)] = cell.value
+
+class FakeClientManager:
+    # Replaces AsyncioGspreadClientManager: authorize() returns a client whose
+    # spreadsheet always hands out the same FakeWorksheet
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.client = SimpleNamespace(open_by_key=self._open_by_key)
+
+    async def _open_by_key(self, key):
+        return SimpleNamespace(worksheet=self._worksheet)
+
+    async def _worksheet(self, title):
+        return self.worksheet
+
+    async def authorize(self):
+        return self.client
+
+class DexScreenerStub:
+    # Local HTTP server answering the DexScreener tokens and pairs endpoints
+    # and GeckoTerminal's token price endpoint with one deterministic price
+    # per token. `latency` delays every response; an endpoint named in
+    # `fail_status` ('tokens', 'pairs' or 'token_price') answers with that
+    # HTTP status instead.
+
+    def __init__(self, latency=0.0, listen='127.0.0.1', port=0):
+        self.latency = latency
+        self.listen = listen
+        self.port = port
+        self.fail_status = {}
+        self.requests = Counter()
+        # Client (host, port) pairs seen; a new pair is a new TCP connection
+        self.connections = set()
+        self._stopping = asyncio.Event()
+        self._runner = None
+
+    @staticmethod
+    def price_of(token_address):
+        return round(1 + sum(token_address.encode('utf-8')) % 1000 / 10, 4)
+
+    @classmethod
+    def pair_for(cls, token_address):
+        return {
+            'chainId': 'ethereum',
+            'dexId': 'stub',
+            'pairAddress': f"pair-{token_address}",
+            'baseToken': {'address': token_address, 'symbol': token_address[-6:].upper()},
+            'priceUsd': str(cls.price_of(token_address)),
+            'liquidity': {'usd': 100000},
+            'volume': {'h24': 5000},
+        }
+
+    async def _receive(self, endpoint, request):
+        # Returns the failure response for `endpoint`, if one is set
+        self.requests[endpoint] += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        if self.latency:
+            # Cut short on stop() so a slow response does not hold up shutdown
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.latency)
+            except asyncio.TimeoutError:
+                pass
+        status = self.fail_status.get(endpoint)
+        return web.Response(status=status) if status else None
+
+    async def handle_tokens(self, request):
+        failure = await self._receive('tokens', request)
+        if failure is not None:
+            return failure
+        addresses = request.match_info['addresses'].split(',')
+        return web.json_response({'pairs': [self.pair_for(address) for address in addresses]})
+
+    async def handle_pairs(self, request):
+        failure = await self._receive('pairs', request)
+        if failure is not None:
+            return failure
+        pairs = request.match_info['pairs'].split(',')
+        return web.json_response({'pairs': [self.pair_for(pair[len('pair-'):]) for pair in pairs]})
+
+    async def handle_token_price(self, request):
+        failure = await self._receive('token_price', request)
+        if failure is not None:
+            return failure
+        addresses = request.match_info['addresses'].split(',')
+        token_prices = {address: str(self.price_of(address)) for address in addresses}
+        return web.json_response({'data': {'attributes': {'token_prices': token_prices}}})
+
+    @property
+    def base_url(self):
+        return f"http://{self.listen}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/latest/dex/tokens/{addresses}', self.handle_tokens)
+        app.router.add_get('/latest/dex/pairs/{chain_id}/{pairs}', self.handle_pairs)
+        app.router.add_get('/api/v2/simple/networks/{network}/token_price/{addresses}', self.handle_token_price)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._stopping.set()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+class FakeBot:
+    # Records every Telegram call the handlers make; each call takes
+    # `latency` seconds like a round-trip to the Bot API
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        # (chat_id, text) of every message sent
+        self.sent = []
+        self._message_ids = itertools.count(1)
+
+    async def record(self, method):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def new_message(self, chat_id, text=None):
+        return FakeMessage(self, chat_id, next(self._message_ids), text)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self.record('sendMessage')
+        self.sent.append((chat_id, text))
+        return self.new_message(chat_id, text)
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, message_id, text=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+
+    async def reply_text(self, text, **kwargs):
+        await self.bot.record('sendMessage')
+        self.bot.sent.append((self.chat_id, text))
+        return self.bot.new_message(self.chat_id, text)
+
+class FakeDocument:
+    # An uploaded file; get_file() and download_as_bytearray() skip the
+    # Bot API round trips
+    def __init__(self, file_name, data):
+        self.file_name = file_name
+        self.file_size = len(data)
+        self.data = data
+
+    async def get_file(self):
+        return self
+
+    async def download_as_bytearray(self):
+        return bytearray(self.data)
+
+class FakeCallbackQuery:
+    def __init__(self, bot, message, data):
+        self.bot = bot
+        self.message = message
+        self.inline_message_id = None
+        self.data = data
+
+    async def answer(self, text=None, **kwargs):
+        await self.bot.record('answerCallbackQuery')
+
+    async def edit_message_text(self, text, **kwargs):
+        await self.bot.record('editMessageText')
+        self.message.text = text
+        return self.message
+
+class FakeContext:
+    # The parts of CallbackContext the handlers use; one per simulated user
+    def __init__(self, bot):
+        self.bot = bot
+        self.user_data = {}
+        self.args = []
+
+class FakeUser:
+    # One simulated chat: builds updates for button presses and text messages
+    def __init__(self, bot, user_id, chat_id):
+        self.bot = bot
+        self.context = FakeContext(bot)
+        self.user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=chat_id)
+        self.screen = bot.new_message(chat_id)
+
+    def press(self, data):
+        query = FakeCallbackQuery(self.bot, self.screen, data)
+        return SimpleNamespace(callback_query=query, message=None, effective_message=self.screen,
+                               effective_user=self.user, effective_chat=self.chat)
+
+    def send(self, text):
+        message = self.bot.new_message(self.chat.id, text)
+        return SimpleNamespace(callback_query=None, message=message, effective_message=message,
+                               effective_user=self.user, effective_chat=self.chat)
+
+    def upload(self, file_name, data):
+        update = self.send(None)
+        update.message.document = FakeDocument(file_name, data)
+        return update
+
+BOT_USER = {'id': 999, 'is_bot': True, 'first_name': 'Portfolio', 'username': 'portfolio_bot'}
+
+class FakeTelegramRequest(BaseRequest):
+    # Bot API transport for a real telegram.Bot / Application: every method
+    # is answered locally after `latency` seconds, so updates go through PTB's
+    # own handlers, ConversationHandler and rate limiter. wait_for() resolves
+    # when the bot sends a chat a message containing some text.
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+        self._waiters = []
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def wait_for(self, chat_id, text):
+        # Future resolving to the perf_counter() time of the matching request
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((str(chat_id), text, future))
+        return future
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = self._result(endpoint, parameters)
+        self._notify(parameters)
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+    def _result(self, endpoint, parameters):
+        if endpoint == 'getMe':
+            return BOT_USER
+        chat_id = parameters.get('chat_id')
+        if endpoint.startswith(('send', 'edit')) and chat_id is not None:
+            return {
+                'message_id': parameters.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'private'},
+                'from': BOT_USER,
+                'text': parameters.get('text', ''),
+            }
+        return True
+
+    def _notify(self, parameters):
+        chat_id = str(parameters.get('chat_id'))
+        text = parameters.get('text') or parameters.get('caption') or ''
+        for waiter in list(self._waiters):
+            waiter_chat_id, wanted, future = waiter
+            if waiter_chat_id == chat_id and wanted in text:
+                self._waiters.remove(waiter)
+                if not future.done():
+                    future.set_result(time.perf_counter())
+
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+
+def message_update(update_id, user_id, text):
+    # Update JSON for a private-chat text message; commands get their entity
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': _user(user_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+def callback_update(update_id, user_id, data, message_id=1):
+    # Update JSON for a button press on the bot's message `message_id`
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': 'menu',
+            },
+        },
+    }
+
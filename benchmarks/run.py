@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Runs the real handler flows against local fakes and writes a JSON report:
+#
+#   python -m benchmarks.run                                  # defaults
+#   python -m benchmarks.run --assets 10,100 --concurrency 1,32 --backend sqlite
+#   python -m benchmarks.run --sheets-latency 0.2 --dex-latency 0.15 --output before.json
+#
+# Nothing leaves the machine: Google Sheets is an in-memory worksheet,
+# DexScreener a local HTTP stub and Telegram a recording fake bot. The fake
+# bot is called directly by the handlers, bypassing python-telegram-bot, so
+# the send rate limiter and callback-query semantics are not part of these
+# numbers; tests/test_load.py covers them through a real Application.
+
+USER_ID = 1
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the bot's handler flows")
+    parser.add_argument('--backend', choices=['sheets', 'sqlite'], default='sheets')
+    parser.add_argument('--assets', default='5,50', help="Comma-separated portfolio sizes")
+    parser.add_argument('--concurrency', default='1,16', help="Comma-separated numbers of simultaneous users")
+    parser.add_argument('--iterations', type=int, default=5, help="Rounds per scenario")
+    parser.add_argument('--sheets-latency', type=float, default=0.05, help="Seconds per fake Sheets API call")
+    parser.add_argument('--sheets-quota', type=int, default=0, help="Fake Sheets requests per minute, 0 for unlimited")
+    parser.add_argument('--dex-latency', type=float, default=0.05, help="Seconds per DexScreener stub response")
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help="Seconds per fake Telegram call")
+    parser.add_argument('--pool-tokens', type=int, default=150, help="Tokens per lookup in the connection pool benchmark")
+    parser.add_argument('--alert-rules', type=int, default=20000, help="Rules in the alert evaluation micro-benchmark")
+    parser.add_argument('--valuation-assets', default='10,100,1000,10000',
+                        help="Comma-separated portfolio sizes in the valuation micro-benchmark")
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+def configure_environment(args, workdir):
+    # config.py reads the environment at import time, so this has to run
+    # before any module of the bot is imported
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '0:benchmark',
+        'AUTHORIZED_USER_ID': str(USER_ID),
+        'MULTI_USER': 'false',
+        'STORAGE_BACKEND': args.backend,
+        'SQLITE_DB_PATH': os.path.join(workdir, 'benchmark.db'),
+        'SHEETS_JOURNAL_PATH': os.path.join(workdir, 'sheets_journal.jsonl'),
+        'GOOGLE_SHEET_ID': 'benchmark',
+        'PRICE_HISTORY_DIR': os.path.join(workdir, 'price_history'),
+        'PRICE_SOURCES': 'dexscreener',
+        'PRICE_REFRESH_INTERVAL': '0',
+        'METRICS_PORT': '0',
+    })
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+def time_calls(fn, rounds):
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        # Imported here, after configure_environment()
+        import database
+        import handlers
+        import http_client
+        import metrics
+        import price_fetcher
+        from cache import price_cache
+        from price_sources import DexScreenerSource
+        from token_metadata import metadata_cache
+        from benchmarks.fakes import DexScreenerStub, FakeBot, FakeClientManager, FakeUser, FakeWorksheet
+        self.database = database
+        self.handlers = handlers
+        self.http_client = http_client
+        self.metrics = metrics
+        self.price_fetcher = price_fetcher
+        self.price_cache = price_cache
+        self.metadata_cache = metadata_cache
+        self.FakeUser = FakeUser
+        self.bot = FakeBot(args.telegram_latency)
+        self.dex = DexScreenerStub(args.dex_latency)
+        self.worksheet = None
+        self.DexScreenerSource = DexScreenerSource
+        if args.backend == 'sheets':
+            self.worksheet = FakeWorksheet(args.sheets_latency, args.sheets_quota or None)
+            database.get_storage().agcm = FakeClientManager(self.worksheet)
+
+    async def start(self):
+        await self.dex.start()
+        self.DexScreenerSource.TOKENS_URL = f"{self.dex.base_url}/latest/dex/tokens/"
+        self.DexScreenerSource.PAIRS_URL = f"{self.dex.base_url}/latest/dex/pairs/{{chain_id}}/{{pair_addresses}}"
+        await self.database.prewarm()
+
+    async def stop(self):
+        await self.database.close()
+        await self.http_client.close()
+        await self.dex.stop()
+
+    def counters(self):
+        return {
+            'sheets_calls': dict(self.worksheet.calls) if self.worksheet is not None else {},
+            'sheets_throttled': self.worksheet.throttled if self.worksheet is not None else 0,
+            'dexscreener_requests': dict(self.dex.requests),
+            'dexscreener_connections': len(self.dex.connections),
+            'telegram_calls': dict(self.bot.calls),
+        }
+
+    @staticmethod
+    def delta(before, after):
+        result = {}
+        for key, value in after.items():
+            if isinstance(value, dict):
+                result[key] = {name: count - before[key].get(name, 0) for name, count in value.items()
+                               if count - before[key].get(name, 0)}
+            else:
+                result[key] = value - before[key]
+        return result
+
+    async def make_users(self, assets, concurrency):
+        users = []
+        for i in range(concurrency):
+            profile = f"bench-{assets}-{concurrency}-{i}"
+            if profile not in await self.database.get_profiles():
+                await self.database.create_profile(profile)
+            portfolio = {
+                f"T{assets}X{i}X{n}": {'amount': round(random.uniform(0.1, 100), 4), 'token_address': f"0x{assets:04x}{n:036x}"}
+                for n in range(assets)
+            }
+            await self.database.update_portfolio(profile, portfolio)
+            user = self.FakeUser(self.bot, USER_ID, 100000 + i)
+            user.context.user_data['active_profile'] = profile
+            users.append(user)
+        return users
+
+    async def timed(self, latencies, flow):
+        started = time.perf_counter()
+        await flow
+        latencies.append(time.perf_counter() - started)
+
+    async def flush_writes(self):
+        # Sheets edits wait in the write-behind queue for its flush interval;
+        # flushing them explicitly charges their API calls (and time) to the
+        # scenario that made them. Returns the seconds the flush took.
+        writes = getattr(self.database.get_storage(), '_writes', None)
+        if writes is None:
+            return 0.0
+        started = time.perf_counter()
+        await writes.flush()
+        return time.perf_counter() - started
+
+    async def scenario(self, name, assets, concurrency, make_flow, before_round=None):
+        users = await self.make_users(assets, concurrency)
+        # Setting up the users' portfolios is not part of the scenario
+        await self.flush_writes()
+        latencies = []
+        errors = 0
+        before = self.counters()
+        started = time.perf_counter()
+        for iteration in range(self.args.iterations):
+            if before_round is not None:
+                before_round()
+            results = await asyncio.gather(
+                *(self.timed(latencies, make_flow(user, iteration)) for user in users), return_exceptions=True)
+            errors += sum(1 for result in results if isinstance(result, Exception))
+        flush_seconds = await self.flush_writes()
+        elapsed = time.perf_counter() - started
+        return {
+            'scenario': name,
+            'assets': assets,
+            'concurrency': concurrency,
+            'iterations': self.args.iterations,
+            'errors': errors,
+            'wall_seconds': elapsed,
+            'flush_seconds': flush_seconds,
+            'ops_per_second': len(latencies) / elapsed if elapsed else 0.0,
+            'latency': summarize(latencies),
+            'calls': self.delta(before, self.counters()),
+        }
+
+    def clear_prices(self):
+        self.price_cache.clear()
+        self.metadata_cache.clear()
+
+    def view_portfolio(self, user, iteration):
+        return self.handlers.handle_button(user.press(self.handlers.router.encode('view_portfolio')), user.context)
+
+    def add_asset(self, user, iteration):
+        text = f"NEW{iteration} {iteration + 1} 0xnew{iteration:038x}"
+        return self.handlers.add_asset(user.send(text), user.context)
+
+    def update_amount(self, user, iteration):
+        portfolio_symbol = f"T{self._assets}X{user.chat.id - 100000}X0"
+        user.context.user_data['updating_symbol'] = portfolio_symbol
+        return self.handlers.process_asset_update(user.send(str(iteration + 0.5)), user.context)
+
+    async def run_flows(self):
+        results = []
+        for assets in [int(value) for value in self.args.assets.split(',')]:
+            for concurrency in [int(value) for value in self.args.concurrency.split(',')]:
+                self._assets = assets
+                results.append(await self.scenario('view_portfolio_cold', assets, concurrency, self.view_portfolio,
+                                                   before_round=self.clear_prices))
+                results.append(await self.scenario('view_portfolio_warm', assets, concurrency, self.view_portfolio))
+                results.append(await self.scenario('add_asset', assets, concurrency, self.add_asset))
+                results.append(await self.scenario('update_amount', assets, concurrency, self.update_amount))
+                for result in results[-4:]:
+                    latency = result['latency']
+                    print(f"{result['scenario']:<20} assets={assets:<5} users={concurrency:<4} "
+                          f"p50={latency['p50_ms']:.1f}ms p95={latency['p95_ms']:.1f}ms p99={latency['p99_ms']:.1f}ms errors={result['errors']}")
+        return results
+
+    async def run_http_pool(self):
+        # The same uncached price lookup through a connection pool created
+        # for each round (cold: every request opens a connection) and through
+        # the shared pool kept alive across rounds (warm)
+        results = []
+        tokens = [f"0x{i:040x}" for i in range(self.args.pool_tokens)]
+        for name, cold in (('price_fetch_cold_pool', True), ('price_fetch_warm_pool', False)):
+            if not cold:
+                await self.price_fetcher.fetch_token_prices(tokens)
+            latencies = []
+            before = self.counters()
+            for _ in range(self.args.iterations):
+                self.clear_prices()
+                if cold:
+                    await self.http_client.close()
+                started = time.perf_counter()
+                await self.price_fetcher.fetch_token_prices(tokens)
+                latencies.append(time.perf_counter() - started)
+            result = {'scenario': name, 'tokens': len(tokens), 'iterations': self.args.iterations,
+                      'latency': summarize(latencies), 'calls': self.delta(before, self.counters())}
+            results.append(result)
+            print(f"{name:<22} tokens={len(tokens):<5} p50={result['latency']['p50_ms']:.1f}ms "
+                  f"connections={result['calls']['dexscreener_connections']}")
+        return results
+
+    def run_micro(self):
+        # In-process hot paths, no I/O
+        import alerts
+        results = []
+
+        index = alerts.AlertIndex()
+        tokens = [f"0xtoken{i}" for i in range(max(1, self.args.alert_rules // 25))]
+        for i in range(self.args.alert_rules):
+            index.add('bench', {
+                'id': str(i), 'kind': alerts.PRICE, 'token_address': tokens[i % len(tokens)], 'symbol': 'X',
+                'direction': random.choice([alerts.ABOVE, alerts.BELOW]), 'threshold': random.uniform(0.5, 1.5),
+                'chat_id': 1,
+            })
+        prices = {token: 1.0 for token in tokens}
+        index.check_prices(prices)
+        latencies = []
+        fired = 0
+        for _ in range(20):
+            tick = {token: price * random.uniform(0.999, 1.001) for token, price in prices.items()}
+            started = time.perf_counter()
+            fired += len(index.check_prices(tick))
+            latencies.append(time.perf_counter() - started)
+        results.append({'scenario': 'alerts_check_prices', 'rules': self.args.alert_rules, 'tokens': len(tokens),
+                        'fired': fired, 'latency': summarize(latencies)})
+
+        from valuation import value_portfolio
+        for size in (int(value) for value in self.args.valuation_assets.split(',')):
+            portfolio = {f"T{i}": {'amount': random.uniform(0.1, 100), 'token_address': f"0xvalue{i:034x}"}
+                         for i in range(size)}
+            token_prices = {asset_data['token_address']: random.uniform(0.01, 10) for asset_data in portfolio.values()}
+            # A few unpriced assets so the missing-price path is included
+            for asset_data in list(portfolio.values())[::50]:
+                token_prices[asset_data['token_address']] = None
+            rounds = max(5, min(200, 100000 // size))
+            latency = time_calls(lambda: value_portfolio(portfolio, token_prices), rounds)
+            results.append({'scenario': 'valuation', 'assets': size, 'rounds': rounds, 'latency': latency})
+            print(f"valuation assets={size:<6} p50={latency['p50_ms']:.3f}ms p95={latency['p95_ms']:.3f}ms")
+
+        return results
+
+    async def run_callback_dispatch(self):
+        # CallbackRouter.dispatch() as the handlers register it: decoding the
+        # payload (resolving a hashed argument against the active portfolio's
+        # symbols) and before_dispatch, with the routed handler itself a no-op
+        from callback_router import CallbackRouter
+
+        async def noop(update, context):
+            return None
+
+        handlers = self.handlers
+        router = CallbackRouter(before_dispatch=handlers.router.before_dispatch)
+        router.add_arg_type('profile', handlers.profile_names)
+        router.add_arg_type('symbol', handlers.asset_symbols)
+        for route in handlers.router.routes.values():
+            router.add(route.name, route.code, noop, route.arg, route.states, route.rerender)
+
+        results = []
+        rounds = 2000
+        for assets in [int(value) for value in self.args.assets.split(',')]:
+            user, = await self.make_users(assets, 1)
+            profile = user.context.user_data['active_profile']
+            portfolio = await self.database.get_portfolio(profile)
+            # Long enough that encode() sends a hash of it
+            long_symbol = 'L' * 80
+            portfolio[long_symbol] = {'amount': 1.0, 'token_address': f"0x{assets:04x}{'f' * 36}"}
+            await self.database.update_portfolio(profile, portfolio)
+            await self.flush_writes()
+            for name, symbol in (('callback_dispatch_short', next(iter(portfolio))),
+                                 ('callback_dispatch_hashed', long_symbol)):
+                data = router.encode('update', symbol)
+                update = user.press(data)
+                latencies = []
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    await router.dispatch(update, user.context)
+                    latencies.append(time.perf_counter() - started)
+                assert user.context.args == [symbol]
+                latency = summarize(latencies)
+                results.append({'scenario': name, 'assets': assets, 'payload_bytes': len(data.encode('utf-8')),
+                                'rounds': rounds, 'latency': latency})
+                print(f"{name:<24} assets={assets:<5} p50={latency['p50_ms']:.4f}ms p95={latency['p95_ms']:.4f}ms")
+        return results
+
+async def run(args):
+    bench = Bench(args)
+    await bench.start()
+    try:
+        flows = await bench.run_flows()
+        pool = await bench.run_http_pool()
+        micro = bench.run_micro()
+        callbacks = await bench.run_callback_dispatch()
+    finally:
+        await bench.stop()
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'settings': vars(args),
+        'scenarios': flows + pool + micro + callbacks,
+        'metrics': {
+            operation: {'count': histogram.count, 'mean_ms': histogram.sum / histogram.count * 1000,
+                        'p95_ms': histogram.quantile(0.95) * 1000}
+            for operation, histogram in sorted(bench.metrics._histograms.items()) if histogram.count
+        },
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir)
+        report = asyncio.run(run(args))
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,117 @@
+import asyncio
+import logging
 import time
-from config import CACHE_EXPIRY
+import metrics
+from collections import OrderedDict
+from config import CACHE_EXPIRY, CACHE_MAX_ENTRIES, CACHE_STALE_TTL
 
-class SimpleCache:
-    def __init__(self, expiry=300):
-        self.cache = {}
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    def __init__(self, expiry=300, max_entries=1000, stale_ttl=0):
+        # key -> (value, fresh_until, stale_until), least recently used first
+        self.cache = OrderedDict()
         self.expiry = expiry
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._refreshing = set()
+        self._tasks = set()
+
+    def _lookup(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[2]:
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return entry
 
     def get(self, key):
-        if key in self.cache:
-            if time.time() - self.cache[key]['time'] < self.expiry:
-                return self.cache[key]['value']
+        entry = self._lookup(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
         return None
 
-    def set(self, key, value):
-        self.cache[key] = {'value': value, 'time': time.time()}
+    def get_stale(self, key):
+        # Returns (value, is_fresh); expired values are still served while
+        # they are inside the stale-while-revalidate window.
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        if time.monotonic() < entry[1]:
+            self.hits += 1
+            return entry[0], True
+        self.stale_hits += 1
+        return entry[0], False
+
+    def peek(self, key):
+        # Like get_stale() but without touching the counters or LRU order
+        entry = self.cache.get(key)
+        if entry is None or time.monotonic() >= entry[2]:
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        now = time.monotonic()
+        fresh_until = now + (self.expiry if ttl is None else ttl)
+        self.cache[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self.cache.pop(key, None)
+
+    def clear(self):
+        self.cache.clear()
+
+    def revalidate(self, keys, refresher):
+        # Refresh stale keys in the background; keys already being refreshed
+        # are skipped so a burst of readers triggers a single refresh.
+        keys = [key for key in keys if key not in self._refreshing]
+        if not keys:
+            return None
+        self._refreshing.update(keys)
+        self.refreshes += 1
+
+        async def run():
+            try:
+                await refresher(keys)
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.error(f"Background cache refresh failed: {str(e)}")
+            finally:
+                self._refreshing.difference_update(keys)
+
+        task = asyncio.ensure_future(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'size': len(self.cache),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+        }
 
-price_cache = SimpleCache(CACHE_EXPIRY)
\ No newline at end of file
+price_cache = LRUCache(CACHE_EXPIRY, CACHE_MAX_ENTRIES, CACHE_STALE_TTL)
+metrics.register_source('price_cache', price_cache.stats)
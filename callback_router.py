@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import logging
+import metrics
+import re
+from collections import namedtuple
+from telegram.ext import ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects buttons whose callback_data is longer than this (in bytes)
+CALLBACK_DATA_LIMIT = 64
+HASH_MARK = '#'
+
+# `code` is the short prefix sent to Telegram, `arg` the name of the argument
+# type (or None), `states` the conversation states in which the route is
+# accepted besides the main menu, and `rerender` marks routes that redraw the
+# message they were pressed on.
+Route = namedtuple('Route', ['name', 'code', 'handler', 'arg', 'states', 'rerender'])
+
+def _digest(value):
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=9).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii')
+
+class CallbackRouter:
+    # Maps compact callback payloads ("<code>" or "<code>:<arg>") to handlers
+    # with a single dict lookup on the code. Arguments too long for the 64
+    # byte limit are sent as a hash of the value; the route's argument type
+    # lists the current candidates (the user's profiles, the active
+    # portfolio's symbols, ...) to find the value again, so such buttons keep
+    # working across restarts.
+
+    def __init__(self, before_dispatch=None, on_unknown=None):
+        # before_dispatch(update, context, route) runs ahead of every routed
+        # handler; on_unknown(update, context) handles payloads that do not
+        # resolve, e.g. buttons from an older version of the bot
+        self.before_dispatch = before_dispatch
+        self.on_unknown = on_unknown
+        self.routes = {}
+        self._by_name = {}
+        self._arg_types = {'int': (int, None)}
+
+    def add_arg_type(self, name, candidates):
+        # `candidates(update, context)` returns the values a hashed argument
+        # of this type may stand for
+        self._arg_types[name] = (str, candidates)
+
+    def add(self, name, code, handler, arg=None, states=(), rerender=False):
+        if code in self.routes:
+            raise ValueError(f"Callback code {code} is already used by {self.routes[code].name}")
+        if ':' in code:
+            raise ValueError(f"Callback code {code} cannot contain ':'")
+        if arg is not None and arg not in self._arg_types:
+            raise ValueError(f"Unknown callback argument type: {arg}")
+        route = Route(name, code, handler, arg, tuple(states), rerender)
+        self.routes[code] = route
+        self._by_name[name] = route
+        return route
+
+    def encode(self, name, arg=None):
+        route = self._by_name[name]
+        if route.arg is None:
+            return route.code
+        arg = str(arg)
+        data = f"{route.code}:{arg}"
+        if len(data.encode('utf-8')) > CALLBACK_DATA_LIMIT or arg.startswith(HASH_MARK):
+            data = f"{route.code}:{HASH_MARK}{_digest(arg)}"
+        return data
+
+    async def decode(self, update, context, data):
+        # Returns (route, argument); raises LookupError for payloads that do
+        # not resolve
+        code, _, raw = data.partition(':')
+        route = self.routes.get(code)
+        if route is None:
+            raise LookupError(f"No route for callback data {data!r}")
+        if route.arg is None:
+            return route, None
+        convert, candidates = self._arg_types[route.arg]
+        if raw.startswith(HASH_MARK) and candidates is not None:
+            wanted = raw[len(HASH_MARK):]
+            for candidate in await candidates(update, context):
+                if _digest(candidate) == wanted:
+                    return route, candidate
+            raise LookupError(f"No {route.arg} matches callback data {data!r}")
+        try:
+            return route, convert(raw)
+        except ValueError:
+            raise LookupError(f"Invalid {route.arg} in callback data {data!r}")
+
+    def pattern(self, state=None):
+        # Regex matching the payloads of every route accepted in `state`
+        # (all routes when None), for CallbackQueryHandler registration
+        codes = [route.code for route in self.routes.values() if state is None or state in route.states]
+        return '^(' + '|'.join(re.escape(code) for code in codes) + ')(:|$)'
+
+    def states(self):
+        return {state for route in self.routes.values() for state in route.states}
+
+    async def dispatch(self, update, context):
+        query = update.callback_query
+        try:
+            route, arg = await self.decode(update, context, query.data)
+        except LookupError as e:
+            logger.warning(str(e))
+            if self.on_unknown is not None:
+                return await self.on_unknown(update, context)
+            await query.answer()
+            return ConversationHandler.END
+        # Handlers read the argument like a command argument
+        context.args = [] if arg is None else [arg]
+        if self.before_dispatch is not None:
+            await self.before_dispatch(update, context, route)
+        with metrics.timer(f"callback.{route.name}"):
+            result = await route.handler(update, context)
+        # Navigating to a screen that is not part of a conversation leaves
+        # whatever conversation was in progress
+        return ConversationHandler.END if result is None else result
@@ -1,10 +1,144 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
+class ConfigError(Exception):
+    pass
+
+def _user_id(value):
+    # Telegram user ids are numbers; anything else is kept as given (None when
+    # unset) so that importing config never fails and validate() can say
+    # what is wrong
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value.strip() if isinstance(value, str) else value
+
+# Numeric settings that could not be parsed, {name: (value as given, what
+# was expected)}; they fall back to their default until validate() reports them
+_invalid_numbers = {}
+
+def _number(name, default, parse, expected):
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        _invalid_numbers[name] = (value, expected)
+        return default
+
+def _int(name, default):
+    return _number(name, default, int, 'a whole number')
+
+def _float(name, default):
+    return _number(name, default, float, 'a number')
+
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-AUTHORIZED_USER_ID = int(os.getenv('AUTHORIZED_USER_ID'))
+AUTHORIZED_USER_ID = _user_id(os.getenv('AUTHORIZED_USER_ID'))
+MULTI_USER = os.getenv('MULTI_USER', 'false').lower() in ('1', 'true', 'yes')
+ALLOWED_USER_IDS = {_user_id(user_id) for user_id in os.getenv('ALLOWED_USER_IDS', '').split(',') if user_id.strip()}
+ADMIN_USER_IDS = {_user_id(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
+MAX_CONCURRENT_UPDATES = _int('MAX_CONCURRENT_UPDATES', 64)  # Updates processed in parallel
+TELEGRAM_GLOBAL_RATE = _int('TELEGRAM_GLOBAL_RATE', 30)  # Bot API calls per second across all chats, 0 disables
+TELEGRAM_CHAT_RATE = _int('TELEGRAM_CHAT_RATE', 3)  # Messages per private chat within TELEGRAM_CHAT_RATE_PERIOD
+TELEGRAM_CHAT_RATE_PERIOD = _float('TELEGRAM_CHAT_RATE_PERIOD', 3)
+TELEGRAM_GROUP_RATE = _int('TELEGRAM_GROUP_RATE', 20)  # Messages per group within TELEGRAM_GROUP_RATE_PERIOD
+TELEGRAM_GROUP_RATE_PERIOD = _float('TELEGRAM_GROUP_RATE_PERIOD', 60)
+TELEGRAM_MAX_RETRIES = _int('TELEGRAM_MAX_RETRIES', 3)  # Retries of a request rejected with 429
+PROGRESS_MESSAGE_DELAY = _float('PROGRESS_MESSAGE_DELAY', 1.0)  # Progress replies are skipped if the result is ready sooner
+METRICS_PORT = _int('METRICS_PORT', 0)  # Prometheus /metrics endpoint, 0 disables
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()  # 'polling' or 'webhook'
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Public HTTPS base URL Telegram posts to
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = _int('WEBHOOK_PORT', 8443)
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
 GOOGLE_SHEETS_CRED_FILE = os.getenv('GOOGLE_SHEETS_CRED_FILE')
 GOOGLE_SHEET_ID = os.getenv('GOOGLE_SHEET_ID')
-CACHE_EXPIRY = int(os.getenv('CACHE_EXPIRY', 300))  # Default 5 minutes
\ No newline at end of file
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sheets').lower()  # 'sheets' or 'sqlite'
+SQLITE_DB_PATH = os.getenv('SQLITE_DB_PATH', 'portfolio.db')
+SHEETS_WRITE_BEHIND = os.getenv('SHEETS_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes')
+SHEETS_FLUSH_INTERVAL = _float('SHEETS_FLUSH_INTERVAL', 2)  # Seconds between batched sheet writes
+SHEETS_FLUSH_MAX_PENDING = _int('SHEETS_FLUSH_MAX_PENDING', 50)  # Flush early once this many cells are queued
+SHEETS_JOURNAL_PATH = os.getenv('SHEETS_JOURNAL_PATH', 'sheets_journal.jsonl')
+PROFILE_INDEX_SHARDS = _int('PROFILE_INDEX_SHARDS', 8)  # Profile index cells A1..A<n>; may grow, never shrink
+PROFILE_LOCK_STRIPES = _int('PROFILE_LOCK_STRIPES', 64)
+CACHE_EXPIRY = _int('CACHE_EXPIRY', 300)  # Default 5 minutes
+CACHE_MAX_ENTRIES = _int('CACHE_MAX_ENTRIES', 10000)
+CACHE_STALE_TTL = _int('CACHE_STALE_TTL', 300)  # Serve expired prices this long while refreshing, 0 disables
+TOKEN_METADATA_TTL = _int('TOKEN_METADATA_TTL', 86400)  # How long a token's chosen DexScreener pair is reused
+PRICE_FETCH_CONCURRENCY = _int('PRICE_FETCH_CONCURRENCY', 8)  # Max parallel DexScreener requests
+PRICE_BATCH_SIZE = min(_int('PRICE_BATCH_SIZE', 30), 30)  # DexScreener accepts up to 30 addresses per request
+# Names price_sources.SOURCES registers, listed here so validate() need not
+# import the sources and aiohttp
+PRICE_SOURCE_NAMES = ('dexscreener', 'geckoterminal')
+PRICE_SOURCES = [name.strip() for name in os.getenv('PRICE_SOURCES', 'dexscreener,geckoterminal').split(',') if name.strip()]  # In order of preference
+PRICE_FETCH_TIMEOUT = _float('PRICE_FETCH_TIMEOUT', 4)  # Seconds per upstream request
+PRICE_FETCH_RETRIES = _int('PRICE_FETCH_RETRIES', 2)  # Retries per source on timeouts, 429 and 5xx
+PRICE_RETRY_BACKOFF = _float('PRICE_RETRY_BACKOFF', 0.25)  # Base of the jittered exponential backoff
+PRICE_FETCH_DEADLINE = _float('PRICE_FETCH_DEADLINE', 8)  # Seconds for all sources together
+BREAKER_FAILURE_THRESHOLD = _int('BREAKER_FAILURE_THRESHOLD', 5)  # Consecutive failures that open a source's circuit
+BREAKER_RESET_TIMEOUT = _float('BREAKER_RESET_TIMEOUT', 30)  # Seconds before an open circuit is retried
+GECKOTERMINAL_NETWORK = os.getenv('GECKOTERMINAL_NETWORK', 'eth')  # Network for 0x addresses on GeckoTerminal
+HTTP_POOL_LIMIT = _int('HTTP_POOL_LIMIT', 100)  # Total open connections
+HTTP_POOL_LIMIT_PER_HOST = _int('HTTP_POOL_LIMIT_PER_HOST', 10)
+HTTP_DNS_CACHE_TTL = _int('HTTP_DNS_CACHE_TTL', 300)
+HTTP_KEEPALIVE_TIMEOUT = _float('HTTP_KEEPALIVE_TIMEOUT', 60)
+PRICE_REFRESH_INTERVAL = _int('PRICE_REFRESH_INTERVAL', 60)  # Seconds between background refreshes, 0 disables
+PRICE_REFRESH_MAX_REQUESTS = _int('PRICE_REFRESH_MAX_REQUESTS', 10)  # Upstream requests per refresh cycle
+PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'price_history')
+PRICE_HISTORY_COMPACT_INTERVAL = _int('PRICE_HISTORY_COMPACT_INTERVAL', 3600)  # Seconds between compactions
+IMPORT_MAX_BYTES = _int('IMPORT_MAX_BYTES', 2000000)  # Largest document accepted for a bulk import
+IMPORT_MAX_ROWS = _int('IMPORT_MAX_ROWS', 10000)  # Rows read from one imported document
+
+def validate():
+    # Checks the settings the bot cannot run without, up front, and raises
+    # ConfigError listing every problem at once
+    errors = []
+    if not TELEGRAM_BOT_TOKEN:
+        errors.append("TELEGRAM_BOT_TOKEN is not set")
+    if AUTHORIZED_USER_ID is None or AUTHORIZED_USER_ID == '':
+        errors.append("AUTHORIZED_USER_ID is not set")
+    elif not isinstance(AUTHORIZED_USER_ID, int):
+        errors.append(f"AUTHORIZED_USER_ID must be a numeric Telegram user id, got {AUTHORIZED_USER_ID!r}")
+    for name, user_ids in (('ALLOWED_USER_IDS', ALLOWED_USER_IDS), ('ADMIN_USER_IDS', ADMIN_USER_IDS)):
+        invalid = sorted(str(user_id) for user_id in user_ids if not isinstance(user_id, int))
+        if invalid:
+            errors.append(f"{name} must be a comma-separated list of numeric user ids, got {', '.join(invalid)}")
+
+    if STORAGE_BACKEND == 'sheets':
+        if not GOOGLE_SHEETS_CRED_FILE:
+            errors.append("GOOGLE_SHEETS_CRED_FILE is not set (required with STORAGE_BACKEND=sheets)")
+        elif not os.path.isfile(GOOGLE_SHEETS_CRED_FILE):
+            errors.append(f"GOOGLE_SHEETS_CRED_FILE {GOOGLE_SHEETS_CRED_FILE} does not exist")
+        if not GOOGLE_SHEET_ID:
+            errors.append("GOOGLE_SHEET_ID is not set (required with STORAGE_BACKEND=sheets)")
+    elif STORAGE_BACKEND != 'sqlite':
+        errors.append(f"STORAGE_BACKEND must be 'sheets' or 'sqlite', got {STORAGE_BACKEND!r}")
+
+    if BOT_MODE == 'webhook':
+        if not WEBHOOK_URL.startswith('https://'):
+            errors.append("WEBHOOK_URL must be set to an https:// URL with BOT_MODE=webhook")
+        # Without it anyone who finds the listener can post forged updates
+        if not WEBHOOK_SECRET_TOKEN:
+            errors.append("WEBHOOK_SECRET_TOKEN must be set with BOT_MODE=webhook")
+        elif not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', WEBHOOK_SECRET_TOKEN):
+            errors.append("WEBHOOK_SECRET_TOKEN must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+    elif BOT_MODE != 'polling':
+        errors.append(f"BOT_MODE must be 'polling' or 'webhook', got {BOT_MODE!r}")
+
+    for name, (value, expected) in _invalid_numbers.items():
+        errors.append(f"{name} must be {expected}, got {value!r}")
+
+    if not PRICE_SOURCES:
+        errors.append("PRICE_SOURCES must name at least one price source")
+    unknown = [name for name in PRICE_SOURCES if name not in PRICE_SOURCE_NAMES]
+    if unknown:
+        errors.append(f"Unknown PRICE_SOURCES {', '.join(unknown)}; available: {', '.join(PRICE_SOURCE_NAMES)}")
+
+    if errors:
+        raise ConfigError("Invalid configuration:\n" + "\n".join(f"- {error}" for error in errors))
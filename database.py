@@ -1,112 +1,108 @@
-import json
 import logging
-import traceback
-from google.oauth2.service_account import Credentials
-from gspread_asyncio import AsyncioGspreadClientManager
-import gspread
-from config import GOOGLE_SHEETS_CRED_FILE, GOOGLE_SHEET_ID
+import metrics
+from config import STORAGE_BACKEND, MULTI_USER
+from storage import create_storage
 
 logger = logging.getLogger(__name__)
 
-def get_creds():
-    try:
-        creds = Credentials.from_service_account_file(GOOGLE_SHEETS_CRED_FILE)
-        scoped = creds.with_scopes([
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ])
-        return scoped
-    except Exception as e:
-        logger.error(f"Error loading credentials: {str(e)}")
-        raise
-
-agcm = AsyncioGspreadClientManager(get_creds)
-
-async def get_sheet():
-    try:
-        agc = await agcm.authorize()
-        sheet = await agc.open_by_key(GOOGLE_SHEET_ID)
-        return await sheet.worksheet("Portfolio")
-    except gspread.exceptions.APIError as e:
-        if e.response.status_code == 403:
-            logger.error("Permission denied when accessing Google Sheet. Please check your credentials and sheet permissions.")
-        else:
-            logger.error(f"API Error when accessing Google Sheet: {str(e)}")
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error when accessing Google Sheet: {str(e)}")
-        raise
-
-async def get_profiles():
-    try:
-        sheet = await get_sheet()
-        cell = await sheet.cell(1, 1)
-        cell_value = cell.value if cell else '{}'
-        return json.loads(cell_value)
-    except Exception as e:
-        logger.error(f"Error getting profiles: {str(e)}")
-        return {}
-
-async def update_profiles(profiles):
-    try:
-        sheet = await get_sheet()
-        await sheet.update_cell(1, 1, json.dumps(profiles))
-        logger.info("Profiles updated successfully")
-    except Exception as e:
-        logger.error(f"Error updating profiles: {str(e)}")
-        raise
-
-async def get_portfolio(profile_name):
-    try:
-        sheet = await get_sheet()
-        profiles = await get_profiles()
-        if profile_name not in profiles:
-            return {}
-        cell_address = profiles[profile_name]
-        cell = await sheet.cell(*cell_address)
-        cell_value = cell.value if cell else '{}'
-        return json.loads(cell_value)
-    except Exception as e:
-        logger.error(f"Error getting portfolio for profile {profile_name}: {str(e)}")
-        return {}
-
-async def update_portfolio(profile_name, portfolio):
-    try:
-        sheet = await get_sheet()
-        profiles = await get_profiles()
-        if profile_name not in profiles:
-            raise ValueError(f"Profile {profile_name} does not exist")
-        cell_address = profiles[profile_name]
-        await sheet.update_cell(*cell_address, json.dumps(portfolio))
-        logger.info(f"Portfolio for profile {profile_name} updated successfully")
-    except Exception as e:
-        logger.error(f"Error updating portfolio for profile {profile_name}: {str(e)}")
-        raise
-
-async def create_profile(profile_name):
-    try:
-        profiles = await get_profiles()
-        if profile_name in profiles:
-            raise ValueError(f"Profile {profile_name} already exists")
-        sheet = await get_sheet()
-        next_row = len(profiles) * 2 + 3  # Assuming we use odd rows for profiles
-        profiles[profile_name] = [next_row, 2]  # Column 2 for portfolio data
-        await update_profiles(profiles)
-        await sheet.update_cell(next_row, 2, '{}')  # Initialize empty portfolio
-        logger.info(f"Profile {profile_name} created successfully")
-    except Exception as e:
-        logger.error(f"Error creating profile {profile_name}: {str(e)}")
-        raise
-
-async def delete_profile(profile_name):
-    try:
-        profiles = await get_profiles()
-        if profile_name not in profiles:
-            raise ValueError(f"Profile {profile_name} does not exist")
-        del profiles[profile_name]
-        await update_profiles(profiles)
-        logger.info(f"Profile {profile_name} deleted successfully")
-    except Exception as e:
-        logger.error(f"Error deleting profile {profile_name}: {str(e)}")
-        raise
\ No newline at end of file
+# Module-level entry points used by the handlers. They delegate to the backend
+# selected with STORAGE_BACKEND, created on first use.
+#
+# In multi-user mode each user's profiles are stored as "<namespace>::<name>";
+# namespace None is the original, un-prefixed set of profiles.
+NAMESPACE_SEP = '::'
+
+_storage = None
+
+def scoped_name(profile_name, namespace=None):
+    if namespace is None:
+        return profile_name
+    return f"{namespace}{NAMESPACE_SEP}{profile_name}"
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = create_storage(STORAGE_BACKEND)
+        logger.info(f"Using {STORAGE_BACKEND} storage backend")
+    return _storage
+
+@metrics.timed('db.prewarm')
+async def prewarm():
+    await get_storage().prewarm()
+
+@metrics.timed('db.close')
+async def close():
+    if _storage is not None:
+        await _storage.close()
+
+def invalidate_cache(profile_name=None):
+    get_storage().invalidate_cache(profile_name)
+
+@metrics.timed('db.refresh_cache')
+async def refresh_cache():
+    await get_storage().refresh()
+
+@metrics.timed('db.get_profiles')
+async def get_profiles(namespace=None):
+    profiles = await get_storage().get_profiles()
+    if namespace is None:
+        if not MULTI_USER:
+            return profiles
+        return {name: address for name, address in profiles.items() if NAMESPACE_SEP not in name}
+    prefix = scoped_name('', namespace)
+    return {name[len(prefix):]: address for name, address in profiles.items() if name.startswith(prefix)}
+
+@metrics.timed('db.get_token_addresses')
+async def get_token_addresses():
+    return await get_storage().get_token_addresses()
+
+@metrics.timed('db.get_portfolio')
+async def get_portfolio(profile_name, namespace=None):
+    return await get_storage().get_portfolio(scoped_name(profile_name, namespace))
+
+@metrics.timed('db.update_portfolio')
+async def update_portfolio(profile_name, portfolio, namespace=None):
+    await get_storage().update_portfolio(scoped_name(profile_name, namespace), portfolio)
+
+@metrics.timed('db.create_profile')
+async def create_profile(profile_name, namespace=None):
+    if MULTI_USER and NAMESPACE_SEP in profile_name:
+        raise ValueError(f"Profile names cannot contain '{NAMESPACE_SEP}'")
+    await get_storage().create_profile(scoped_name(profile_name, namespace))
+
+@metrics.timed('db.delete_profile')
+async def delete_profile(profile_name, namespace=None):
+    await get_storage().delete_profile(scoped_name(profile_name, namespace))
+
+@metrics.timed('db.upsert_asset')
+async def upsert_asset(profile_name, symbol, amount, token_address, namespace=None):
+    await get_storage().upsert_asset(scoped_name(profile_name, namespace), symbol, amount, token_address)
+
+@metrics.timed('db.upsert_assets')
+async def upsert_assets(profile_name, assets, namespace=None):
+    await get_storage().upsert_assets(scoped_name(profile_name, namespace), assets)
+
+@metrics.timed('db.set_asset_amount')
+async def set_asset_amount(profile_name, symbol, amount, namespace=None):
+    return await get_storage().set_asset_amount(scoped_name(profile_name, namespace), symbol, amount)
+
+@metrics.timed('db.delete_asset')
+async def delete_asset(profile_name, symbol, namespace=None):
+    return await get_storage().delete_asset(scoped_name(profile_name, namespace), symbol)
+
+@metrics.timed('db.get_alerts')
+async def get_alerts(profile_name, namespace=None):
+    return await get_storage().get_alerts(scoped_name(profile_name, namespace))
+
+@metrics.timed('db.get_all_alerts')
+async def get_all_alerts():
+    # Keyed by the stored (namespaced) profile name
+    return await get_storage().get_all_alerts()
+
+@metrics.timed('db.add_alert')
+async def add_alert(profile_name, alert, namespace=None):
+    await get_storage().add_alert(scoped_name(profile_name, namespace), alert)
+
+@metrics.timed('db.remove_alerts')
+async def remove_alerts(profile_name, alert_ids, namespace=None):
+    return await get_storage().remove_alerts(scoped_name(profile_name, namespace), alert_ids)
@@ -1,9 +1,23 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
-from config import AUTHORIZED_USER_ID
-from database import get_profiles, get_portfolio, update_portfolio, create_profile, delete_profile
-from price_fetcher import fetch_prices
+from users import get_role, namespace_for, ROLE_ADMIN
+from database import get_profiles, get_portfolio, create_profile, delete_profile, refresh_cache, upsert_asset, upsert_assets, set_asset_amount, delete_asset, get_alerts
+from price_fetcher import get_token_prices, stale_prices
+from price_refresher import mark_viewed
+from cache import price_cache
+from valuation import value_portfolio, value_portfolios
+from rendering import message_renderer, paginate
+from callback_router import CallbackRouter
+from send_queue import progress
+from config import IMPORT_MAX_BYTES
+import alerts
+import metrics
+import portfolio_io
+import price_history
+import asyncio
+import functools
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -11,24 +25,46 @@ logger = logging.getLogger(__name__)
 # Define states
 CHOOSING_PROFILE, ADDING_PROFILE, REMOVING_PROFILE, ADDING_ASSET, REMOVING_ASSET, UPDATING_ASSET = range(6)
 
+async def deny_access(update: Update) -> None:
+    message_text = "Sorry, you don't have permission to use this bot."
+    if update.callback_query:
+        await update.callback_query.answer(message_text, show_alert=True)
+    elif update.effective_message:
+        await update.effective_message.reply_text(message_text)
+
 def is_authorized(func):
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id if update.effective_user else None
-        if user_id != AUTHORIZED_USER_ID:
-            await update.message.reply_text("Sorry, you don't have permission to use this bot.")
+        if get_role(user_id) is None:
+            await deny_access(update)
             return
         return await func(update, context)
     return wrapper
 
+def is_admin(func):
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id if update.effective_user else None
+        if get_role(user_id) != ROLE_ADMIN:
+            await deny_access(update)
+            return
+        return await func(update, context)
+    return wrapper
+
+def user_namespace(update: Update):
+    return namespace_for(update.effective_user.id)
+
 @is_authorized
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [
-        [InlineKeyboardButton("Select Profile", callback_data='choose_profile')],
-        [InlineKeyboardButton("See portfolio", callback_data='view_portfolio')],
-        [InlineKeyboardButton("Add an asset", callback_data='add_asset')],
-        [InlineKeyboardButton("Delete assets", callback_data='remove_asset')],
-        [InlineKeyboardButton("Manage profiles", callback_data='manage_profiles')],
-        [InlineKeyboardButton("Relief", callback_data='help')]
+        [InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+        [InlineKeyboardButton("See portfolio", callback_data=router.encode('view_portfolio'))],
+        [InlineKeyboardButton("All profiles", callback_data=router.encode('view_all_portfolios'))],
+        [InlineKeyboardButton("Add an asset", callback_data=router.encode('add_asset'))],
+        [InlineKeyboardButton("Delete assets", callback_data=router.encode('remove_asset'))],
+        [InlineKeyboardButton("Manage profiles", callback_data=router.encode('manage_profiles'))],
+        [InlineKeyboardButton("Relief", callback_data=router.encode('help'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     message_text = (
@@ -47,37 +83,39 @@ async def update_asset_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     active_profile = context.user_data.get('active_profile')
     if not active_profile:
-        keyboard = [[InlineKeyboardButton("Select Profile", callback_data='choose_profile')],
-                    [InlineKeyboardButton("Back", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+                    [InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("Please select a profile first.", reply_markup=reply_markup)
         return ConversationHandler.END
     
-    portfolio = await get_portfolio(active_profile)
+    portfolio = await get_portfolio(active_profile, namespace=user_namespace(update))
     if not portfolio:
-        keyboard = [[InlineKeyboardButton("Add an asset", callback_data='add_asset')],
-                    [InlineKeyboardButton("Return", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Add an asset", callback_data=router.encode('add_asset'))],
+                    [InlineKeyboardButton("Return", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"Your Portfolio for Profile '{active_profile}' blank.", reply_markup=reply_markup)
         return ConversationHandler.END
     
-    keyboard = [[InlineKeyboardButton(symbol, callback_data=f'update:{symbol}')] for symbol in portfolio.keys()]
-    keyboard.append([InlineKeyboardButton("Return", callback_data='start')])
+    keyboard = [[InlineKeyboardButton(symbol, callback_data=router.encode('update', symbol))] for symbol in portfolio.keys()]
+    keyboard.append([InlineKeyboardButton("Return", callback_data=router.encode('start'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(f"Select assets to be updated from the profile '{active_profile}':", reply_markup=reply_markup)
     return UPDATING_ASSET
 
+@is_authorized
 async def update_asset_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     
-    symbol = query.data.split(':')[1]
+    symbol = context.args[0]
     context.user_data['updating_symbol'] = symbol
     
     await query.edit_message_text(f"Enter a new amount for {symbol}:\n\nType 'cancele' to cancel.")
     return UPDATING_ASSET
 
+@is_authorized
 async def process_asset_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if update.message.text.lower() == 'cancele':
         await update.message.reply_text("The asset update process is canceled.")
@@ -98,15 +136,11 @@ async def process_asset_update(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("The amount must be in the form of numbers. Please try again.")
         return UPDATING_ASSET
     
-    await update.message.reply_text(f"Is updating the amount {updating_symbol}...")
-    portfolio = await get_portfolio(active_profile)
-    
-    if updating_symbol in portfolio:
-        portfolio[updating_symbol]['amount'] = new_amount
-        await update_portfolio(active_profile, portfolio)
-        await update.message.reply_text(f"Amount {updating_symbol} successfully updated to be {new_amount} In the profile portfolio '{active_profile}'.")
+    reply = progress(update.message, f"Is updating the amount {updating_symbol}...")
+    if await set_asset_amount(active_profile, updating_symbol, new_amount, namespace=user_namespace(update)):
+        await reply.finish(f"Amount {updating_symbol} successfully updated to be {new_amount} In the profile portfolio '{active_profile}'.")
     else:
-        await update.message.reply_text(f"Asset {updating_symbol} not found in a profile portfolio '{active_profile}'. No changes made.")
+        await reply.finish(f"Asset {updating_symbol} not found in a profile portfolio '{active_profile}'. No changes made.")
     
     del context.user_data['updating_symbol']
     await start(update, context)
@@ -116,24 +150,25 @@ async def choose_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer("Loading profile ...")
 
-    profiles = await get_profiles()
+    profiles = await get_profiles(namespace=user_namespace(update))
     if not profiles:
         message_text = "You don't have a profile yet.Please create a new profile first."
         await query.edit_message_text(message_text)
         return ConversationHandler.END
     
-    keyboard = [[InlineKeyboardButton(profile, callback_data=f'set_profile:{profile}')] for profile in profiles]
-    keyboard.append([InlineKeyboardButton("Back", callback_data='start')])
+    keyboard = [[InlineKeyboardButton(profile, callback_data=router.encode('set_profile', profile))] for profile in profiles]
+    keyboard.append([InlineKeyboardButton("Back", callback_data=router.encode('start'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text("Select Profile:", reply_markup=reply_markup)
     return CHOOSING_PROFILE
 
+@is_authorized
 async def set_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer("Set the profile ...")
     
-    profile = query.data.split(':')[1]
+    profile = context.args[0]
     context.user_data['active_profile'] = profile
     
     await query.edit_message_text(f"Active profile: {profile}")
@@ -145,9 +180,9 @@ async def manage_profiles(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer("Loading the Profile Manage menu ...")
 
     keyboard = [
-        [InlineKeyboardButton("Add Profile", callback_data='add_profile')],
-        [InlineKeyboardButton("Delete Profile", callback_data='remove_profile')],
-        [InlineKeyboardButton("Back", callback_data='start')]
+        [InlineKeyboardButton("Add Profile", callback_data=router.encode('add_profile'))],
+        [InlineKeyboardButton("Delete Profile", callback_data=router.encode('remove_profile'))],
+        [InlineKeyboardButton("Back", callback_data=router.encode('start'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Manage Profile:", reply_markup=reply_markup)
@@ -158,14 +193,15 @@ async def add_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     await query.edit_message_text("Enter the new profile name:")
     return ADDING_PROFILE
 
+@is_authorized
 async def create_new_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     profile_name = update.message.text
-    await update.message.reply_text(f"Is making a profile '{profile_name}'...")
+    reply = progress(update.message, f"Is making a profile '{profile_name}'...")
     try:
-        await create_profile(profile_name)
-        await update.message.reply_text(f"Profile {profile_name} successfully create.")
+        await create_profile(profile_name, namespace=user_namespace(update))
+        await reply.finish(f"Profile {profile_name} successfully create.")
     except ValueError as e:
-        await update.message.reply_text(str(e))
+        await reply.finish(str(e))
     
     await start(update, context)
     return ConversationHandler.END
@@ -174,25 +210,27 @@ async def remove_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer("Contains a profile list to be deleted ...")
 
-    profiles = await get_profiles()
+    profiles = await get_profiles(namespace=user_namespace(update))
     if not profiles:
         await query.edit_message_text("You don't have a profile to delete.")
         return ConversationHandler.END
     
-    keyboard = [[InlineKeyboardButton(profile, callback_data=f'confirm_remove:{profile}')] for profile in profiles]
-    keyboard.append([InlineKeyboardButton("Back", callback_data='manage_profiles')])
+    keyboard = [[InlineKeyboardButton(profile, callback_data=router.encode('confirm_remove', profile))] for profile in profiles]
+    keyboard.append([InlineKeyboardButton("Back", callback_data=router.encode('manage_profiles'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text("Pilih profil untuk dihapus:", reply_markup=reply_markup)
     return REMOVING_PROFILE
 
+@is_authorized
 async def confirm_remove_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer("Delete Profile ...")
     
-    profile = query.data.split(':')[1]
+    profile = context.args[0]
     try:
-        await delete_profile(profile)
+        await delete_profile(profile, namespace=user_namespace(update))
+        alerts.forget_profile(profile, namespace=user_namespace(update))
         await query.edit_message_text(f"Profile {profile} successfully deleted.")
     except ValueError as e:
         await query.edit_message_text(str(e))
@@ -206,49 +244,169 @@ async def view_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     active_profile = context.user_data.get('active_profile')
     if not active_profile:
-        keyboard = [[InlineKeyboardButton("Select Profile", callback_data='choose_profile')],
-                    [InlineKeyboardButton("Back", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+                    [InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("Please select a profile first.", reply_markup=reply_markup)
         return
     
-    portfolio = await get_portfolio(active_profile)
+    portfolio = await get_portfolio(active_profile, namespace=user_namespace(update))
     
     if not portfolio:
-        keyboard = [[InlineKeyboardButton("Add an asset", callback_data='add_asset')],
-                    [InlineKeyboardButton("Return", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Add an asset", callback_data=router.encode('add_asset'))],
+                    [InlineKeyboardButton("Return", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"Your Portfolio for Profile '{active_profile}' empty.", reply_markup=reply_markup)
         return
     
-    await query.edit_message_text("Is taking the latest price ...")
-    prices = await fetch_prices(portfolio)
-    
-    portfolio_text = f"Your portfolio (Profile: {active_profile}):\n\n"
-    total_value = 0
-    
-    for symbol, asset_data in portfolio.items():
-        price = prices.get(symbol)
-        amount = asset_data['amount']
-        if price is not None:
-            value = price * amount
-            total_value += value
-            portfolio_text += f"{symbol}: {amount} (${value:.2f})\n"
+    token_addresses = [asset_data['token_address'] for asset_data in portfolio.values()]
+    # The loading text costs an extra edit, so it is only shown when a price
+    # is missing from the cache and the view has to wait for a fetch
+    if any(price_cache.peek(address) is None for address in token_addresses):
+        await message_renderer.edit(query, "Is taking the latest price ...")
+    mark_viewed(token_addresses)
+    labels = {asset_data['token_address']: symbol for symbol, asset_data in portfolio.items()}
+    token_prices = await get_token_prices(token_addresses, labels)
+    valuation = value_portfolio(portfolio, token_prices)
+    
+    lines = []
+    for symbol, amount, value, allocation in valuation.rows():
+        if value is not None and portfolio[symbol]['token_address'] in stale_prices:
+            lines.append(f"{symbol}: {amount} (${value:.2f}, {allocation:.1f}%, last known price)")
+        elif value is not None:
+            lines.append(f"{symbol}: {amount} (${value:.2f}, {allocation:.1f}%)")
         else:
-            portfolio_text += f"{symbol}: {amount} (Prices are not available)\n"
+            lines.append(f"{symbol}: {amount} (Prices are not available)")
+    pages = paginate(
+        [f"Your portfolio (Profile: {active_profile}):", ""],
+        lines,
+        ["", f"Total Portfolio Value: ${valuation.total:.2f}"],
+    )
+    page = min(context.user_data.get('portfolio_page', 0), len(pages) - 1)
     
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    portfolio_text += f"\nTotal Portfolio Value: ${total_value:.2f}"
-    portfolio_text += f"\n\nLast updated: {current_time}"
+    portfolio_text = pages[page]
+    if len(pages) > 1:
+        portfolio_text += f"\nPage {page + 1}/{len(pages)}"
+    
+    keyboard = []
+    if len(pages) > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("Previous", callback_data=router.encode('portfolio_page', page - 1)))
+        if page < len(pages) - 1:
+            navigation.append(InlineKeyboardButton("Next", callback_data=router.encode('portfolio_page', page + 1)))
+        keyboard.append(navigation)
+    keyboard += [
+        [InlineKeyboardButton("Update the price", callback_data=router.encode('update_prices'))],
+        [InlineKeyboardButton("Performance", callback_data=router.encode('view_performance'))],
+        [InlineKeyboardButton("Update the number of assets", callback_data=router.encode('update_asset'))],
+        [InlineKeyboardButton("Back", callback_data=router.encode('start'))]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
     
+    # Values are compared as displayed, without the timestamp, so a refresh
+    # that changes nothing visible skips the edit entirely
+    await message_renderer.edit(query, f"{portfolio_text}\n\nLast updated: {current_time}", reply_markup,
+                                signature=portfolio_text)
+
+PERFORMANCE_PERIODS = [("24h", 86400), ("7d", 7 * 86400), ("30d", 30 * 86400)]
+
+async def view_performance(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer("Calculating performance ...")
+
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        keyboard = [[InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+                    [InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.edit_message_text("Please select a profile first.", reply_markup=reply_markup)
+        return
+
+    portfolio = await get_portfolio(active_profile, namespace=user_namespace(update))
+    token_addresses = {asset_data['token_address'] for asset_data in portfolio.values()}
+
+    # Only cached and recorded prices are used here, never the network
+    current_prices = {}
+    for token_address in token_addresses:
+        price, _ = price_cache.get_stale(token_address)
+        current_prices[token_address] = price if price is not None else price_history.latest(token_address)
+    current = value_portfolio(portfolio, current_prices)
+
+    now = time.time()
+    lines = [f"Performance (Profile: {active_profile}):", "", f"Current value: ${current.total:.2f}", ""]
+    for label, seconds in PERFORMANCE_PERIODS:
+        past_prices = {token_address: price_history.price_at(token_address, now - seconds) for token_address in token_addresses}
+        past = value_portfolio(portfolio, past_prices)
+        # Compare only assets priced at both ends so gaps in history don't read as losses
+        both = [not now_missing and not then_missing for now_missing, then_missing in zip(current.missing, past.missing)]
+        if not any(both):
+            lines.append(f"{label}: not enough price history")
+            continue
+        now_value = sum(value for value, priced in zip(current.values, both) if priced)
+        then_value = sum(value for value, priced in zip(past.values, both) if priced)
+        delta = now_value - then_value
+        change = (delta / then_value * 100) if then_value else 0.0
+        line = f"{label}: {'+' if delta >= 0 else '-'}${abs(delta):.2f} ({change:+.2f}%)"
+        if not all(both):
+            line += f" - {both.count(False)} assets without history"
+        lines.append(line)
+
     keyboard = [
-        [InlineKeyboardButton("Update the price", callback_data='update_prices')],
-        [InlineKeyboardButton("Update the number of assets", callback_data='update_asset')],
-        [InlineKeyboardButton("Back", callback_data='start')]
+        [InlineKeyboardButton("Back to portfolio", callback_data=router.encode('view_portfolio'))],
+        [InlineKeyboardButton("Back", callback_data=router.encode('start'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(portfolio_text, reply_markup=reply_markup)
+    await query.edit_message_text("\n".join(lines), reply_markup=reply_markup)
+
+async def view_all_portfolios(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer("Loading all portfolios ...")
+
+    namespace = user_namespace(update)
+    profiles = list(await get_profiles(namespace=namespace))
+    if not profiles:
+        keyboard = [[InlineKeyboardButton("Manage profiles", callback_data=router.encode('manage_profiles'))],
+                    [InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.edit_message_text("You don't have a profile yet.", reply_markup=reply_markup)
+        return
+
+    portfolios = await asyncio.gather(*(get_portfolio(profile, namespace=namespace) for profile in profiles))
+    portfolios = dict(zip(profiles, portfolios))
+    labels = {}
+    for portfolio in portfolios.values():
+        for symbol, asset_data in portfolio.items():
+            labels.setdefault(asset_data['token_address'], symbol)
+    if any(price_cache.peek(address) is None for address in labels):
+        await message_renderer.edit(query, "Is taking the latest price ...")
+    mark_viewed(labels)
+    token_prices = await get_token_prices(labels, labels)
+    valuation = value_portfolios(portfolios, token_prices)
+
+    lines = ["All profiles:", ""]
+    for i, profile in enumerate(valuation.profile_names):
+        line = f"{profile}: ${valuation.profile_totals[i]:.2f} ({valuation.profile_weights[i] * 100:.1f}%)"
+        if valuation.profile_missing[i]:
+            line += f" - {valuation.profile_missing[i]} without price"
+        lines.append(line)
+
+    # The summary stays a single message; profiles past the first page are
+    # still counted in the total
+    pages = paginate(lines[:2], lines[2:], ["", f"Total Value: ${valuation.total:.2f}"])
+    summary_text = pages[0]
+    if len(pages) > 1:
+        summary_text += "\n(more profiles not shown)"
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    keyboard = [
+        [InlineKeyboardButton("Update the price", callback_data=router.encode('refresh_all_portfolios'))],
+        [InlineKeyboardButton("Back", callback_data=router.encode('start'))]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await message_renderer.edit(query, f"{summary_text}\n\nLast updated: {current_time}", reply_markup,
+                                signature=summary_text)
 
 async def add_asset_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -256,8 +414,8 @@ async def add_asset_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     active_profile = context.user_data.get('active_profile')
     if not active_profile:
-        keyboard = [[InlineKeyboardButton("Select Profile", callback_data='choose_profile')],
-                    [InlineKeyboardButton("Return", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+                    [InlineKeyboardButton("Return", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("Please select a profile first.", reply_markup=reply_markup)
         return ConversationHandler.END
@@ -271,6 +429,7 @@ async def add_asset_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.edit_message_text(message_text)
     return ADDING_ASSET
 
+@is_authorized
 async def add_asset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if update.message.text.lower() == 'cancele':
         await update.message.reply_text("The asset added process was canceled.")
@@ -290,14 +449,9 @@ async def add_asset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("Invalid format.Use: <symbol> <total> <token address>")
         return ADDING_ASSET
     
-    await update.message.reply_text(f"Is adding assets {symbol.upper()}...")
-    portfolio = await get_portfolio(active_profile)
-    portfolio[symbol.upper()] = {
-        'amount': amount,
-        'token_address': token_address
-    }
-    await update_portfolio(active_profile, portfolio)
-    await update.message.reply_text(f"Asset {symbol.upper()} a lot {amount} with the token address {token_address} has been added to the profile portfolio '{active_profile}'.")
+    reply = progress(update.message, f"Is adding assets {symbol.upper()}...")
+    await upsert_asset(active_profile, symbol.upper(), amount, token_address, namespace=user_namespace(update))
+    await reply.finish(f"Asset {symbol.upper()} a lot {amount} with the token address {token_address} has been added to the profile portfolio '{active_profile}'.")
     
     await start(update, context)
     return ConversationHandler.END
@@ -308,102 +462,50 @@ async def remove_asset_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     active_profile = context.user_data.get('active_profile')
     if not active_profile:
-        keyboard = [[InlineKeyboardButton("Select Profile", callback_data='choose_profile')],
-                    [InlineKeyboardButton("Back", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+                    [InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("Please select a profile first.", reply_markup=reply_markup)
         return ConversationHandler.END
     
-    portfolio = await get_portfolio(active_profile)
+    portfolio = await get_portfolio(active_profile, namespace=user_namespace(update))
     if not portfolio:
-        keyboard = [[InlineKeyboardButton("Back", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(f"Your Portfolio for Profile '{active_profile}' empty.", reply_markup=reply_markup)
         return ConversationHandler.END
     
-    keyboard = [[InlineKeyboardButton(symbol, callback_data=f'remove:{symbol}')] for symbol in portfolio.keys()]
-    keyboard.append([InlineKeyboardButton("Back", callback_data='start')])
+    keyboard = [[InlineKeyboardButton(symbol, callback_data=router.encode('remove', symbol))] for symbol in portfolio.keys()]
+    keyboard.append([InlineKeyboardButton("Back", callback_data=router.encode('start'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(f"Select Assets to Delete from Profile '{active_profile}':", reply_markup=reply_markup)
     return REMOVING_ASSET
 
+@is_authorized
 async def remove_asset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer("Delete assets ...")
     
     active_profile = context.user_data.get('active_profile')
     if not active_profile:
-        keyboard = [[InlineKeyboardButton("Select Profile", callback_data='choose_profile')],
-                    [InlineKeyboardButton("Back", callback_data='start')]]
+        keyboard = [[InlineKeyboardButton("Select Profile", callback_data=router.encode('choose_profile'))],
+                    [InlineKeyboardButton("Back", callback_data=router.encode('start'))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("Please select a profile first.", reply_markup=reply_markup)
         return ConversationHandler.END
     
-    portfolio = await get_portfolio(active_profile)
-    if not portfolio:
-        keyboard = [[InlineKeyboardButton("Add an asset", callback_data='add_asset')],
-                    [InlineKeyboardButton("Back", callback_data='start')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(f"Your Portfolio for Profile '{active_profile}' empty.", reply_markup=reply_markup)
-        return ConversationHandler.END
-    
-    keyboard = [[InlineKeyboardButton(symbol, callback_data=f'update:{symbol}')] for symbol in portfolio.keys()]
-    keyboard.append([InlineKeyboardButton("Back", callback_data='start')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(f"Select assets to be updated from the profile '{active_profile}':", reply_markup=reply_markup)
-    return UPDATING_ASSET
-
-async def update_asset_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    
-    symbol = query.data.split(':')[1]
-    context.user_data['updating_symbol'] = symbol
-    
-    await query.edit_message_text(f"Enter a new amount for {symbol}:\n\nType 'cancele' to cancel.")
-    return UPDATING_ASSET
-
-async def process_asset_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    if update.message.text.lower() == 'cancele':
-        await update.message.reply_text("The asset update process is canceled.")
-        await start(update, context)
-        return ConversationHandler.END
-
-    active_profile = context.user_data.get('active_profile')
-    updating_symbol = context.user_data.get('updating_symbol')
-    
-    if not active_profile or not updating_symbol:
-        await update.message.reply_text("There is an error.Please start from the beginning.")
-        await start(update, context)
-        return ConversationHandler.END
-    
-    try:
-        new_amount = float(update.message.text)
-    except ValueError:
-        await update.message.reply_text("The amount must be in the form of numbers.Please try again.")
-        return UPDATING_ASSET
-    
-    await update.message.reply_text(f"Is updating the amount {updating_symbol}...")
-    portfolio = await get_portfolio(active_profile)
-    
-    if updating_symbol in portfolio:
-        portfolio[updating_symbol]['amount'] = new_amount
-        await update_portfolio(active_profile, portfolio)
-        await update.message.reply_text(f"Amount {updating_symbol} successfully updated to be {new_amount} In the profile portfolio '{active_profile}'.")
+    symbol = context.args[0]
+    if await delete_asset(active_profile, symbol, namespace=user_namespace(update)):
+        await alerts.delete_asset_alerts(active_profile, symbol, namespace=user_namespace(update))
+        await query.edit_message_text(f"Asset {symbol} successfully deleted from the profile portfolio '{active_profile}'.")
     else:
-        await update.message.reply_text(f"Asset {updating_symbol} not found in a profile portfolio '{active_profile}'. No changes made.")
+        await query.edit_message_text(f"Asset {symbol} not found in a profile portfolio '{active_profile}'. No changes made.")
     
-    del context.user_data['updating_symbol']
     await start(update, context)
     return ConversationHandler.END
 
-async def update_prices(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer("Update the price ...")
-    await view_portfolio(update, context)
-
+@is_authorized
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer("Showing help ...")
@@ -412,68 +514,311 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "Boat Usage Guide:\n\n"
         "1. Select Profile: Select an active portfolio profile\n"
         "2. See Portfolio: Displays your portfolio assets and values\n"
+        "   All Profiles: Shows the value of every profile at once\n"
+        "   Performance: Shows how the portfolio value changed over 24h, 7d and 30d\n"
         "3. Add Assets: add new assets to the portfolio\n"
         "4. Delete Assets: Delete Assets from Portfolios\n"
         "5. Update Number of Assets: Changing the Number of Assets that Already\n"
         "6. Manage Profile: Add or delete profiles\n"
-        "7. Help: Display this message\n\n"
+        "7. Help: Display this message\n"
+        "8. Alerts: /alert <symbol> <price> or /alert drop <percent>, list with /alerts\n"
+        "9. Import and export: send a CSV or JSON file to add many assets at once (/import for the format), /export to download\n\n"
         "Use the button on the main menu for easy navigation."
     )
-    keyboard = [[InlineKeyboardButton("Back to the main menu", callback_data='start')]]
+    keyboard = [[InlineKeyboardButton("Back to the main menu", callback_data=router.encode('start'))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(help_text, reply_markup=reply_markup)
 
-async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer()
-    
-    if query.data == 'start':
-        await start(update, context)
-    elif query.data == 'choose_profile':
-        return await choose_profile(update, context)
-    elif query.data.startswith('set_profile:'):
-        return await set_profile(update, context)
-    elif query.data == 'view_portfolio':
-        await view_portfolio(update, context)
-    elif query.data == 'add_asset':
-        return await add_asset_prompt(update, context)
-    elif query.data == 'remove_asset':
-        return await remove_asset_prompt(update, context)
-    elif query.data == 'update_asset':
-        return await update_asset_prompt(update, context)
-    elif query.data.startswith('update:'):
-        return await update_asset_amount(update, context)
-    elif query.data == 'manage_profiles':
-        await manage_profiles(update, context)
-    elif query.data == 'add_profile':
-        return await add_profile(update, context)
-    elif query.data == 'remove_profile':
-        return await remove_profile(update, context)
-    elif query.data.startswith('confirm_remove:'):
-        return await confirm_remove_profile(update, context)
-    elif query.data == 'update_prices':
-        await update_prices(update, context)
-    elif query.data == 'help':
-        await help_command(update, context)
-        
+@is_admin
+async def refresh_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    reply = progress(update.message, "Reloading profiles and portfolios from storage ...")
+    try:
+        await refresh_cache()
+        # Rules are reloaded from storage on the next price check
+        alerts.reset()
+        await reply.finish("Data reloaded from storage.")
+    except Exception as e:
+        logger.error(f"Error refreshing cache: {str(e)}")
+        await reply.finish("Failed to reload data. Please try again later.")
+
+@is_admin
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    lines = metrics.render_text().split("\n")
+    for page in paginate(["Bot statistics:", ""], lines, []):
+        await update.message.reply_text(page)
+
+ALERT_USAGE = (
+    "Use:\n"
+    "/alert <symbol> <price> - notify when the asset crosses the price\n"
+    "/alert drop <percent> - notify when the portfolio value drops by the percentage\n"
+    "/alerts - list the alerts of the active profile\n"
+    "/unalert <id> - delete an alert"
+)
+
+@is_authorized
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        await update.message.reply_text("Please select a profile first.")
+        return
+    if len(context.args) != 2:
+        await update.message.reply_text(ALERT_USAGE)
+        return
+    try:
+        value = float(context.args[1])
+    except ValueError:
+        await update.message.reply_text("The amount must be in the form of numbers. Please try again.")
+        return
+    if value <= 0:
+        await update.message.reply_text("The amount must be greater than zero.")
+        return
+
+    namespace = user_namespace(update)
+    portfolio = await get_portfolio(active_profile, namespace=namespace)
+    if context.args[0].lower() == 'drop':
+        if value >= 100:
+            await update.message.reply_text("The percentage must be below 100.")
+            return
+        token_addresses = [asset_data['token_address'] for asset_data in portfolio.values()]
+        valuation = value_portfolio(portfolio, await get_token_prices(token_addresses))
+        if not portfolio or any(valuation.missing):
+            await update.message.reply_text("The portfolio value is not available right now. Please try again later.")
+            return
+        rule = await alerts.create_drop_alert(active_profile, value, valuation.total, update.effective_chat.id,
+                                              namespace=namespace)
+    else:
+        symbol = context.args[0].upper()
+        if symbol not in portfolio:
+            await update.message.reply_text(f"Asset {symbol} not found in a profile portfolio '{active_profile}'.")
+            return
+        token_address = portfolio[symbol]['token_address']
+        current_price = (await get_token_prices([token_address], {token_address: symbol})).get(token_address)
+        if current_price is None:
+            await update.message.reply_text(f"The price of {symbol} is not available right now. Please try again later.")
+            return
+        rule = await alerts.create_price_alert(active_profile, symbol, token_address, value, current_price,
+                                               update.effective_chat.id, namespace=namespace)
+    await update.message.reply_text(f"Alert {rule['id']} set: {alerts.describe(rule)} (profile '{active_profile}').")
+
+@is_authorized
+async def list_alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        await update.message.reply_text("Please select a profile first.")
+        return
+    rules = await get_alerts(active_profile, namespace=user_namespace(update))
+    if not rules:
+        await update.message.reply_text(f"No alerts in profile '{active_profile}'.\n\n{ALERT_USAGE}")
+        return
+    lines = [f"Alerts (Profile: {active_profile}):", ""]
+    lines += [f"{rule['id']}: {alerts.describe(rule)}" for rule in rules]
+    await update.message.reply_text("\n".join(lines))
+
+@is_authorized
+async def unalert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        await update.message.reply_text("Please select a profile first.")
+        return
+    if len(context.args) != 1:
+        await update.message.reply_text(ALERT_USAGE)
+        return
+    if await alerts.delete_alert(active_profile, context.args[0], namespace=user_namespace(update)):
+        await update.message.reply_text(f"Alert {context.args[0]} deleted.")
+    else:
+        await update.message.reply_text(f"Alert {context.args[0]} not found in profile '{active_profile}'.")
+
+IMPORT_USAGE = (
+    "Send a CSV or JSON file to import assets into the active profile.\n\n"
+    "CSV: one 'symbol,amount,token_address' row per asset, optionally below a header row.\n"
+    "JSON: a list of {\"symbol\", \"amount\", \"token_address\"} objects, or the file made by /export json.\n\n"
+    "Assets already in the profile are updated. /export [csv|json] downloads the active profile."
+)
+# Rejected rows listed in an import report; the rest are only counted
+IMPORT_REJECTED_SHOWN = 50
+
+@is_authorized
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(IMPORT_USAGE)
+
+@is_authorized
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        await update.message.reply_text("Please select a profile first.")
+        return
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text(f"The file is too large to import (limit {IMPORT_MAX_BYTES} bytes).")
+        return
+
+    reply = progress(update.message, f"Is importing {document.file_name or 'the file'} into profile '{active_profile}'...")
+    data = bytes(await (await document.get_file()).download_as_bytearray())
+    try:
+        parsed = portfolio_io.parse_document(data, document.file_name)
+    except ValueError as e:
+        await reply.finish(f"The file could not be imported: {e}.\n\n{IMPORT_USAGE}")
+        return
+
+    lines = []
+    if parsed.assets:
+        namespace = user_namespace(update)
+        portfolio = await get_portfolio(active_profile, namespace=namespace)
+        held = {asset_data['token_address'] for asset_data in portfolio.values()}
+        new_tokens = {}
+        for symbol, asset_data in parsed.assets.items():
+            if asset_data['token_address'] not in held:
+                new_tokens.setdefault(asset_data['token_address'], symbol)
+        # One storage write for the whole file, while prices of tokens the
+        # profile did not hold yet are fetched alongside it
+        saved, prices = await asyncio.gather(
+            upsert_assets(active_profile, parsed.assets, namespace=namespace),
+            get_token_prices(list(new_tokens), new_tokens),
+            return_exceptions=True,
+        )
+        if isinstance(saved, Exception):
+            logger.error(f"Error importing into profile {active_profile}: {str(saved)}")
+            await reply.finish(f"The import into profile '{active_profile}' failed: {saved}. No changes made.")
+            return
+        added = sum(1 for symbol in parsed.assets if symbol not in portfolio)
+        lines.append(f"Imported {len(parsed.assets)} assets into profile '{active_profile}' "
+                     f"({added} new, {len(parsed.assets) - added} updated).")
+        if new_tokens and not isinstance(prices, Exception):
+            priced = sum(1 for price in prices.values() if price is not None)
+            lines.append(f"Prices found for {priced} of {len(new_tokens)} new tokens.")
+    else:
+        lines.append(f"Nothing was imported into profile '{active_profile}'.")
+
+    rejected_lines = [f"{label}: {reason}" for label, reason in parsed.rejected[:IMPORT_REJECTED_SHOWN]]
+    if len(parsed.rejected) > IMPORT_REJECTED_SHOWN:
+        rejected_lines.append(f"... and {len(parsed.rejected) - IMPORT_REJECTED_SHOWN} more")
+    if parsed.rejected:
+        lines += ["", f"Rejected {len(parsed.rejected)} of {parsed.rows} rows:"]
+    pages = paginate(lines, rejected_lines, [])
+    await reply.finish(pages[0])
+    for page in pages[1:]:
+        await update.message.reply_text(page)
+
+@is_authorized
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        await update.message.reply_text("Please select a profile first.")
+        return
+    fmt = context.args[0].lower() if context.args else 'csv'
+    if fmt not in portfolio_io.FORMATS:
+        await update.message.reply_text("Use: /export [csv|json]")
+        return
+    portfolio = await get_portfolio(active_profile, namespace=user_namespace(update))
+    if not portfolio:
+        await update.message.reply_text(f"Your Portfolio for Profile '{active_profile}' empty.")
+        return
+    filename = ''.join(char if char.isalnum() or char in '-_' else '_' for char in active_profile) or 'portfolio'
+    await update.message.reply_document(
+        document=portfolio_io.export_document(portfolio, fmt),
+        filename=f"{filename}.{fmt}",
+        caption=f"{len(portfolio)} assets of profile '{active_profile}'",
+    )
+
+async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.callback_query.answer()
+    await start(update, context)
+
+async def open_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    context.user_data['portfolio_page'] = 0
+    await view_portfolio(update, context)
+
+async def show_portfolio_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    context.user_data['portfolio_page'] = context.args[0]
+    await view_portfolio(update, context)
+
+async def expired_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer("This button is no longer valid.")
+    await start(update, context)
+    return ConversationHandler.END
+
+async def forget_render(update: Update, context: ContextTypes.DEFAULT_TYPE, route) -> None:
+    # Only routes that redraw the message they were pressed on keep the
+    # remembered render; every other one moves to a different screen
+    if not route.rerender:
+        message_renderer.forget(update.callback_query)
+
+async def profile_names(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return list(await get_profiles(namespace=user_namespace(update)))
+
+async def asset_symbols(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    active_profile = context.user_data.get('active_profile')
+    if not active_profile:
+        return []
+    return list(await get_portfolio(active_profile, namespace=user_namespace(update)))
+
+router = CallbackRouter(before_dispatch=forget_render, on_unknown=expired_button)
+router.add_arg_type('profile', profile_names)
+router.add_arg_type('symbol', asset_symbols)
+
+# Every inline button. Buttons are built with router.encode(name, arg) and the
+# conversation states below are registered from the `states` column.
+router.add('start', 'st', main_menu)
+router.add('choose_profile', 'cp', choose_profile)
+router.add('set_profile', 'sp', set_profile, arg='profile', states=[CHOOSING_PROFILE])
+router.add('view_portfolio', 'vp', open_portfolio)
+router.add('portfolio_page', 'pg', show_portfolio_page, arg='int', rerender=True)
+router.add('update_prices', 'up', view_portfolio, rerender=True)
+router.add('view_performance', 'pf', view_performance)
+router.add('view_all_portfolios', 'va', view_all_portfolios)
+router.add('refresh_all_portfolios', 'rv', view_all_portfolios, rerender=True)
+router.add('add_asset', 'aa', add_asset_prompt)
+router.add('remove_asset', 'ra', remove_asset_prompt)
+router.add('remove', 'rm', remove_asset, arg='symbol', states=[REMOVING_ASSET])
+router.add('update_asset', 'ua', update_asset_prompt)
+router.add('update', 'uq', update_asset_amount, arg='symbol', states=[UPDATING_ASSET])
+router.add('manage_profiles', 'mp', manage_profiles)
+router.add('add_profile', 'ap', add_profile)
+router.add('remove_profile', 'rp', remove_profile)
+router.add('confirm_remove', 'cr', confirm_remove_profile, arg='profile', states=[REMOVING_PROFILE])
+router.add('help', 'hp', help_command)
+
+# Free-text input expected in a conversation state
+TEXT_INPUTS = {
+    ADDING_PROFILE: create_new_profile,
+    ADDING_ASSET: add_asset,
+    UPDATING_ASSET: process_asset_update,
+}
+
+@is_authorized
+async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await router.dispatch(update, context)
+
 def setup_handlers(application):
+    # Callbacks are timed per route by the router; commands and text input here
+    states = {state: [CallbackQueryHandler(handle_button, pattern=router.pattern(state))] for state in router.states()}
+    for state, handler in TEXT_INPUTS.items():
+        states.setdefault(state, []).append(
+            MessageHandler(filters.TEXT & ~filters.COMMAND, metrics.timed(f"input.{handler.__name__}")(handler)))
+
+    start_command = metrics.timed("command.start")(start)
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start), CallbackQueryHandler(handle_button)],
-        states={
-            CHOOSING_PROFILE: [CallbackQueryHandler(set_profile, pattern='^set_profile:')],
-            ADDING_PROFILE: [MessageHandler(filters.TEXT & ~filters.COMMAND, create_new_profile)],
-            REMOVING_PROFILE: [CallbackQueryHandler(confirm_remove_profile, pattern='^confirm_remove:')],
-            ADDING_ASSET: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_asset)],
-            REMOVING_ASSET: [CallbackQueryHandler(remove_asset, pattern='^remove:')],
-            UPDATING_ASSET: [
-                CallbackQueryHandler(update_asset_amount, pattern='^update:'),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_asset_update)
-            ],
-        },
-        fallbacks=[CommandHandler('start', start), 
-                   CallbackQueryHandler(handle_button, pattern='^start$')]
+        entry_points=[CommandHandler('start', start_command), CallbackQueryHandler(handle_button)],
+        states=states,
+        # Any other button leaves the conversation for the screen it opens
+        fallbacks=[CommandHandler('start', start_command), CallbackQueryHandler(handle_button)],
+        # Let updates from different users run side by side; edits to a single
+        # portfolio are still serialized by the storage layer's profile locks.
+        block=False
     )
     
     application.add_handler(conv_handler)
-    application.add_handler(CommandHandler("help", help_command))
\ No newline at end of file
+    commands = {
+        "help": help_command,
+        "refresh": refresh_command,
+        "stats": stats_command,
+        "alert": alert_command,
+        "alerts": list_alerts_command,
+        "unalert": unalert_command,
+        "import": import_command,
+        "export": export_command,
+    }
+    for command, handler in commands.items():
+        application.add_handler(CommandHandler(command, metrics.timed(f"command.{command}")(handler)))
+    application.add_handler(MessageHandler(filters.Document.ALL, metrics.timed("input.import_document")(import_document)))
@@ -0,0 +1,35 @@
+import aiohttp
+import logging
+from config import HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# One session for the lifetime of the application so connections (and their
+# TLS handshakes) are reused across portfolio views.
+_session = None
+
+async def start():
+    global _session
+    if _session is not None and not _session.closed:
+        return _session
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    )
+    _session = aiohttp.ClientSession(connector=connector)
+    logger.info(f"HTTP client started (pool limit {HTTP_POOL_LIMIT}, per host {HTTP_POOL_LIMIT_PER_HOST})")
+    return _session
+
+async def get_session():
+    if _session is None or _session.closed:
+        return await start()
+    return _session
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP client closed")
+    _session = None
@@ -1,8 +1,13 @@
+import time
+# Read before anything else is imported so the startup metrics include imports
+_process_started = time.perf_counter()
+
 import asyncio
 import logging
-from telegram.ext import Application
-from config import TELEGRAM_BOT_TOKEN
-from handlers import setup_handlers
+import signal
+import config
+import metrics
+from config import TELEGRAM_BOT_TOKEN, MAX_CONCURRENT_UPDATES, BOT_MODE, METRICS_PORT, PRICE_REFRESH_INTERVAL
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -10,38 +15,135 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _prewarm_data():
+    # Storage first (credentials, worksheet handle and profile index), then
+    # the prices of the tokens it holds. Failures only cost the first
+    # requests some latency, so they are logged and startup carries on.
+    import database
+    import price_refresher
+    try:
+        await database.prewarm()
+    except Exception as e:
+        logger.warning(f"Prewarming storage failed, continuing without it: {e}")
+        return False
+    try:
+        await price_refresher.prewarm()
+    except Exception as e:
+        logger.warning(f"Prewarming prices failed, continuing without them: {e}")
+        return False
+    return True
+
+async def prewarm(application):
+    # Startup steps that mostly wait on the network run side by side:
+    # Telegram's getMe (application.initialize()), the HTTP connection pool
+    # and the storage and price warm-up.
+    # Returns whether prices were prewarmed.
+    import http_client
+    data = asyncio.ensure_future(_prewarm_data())
+    try:
+        await asyncio.gather(
+            application.initialize(),
+            http_client.start(),
+        )
+    except BaseException:
+        data.cancel()
+        raise
+    return await data
+
 async def main() -> None:
+    # Fail fast, before the heavier imports, on settings the bot cannot run with
+    try:
+        config.validate()
+    except config.ConfigError as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+
+    import database
+    import http_client
+    import price_history
+    import price_refresher
+    from telegram.ext import Application
+    from handlers import setup_handlers
+    from send_queue import SendRateLimiter
+    metrics.observe('startup.imports', time.perf_counter() - _process_started)
+
+    application = None
+    webhook_server = None
+    metrics_server = None
+    stop_signal = asyncio.Event()
     try:
         logger.info("Starting bot...")
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        rate_limiter = SendRateLimiter()
+        rate_limiter.measure_first_response(_process_started)
+        application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .concurrent_updates(MAX_CONCURRENT_UPDATES)
+            .rate_limiter(rate_limiter)
+            .build()
+        )
         logger.info("Application built")
 
         setup_handlers(application)
         logger.info("Handlers set up")
 
-        await application.initialize()
+        if METRICS_PORT:
+            metrics_server = metrics.MetricsServer()
+            await metrics_server.start()
+
+        with metrics.timer('startup.prewarm'):
+            prices_prewarmed = await prewarm(application)
         logger.info("Application initialized")
+
+        # Freshly prewarmed prices make an immediate first refresh redundant
+        price_refresher.schedule(application, first=PRICE_REFRESH_INTERVAL if prices_prewarmed else 0)
+        price_history.schedule(application)
         
         await application.start()
         logger.info("Application started")
-        
-        logger.info("Starting polling...")
-        await application.updater.start_polling()
-        logger.info("Polling started")
-        
-        # Buat event untuk menjaga bot tetap berjalan
-        stop_signal = asyncio.Event()
-        
-        # Tunggu sampai stop_signal diset (yang tidak akan terjadi dalam kode ini)
+
+        if BOT_MODE == 'webhook':
+            from webhook import WebhookServer
+            logger.info("Starting webhook server...")
+            webhook_server = WebhookServer(application)
+            await webhook_server.start()
+            logger.info("Webhook server started")
+        else:
+            logger.info("Starting polling...")
+            await application.updater.start_polling()
+            logger.info("Polling started")
+
+        ready = time.perf_counter() - _process_started
+        metrics.observe('startup.ready', ready)
+        logger.info(f"Ready to respond {ready:.2f}s after start")
+
+        # Stop cleanly on SIGTERM/SIGINT so pending updates and writes are drained
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, stop_signal.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
         await stop_signal.wait()
+        logger.info("Shutdown requested")
         
     except Exception as e:
         logger.exception(f"Error running bot: {e}")
     finally:
-        # Hanya akan dieksekusi jika ada exception atau stop_signal diset
-        await application.updater.stop()
-        await application.stop()
-        await application.shutdown()
+        if application is not None:
+            if webhook_server is not None:
+                await webhook_server.stop()
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            # Processes the updates already queued before returning
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        await http_client.close()
+        await database.close()
         logger.info("Bot stopped")
 
 if __name__ == '__main__':
@@ -50,4 +152,4 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("Bot stopped manually")
     except Exception as e:
-        logger.exception(f"Unhandled exception: {e}")
\ No newline at end of file
+        logger.exception(f"Unhandled exception: {e}")
@@ -0,0 +1,178 @@
+import functools
+import logging
+import time
+from bisect import bisect_left
+from config import METRICS_LISTEN, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Latency histograms per operation plus plain counters, kept in process.
+# Recording is a perf_counter() pair, a bisect over a dozen bucket bounds and
+# a few integer additions, cheap enough to leave on in production.
+
+# Upper bucket bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the overflow (+Inf) bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+_histograms = {}
+_counters = {}
+# name -> callable returning a flat dict of numbers, for components that keep
+# their own counters (caches, queues, breakers, ...)
+_sources = {}
+
+def observe(operation, seconds):
+    histogram = _histograms.get(operation)
+    if histogram is None:
+        histogram = _histograms[operation] = Histogram()
+    histogram.observe(seconds)
+
+def increment(name, value=1):
+    _counters[name] = _counters.get(name, 0) + value
+
+class timer:
+    # with metrics.timer('operation'): ...
+    __slots__ = ('operation', 'started')
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.operation, time.perf_counter() - self.started)
+        if exc_type is not None:
+            increment(f"{self.operation}.errors")
+
+def timed(operation):
+    # Decorator timing every call of an async function
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with timer(operation):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def register_source(name, stats):
+    _sources[name] = stats
+
+def collect_sources():
+    collected = {}
+    for name, stats in _sources.items():
+        try:
+            collected[name] = stats()
+        except Exception as e:
+            logger.error(f"Error collecting {name} stats: {str(e)}")
+    return collected
+
+def reset():
+    _histograms.clear()
+    _counters.clear()
+
+def render_text(prefix=None):
+    # Human-readable summary for the /stats command
+    lines = ["Latency (count, p50 / p95 / max ms):"]
+    for operation in sorted(_histograms):
+        if prefix and not operation.startswith(prefix):
+            continue
+        histogram = _histograms[operation]
+        lines.append(
+            f"{operation}: {histogram.count}, {histogram.quantile(0.5) * 1000:.1f} / "
+            f"{histogram.quantile(0.95) * 1000:.1f} / {histogram.max * 1000:.1f}"
+        )
+    if _counters:
+        lines.append("")
+        lines.append("Counters:")
+        lines.extend(f"{name}: {value}" for name, value in sorted(_counters.items()))
+    for name, stats in collect_sources().items():
+        values = ', '.join(f"{key} {value:.3g}" if isinstance(value, float) else f"{key} {value}"
+                           for key, value in stats.items() if isinstance(value, (int, float)))
+        lines.append("")
+        lines.append(f"{name}: {values}")
+    return "\n".join(lines)
+
+def _metric_name(name):
+    return ''.join(char if char.isalnum() else '_' for char in name)
+
+def render_prometheus():
+    lines = [
+        "# HELP portfolio_bot_operation_seconds Latency of instrumented operations",
+        "# TYPE portfolio_bot_operation_seconds histogram",
+    ]
+    for operation, histogram in sorted(_histograms.items()):
+        for bound, total in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'portfolio_bot_operation_seconds_bucket{{operation="{operation}",le="{le}"}} {total}')
+        lines.append(f'portfolio_bot_operation_seconds_sum{{operation="{operation}"}} {histogram.sum}')
+        lines.append(f'portfolio_bot_operation_seconds_count{{operation="{operation}"}} {histogram.count}')
+    lines.append("# TYPE portfolio_bot_events_total counter")
+    for name, value in sorted(_counters.items()):
+        lines.append(f'portfolio_bot_events_total{{event="{name}"}} {value}')
+    for source, stats in collect_sources().items():
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"portfolio_bot_{_metric_name(source)}_{_metric_name(key)} {value}")
+    return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    # Serves render_prometheus() at /metrics for scraping
+
+    def __init__(self, listen=METRICS_LISTEN, port=METRICS_PORT):
+        self.listen = listen
+        self.port = port
+        self._runner = None
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        # aiohttp's server side is only imported when the endpoint is enabled
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Metrics endpoint listening on {self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import json
+import logging
+from config import SQLITE_DB_PATH
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO,
+)
+logger = logging.getLogger(__name__)
+
+# Converts portfolios stored as one {symbol: {amount, token_address}} JSON blob
+# per Google Sheets cell into the row-per-asset SQLite layout.
+#
+#   python migrate.py                       # read from the configured Google Sheet
+#   python migrate.py --from-json dump.json # read {profile: portfolio} from a file
+
+def normalize_portfolio(profile_name, portfolio):
+    assets = {}
+    for symbol, asset_data in portfolio.items():
+        try:
+            assets[symbol] = {
+                'amount': float(asset_data['amount']),
+                'token_address': str(asset_data['token_address']),
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping malformed asset {symbol} in profile {profile_name}: {str(e)}")
+    return assets
+
+async def load_from_sheets():
+    from sheets_storage import SheetsStorage
+    source = SheetsStorage()
+    portfolios = {}
+    for profile_name in await source.get_profiles():
+        portfolios[profile_name] = await source.get_portfolio(profile_name)
+    return portfolios
+
+def load_from_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+async def migrate(portfolios, db_path, overwrite=False):
+    from sqlite_storage import SqliteStorage
+    target = SqliteStorage(db_path)
+    existing = await target.get_profiles()
+    migrated = 0
+    for profile_name, portfolio in portfolios.items():
+        if profile_name in existing and not overwrite:
+            logger.warning(f"Profile {profile_name} already exists in {db_path}, skipping (use --overwrite to replace)")
+            continue
+        if profile_name not in existing:
+            await target.create_profile(profile_name)
+        assets = normalize_portfolio(profile_name, portfolio)
+        await target.update_portfolio(profile_name, assets)
+        logger.info(f"Migrated profile {profile_name} with {len(assets)} assets")
+        migrated += 1
+    await target.close()
+    return migrated
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate portfolio JSON blobs into the SQLite row-per-asset layout.")
+    parser.add_argument('--from-json', help="read {profile: portfolio} from this JSON file instead of Google Sheets")
+    parser.add_argument('--db', default=SQLITE_DB_PATH, help="target SQLite database (default: SQLITE_DB_PATH)")
+    parser.add_argument('--overwrite', action='store_true', help="replace profiles that already exist in the target")
+    args = parser.parse_args()
+
+    portfolios = load_from_json(args.from_json) if args.from_json else await load_from_sheets()
+    migrated = await migrate(portfolios, args.db, args.overwrite)
+    logger.info(f"Migration finished: {migrated} of {len(portfolios)} profiles written to {args.db}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import math
+from collections import namedtuple
+from config import IMPORT_MAX_ROWS
+
+# Whole portfolios as documents, for bulk import and export. A CSV document
+# has one "symbol,amount,token_address" row per asset, optionally below a
+# header row naming the columns (in any order). A JSON document is either the
+# exported {symbol: {"amount": ..., "token_address": ...}} object or a list
+# of {"symbol": ..., "amount": ..., "token_address": ...} objects.
+
+FIELDS = ('symbol', 'amount', 'token_address')
+FORMATS = ('csv', 'json')
+
+# `assets` is {symbol: {'amount', 'token_address'}} ready to be stored,
+# `rejected` a list of (row label, reason) and `rows` the number of rows read
+ParsedImport = namedtuple('ParsedImport', ['assets', 'rejected', 'rows'])
+
+def validate_asset(symbol, amount, token_address):
+    # Returns (symbol, asset_data) or raises ValueError with the reason
+    symbol = str(symbol or '').strip().upper()
+    if not symbol:
+        raise ValueError("symbol is empty")
+    if any(char.isspace() for char in symbol):
+        raise ValueError(f"symbol {symbol!r} contains spaces")
+    if not symbol.isprintable():
+        raise ValueError(f"symbol {symbol!r} contains control characters")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError(f"amount {amount!r} is not a number")
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError(f"amount {amount!r} must be zero or more")
+    token_address = str(token_address or '').strip()
+    if not token_address:
+        raise ValueError("token address is empty")
+    if (any(char.isspace() for char in token_address) or ',' in token_address
+            or not token_address.isprintable()):
+        raise ValueError(f"token address {token_address!r} is not valid")
+    return symbol, {'amount': amount, 'token_address': token_address}
+
+def _csv_rows(reader):
+    # csv.Error (an unterminated quote, a field over csv.field_size_limit())
+    # leaves the rest of the file unreadable, so it fails the whole document
+    try:
+        yield from reader
+    except csv.Error as e:
+        raise ValueError(f"the CSV is malformed at line {reader.line_num} ({e})")
+
+def _csv_records(text):
+    # Yields (row label, (symbol, amount, token_address)) one row at a time
+    reader = csv.reader(io.StringIO(text))
+    columns = None
+    for row in _csv_rows(reader):
+        if not any(field.strip() for field in row):
+            continue
+        if columns is None:
+            columns = list(range(len(FIELDS)))
+            header = [field.strip().lower() for field in row]
+            if 'symbol' in header:
+                missing = [field for field in FIELDS if field not in header]
+                if missing:
+                    raise ValueError(f"the header row has no {', '.join(missing)} column")
+                columns = [header.index(field) for field in FIELDS]
+                continue
+        label = f"row {reader.line_num}"
+        if len(row) <= max(columns):
+            yield label, None
+            continue
+        yield label, tuple(row[column] for column in columns)
+
+def _json_records(text):
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON ({e})")
+    if isinstance(data, dict):
+        for symbol, asset_data in data.items():
+            if not isinstance(asset_data, dict):
+                yield symbol, None
+                continue
+            yield symbol, (symbol, asset_data.get('amount'), asset_data.get('token_address'))
+    elif isinstance(data, list):
+        for i, entry in enumerate(data, 1):
+            if not isinstance(entry, dict):
+                yield f"entry {i}", None
+                continue
+            yield f"entry {i}", tuple(entry.get(field) for field in FIELDS)
+    else:
+        raise ValueError("expected a JSON object or list")
+
+def document_format(filename, text):
+    if filename and filename.lower().endswith('.json'):
+        return 'json'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'json' if text.lstrip()[:1] in ('{', '[') else 'csv'
+
+def parse_document(data, filename=None):
+    # Validates every row on its own: bad rows are collected in `rejected`
+    # and the rest are kept. Only an unreadable document raises ValueError.
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("the file is not UTF-8 text")
+    records = _json_records(text) if document_format(filename, text) == 'json' else _csv_records(text)
+
+    assets = {}
+    seen = {}
+    rejected = []
+    rows = 0
+    for label, fields in records:
+        rows += 1
+        if rows > IMPORT_MAX_ROWS:
+            rejected.append((label, f"more than {IMPORT_MAX_ROWS} rows, the rest of the file was skipped"))
+            break
+        if fields is None:
+            rejected.append((label, f"expected {', '.join(FIELDS)}"))
+            continue
+        try:
+            symbol, asset_data = validate_asset(*fields)
+        except ValueError as e:
+            rejected.append((label, str(e)))
+            continue
+        if symbol in seen:
+            rejected.append((label, f"{symbol} already appears in {seen[symbol]}"))
+            continue
+        seen[symbol] = label
+        assets[symbol] = asset_data
+    return ParsedImport(assets, rejected, rows)
+
+def export_document(portfolio, fmt='csv'):
+    # Returns the document as bytes; parse_document() reads both formats back
+    if fmt == 'json':
+        return json.dumps(portfolio, indent=2).encode('utf-8')
+    if fmt != 'csv':
+        raise ValueError(f"Unknown export format: {fmt}")
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(FIELDS)
+    for symbol, asset_data in portfolio.items():
+        writer.writerow((symbol, asset_data['amount'], asset_data['token_address']))
+    return output.getvalue().encode('utf-8')
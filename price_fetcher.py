@@ -1,49 +1,196 @@
-import aiohttp
+import asyncio
 import logging
+import time
+import http_client
+import metrics
+import price_history
+import token_metadata
 from cache import price_cache
+from config import (PRICE_FETCH_CONCURRENCY, PRICE_BATCH_SIZE, PRICE_SOURCES, PRICE_FETCH_TIMEOUT, PRICE_FETCH_RETRIES,
+                    PRICE_RETRY_BACKOFF, PRICE_FETCH_DEADLINE, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+from price_sources import PriceSourceError, create_sources
+from resilience import CircuitBreaker, CircuitOpenError, retry
 
 logger = logging.getLogger(__name__)
 
-async def fetch_prices(portfolio):
+# Lookups currently on the wire, keyed by token address, so concurrent
+# callers asking for the same token share one upstream request.
+_in_flight = {}
+_batch_tasks = set()
+_semaphore = None
+
+# Upstream sources in order of preference, each behind its own circuit
+# breaker. Tokens a source fails on or does not know fall through to the next.
+_sources = None
+_breakers = {}
+
+# Tokens whose current price is the last known one from the price history
+# because no source could price them
+stale_prices = set()
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PRICE_FETCH_CONCURRENCY)
+    return _semaphore
+
+def get_sources():
+    global _sources
+    if _sources is None:
+        _sources = create_sources(PRICE_SOURCES)
+        for source in _sources:
+            breaker = _breakers[source.name] = CircuitBreaker(source.name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+            metrics.register_source(f"breaker_{source.name}", breaker.stats)
+    return _sources
+
+def source_stats():
+    get_sources()
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+def batch_order(token_address):
+    # Sort key putting tokens on the same chain next to each other, so the
+    # batches of a lookup each span as few chains (and requests) as possible
+    metadata = token_metadata.get(token_address)
+    return (metadata is None, '' if metadata is None else metadata['chain_id'])
+
+def estimate_requests(token_addresses):
+    # Upstream requests fetch_token_prices() makes for `token_addresses`, in
+    # this order, when the first source answers them all
+    source = get_sources()[0]
+    token_addresses = list(dict.fromkeys(token_addresses))
+    return sum(source.requests_for(token_addresses[i:i + PRICE_BATCH_SIZE])
+               for i in range(0, len(token_addresses), PRICE_BATCH_SIZE))
+
+def _describe(token_addresses, labels):
+    return ', '.join(f"{labels.get(address, address)} ({address})" for address in token_addresses)
+
+async def _fetch_from_source(source, session, batch, deadline):
+    breaker = _breakers[source.name]
+
+    async def attempt():
+        async with _get_semaphore():
+            # Batches queued behind PRICE_FETCH_CONCURRENCY may only get here
+            # once their time is up; they get what is left, if anything
+            timeout = min(PRICE_FETCH_TIMEOUT, deadline - time.monotonic())
+            if timeout <= 0:
+                raise PriceSourceError(f"{source.name} was not reached within {PRICE_FETCH_DEADLINE}s")
+            with metrics.timer(f"source.{source.name}"):
+                return await breaker.call(source.fetch, session, batch, timeout)
+
+    return await retry(attempt, retries=PRICE_FETCH_RETRIES, base_delay=PRICE_RETRY_BACKOFF,
+                       deadline=deadline, retry_on=(PriceSourceError,))
+
+async def _fetch_batch(session, batch, labels):
+    # Every source together gets PRICE_FETCH_DEADLINE seconds, so a slow or
+    # failing upstream delays a view by a bounded amount
+    results = dict.fromkeys(batch)
+    deadline = time.monotonic() + PRICE_FETCH_DEADLINE
+    remaining = list(batch)
+    for source in get_sources():
+        if not remaining or time.monotonic() >= deadline:
+            break
+        try:
+            prices = await _fetch_from_source(source, session, remaining, deadline)
+        except CircuitOpenError:
+            logger.debug(f"Skipping {source.name}, its circuit is open")
+            continue
+        except PriceSourceError as e:
+            logger.warning(f"Failed to fetch prices for {_describe(remaining, labels)} from {source.name}: {str(e)}")
+            continue
+        except Exception as e:
+            logger.error(f"Unexpected error when fetching prices for {_describe(remaining, labels)} from {source.name}: {str(e)}")
+            continue
+        for token_address, price in prices.items():
+            if price is not None:
+                results[token_address] = price
+        remaining = [token_address for token_address in remaining if results[token_address] is None]
+
+    fresh = {token_address: price for token_address, price in results.items() if price is not None}
+    for token_address, price in fresh.items():
+        stale_prices.discard(token_address)
+        price_cache.set(token_address, price)
+        logger.info(f"Successfully fetched price for {labels.get(token_address, token_address)} ({token_address}): ${price}")
+    price_history.record_many(fresh)
+
+    # Last resort: the last recorded price, reported as stale and not cached
+    for token_address in remaining:
+        label = labels.get(token_address, token_address)
+        last_known = price_history.latest(token_address)
+        if last_known is None:
+            logger.warning(f"No price data found for {label} ({token_address})")
+            continue
+        results[token_address] = last_known
+        stale_prices.add(token_address)
+        logger.warning(f"Serving last known price for {label} ({token_address}): ${last_known}")
+    return results
+
+async def _run_batch(session, batch, labels):
+    results = {}
+    try:
+        results = await _fetch_batch(session, batch, labels)
+    finally:
+        for token_address in batch:
+            future = _in_flight.pop(token_address, None)
+            if future is not None and not future.done():
+                future.set_result(results.get(token_address))
+
+@metrics.timed('prices.fetch_token_prices')
+async def fetch_token_prices(token_addresses, labels=None):
+    labels = labels or {}
+    loop = asyncio.get_running_loop()
+    session = await http_client.get_session()
+    futures = {}
+    misses = []
+    for token_address in dict.fromkeys(token_addresses):
+        future = _in_flight.get(token_address)
+        if future is None:
+            future = loop.create_future()
+            _in_flight[token_address] = future
+            misses.append(token_address)
+        else:
+            logger.debug(f"Joining in-flight request for {labels.get(token_address, token_address)} ({token_address})")
+        futures[token_address] = future
+
+    if not futures:
+        return {}
+
+    for i in range(0, len(misses), PRICE_BATCH_SIZE):
+        task = asyncio.ensure_future(_run_batch(session, misses[i:i + PRICE_BATCH_SIZE], labels))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+    # Shield so one caller going away does not cancel the lookup for the others
+    results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+    return dict(zip(futures, results))
+
+@metrics.timed('prices.get_token_prices')
+async def get_token_prices(token_addresses, labels=None):
+    # Cache-first lookup keyed by token address
+    labels = labels or {}
     prices = {}
-    async with aiohttp.ClientSession() as session:
-        for symbol, asset_data in portfolio.items():
-            token_address = asset_data['token_address']
-            cached_price = price_cache.get(token_address)
-            if cached_price is not None:
-                prices[symbol] = cached_price
-                continue
-
-            try:
-                url = f'https://api.dexscreener.com/latest/dex/tokens/{token_address}'
-                logger.debug(f"Requesting URL: {url}")
-                async with session.get(url, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if 'pairs' in data and data['pairs']:
-                            pair_data = data['pairs'][0]
-                            if 'priceUsd' in pair_data:
-                                price = float(pair_data['priceUsd'])
-                                prices[symbol] = price
-                                price_cache.set(token_address, price)
-                                logger.info(f"Successfully fetched price for {symbol} ({token_address}): ${price}")
-                            else:
-                                logger.warning(f"No priceUsd found for {symbol} ({token_address})")
-                                prices[symbol] = None
-                        else:
-                            logger.warning(f"No pairs data found for {symbol} ({token_address})")
-                            prices[symbol] = None
-                    elif response.status == 400:
-                        error_data = await response.text()
-                        logger.error(f"Bad request for {symbol} ({token_address}). Response: {error_data}")
-                        prices[symbol] = None
-                    else:
-                        logger.warning(f"Failed to fetch price for {symbol} ({token_address}). Status: {response.status}")
-                        prices[symbol] = None
-            except aiohttp.ClientError as e:
-                logger.error(f"Network error when fetching price for {symbol} ({token_address}): {str(e)}")
-                prices[symbol] = None
-            except Exception as e:
-                logger.error(f"Unexpected error when fetching price for {symbol} ({token_address}): {str(e)}")
-                prices[symbol] = None
-    return prices
\ No newline at end of file
+    misses = []
+    stale = []
+    for token_address in dict.fromkeys(token_addresses):
+        cached_price, is_fresh = price_cache.get_stale(token_address)
+        if cached_price is not None:
+            prices[token_address] = cached_price
+            if not is_fresh:
+                stale.append(token_address)
+            continue
+        misses.append(token_address)
+
+    # Serve slightly stale prices right away and refresh them in the background
+    if stale:
+        price_cache.revalidate(stale, lambda stale_addresses: fetch_token_prices(stale_addresses, labels))
+
+    if misses:
+        prices.update(await fetch_token_prices(misses, labels))
+    return prices
+
+@metrics.timed('prices.fetch_prices')
+async def fetch_prices(portfolio):
+    # Symbols sharing a token address collapse into a single lookup
+    labels = {}
+    for symbol, asset_data in portfolio.items():
+        labels.setdefault(asset_data['token_address'], symbol)
+    token_prices = await get_token_prices(labels, labels)
+    return {symbol: token_prices.get(asset_data['token_address']) for symbol, asset_data in portfolio.items()}
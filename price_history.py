@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from config import PRICE_HISTORY_DIR, PRICE_HISTORY_COMPACT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Append-only price history per token. Each token has one file per resolution
+# holding fixed 16-byte (timestamp, price) records in timestamp order. New
+# prices go to the 'raw' file; compaction rolls records older than a
+# resolution's retention into the next coarser one, keeping the last price of
+# each bucket. Reads memory-map the files and binary search them.
+
+RECORD = struct.Struct('<dd')
+
+# (name, bucket width in seconds, how long records stay at this resolution)
+RESOLUTIONS = [
+    ('raw', 0, 6 * 3600),
+    ('1m', 60, 2 * 86400),
+    ('1h', 3600, 60 * 86400),
+    ('1d', 86400, None),
+]
+
+_lock = threading.Lock()
+
+def _path(token_address, resolution):
+    digest = hashlib.sha1(token_address.encode('utf-8')).hexdigest()
+    return os.path.join(PRICE_HISTORY_DIR, f"{digest}.{resolution}.bin")
+
+def record_many(prices, timestamp=None):
+    timestamp = time.time() if timestamp is None else timestamp
+    try:
+        with _lock:
+            os.makedirs(PRICE_HISTORY_DIR, exist_ok=True)
+            for token_address, price in prices.items():
+                if price is None:
+                    continue
+                with open(_path(token_address, 'raw'), 'ab') as f:
+                    f.write(RECORD.pack(timestamp, price))
+    except OSError as e:
+        logger.error(f"Error writing price history: {str(e)}")
+
+class _Records:
+    # Read-only memory-mapped view of one history file
+
+    def __init__(self, path):
+        self._file = None
+        self._map = None
+        self.count = 0
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self.count = size // RECORD.size
+        if self.count:
+            self._file = open(path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), self.count * RECORD.size, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+
+    def __getitem__(self, index):
+        return RECORD.unpack_from(self._map, index * RECORD.size)
+
+    def timestamp(self, index):
+        return struct.unpack_from('<d', self._map, index * RECORD.size)[0]
+
+    def bisect_right(self, timestamp):
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.timestamp(mid) <= timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+def price_at(token_address, timestamp):
+    # Last known price at or before `timestamp`, from the finest resolution
+    # that reaches back that far
+    for resolution, _, _ in RESOLUTIONS:
+        with _Records(_path(token_address, resolution)) as records:
+            if not records.count or records.timestamp(0) > timestamp:
+                continue
+            return records[records.bisect_right(timestamp) - 1][1]
+    return None
+
+def latest(token_address):
+    for resolution, _, _ in RESOLUTIONS:
+        with _Records(_path(token_address, resolution)) as records:
+            if records.count:
+                return records[records.count - 1][1]
+    return None
+
+def history(token_address, start, end=None, resolution='raw'):
+    end = time.time() if end is None else end
+    with _Records(_path(token_address, resolution)) as records:
+        if not records.count:
+            return []
+        first = records.bisect_right(start - 1e-9)
+        last = records.bisect_right(end)
+        return [records[i] for i in range(first, last)]
+
+def _read_all(path):
+    with _Records(path) as records:
+        return [records[i] for i in range(records.count)]
+
+def _write_all(path, rows):
+    if not rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for row in rows:
+            f.write(RECORD.pack(*row))
+    os.replace(tmp_path, path)
+
+def _compact_token(digest, now):
+    for (source, _, retention), (target, width, _) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+        source_path = os.path.join(PRICE_HISTORY_DIR, f"{digest}.{source}.bin")
+        target_path = os.path.join(PRICE_HISTORY_DIR, f"{digest}.{target}.bin")
+        rows = _read_all(source_path)
+        cutoff = now - retention
+        split = next((i for i, (timestamp, _) in enumerate(rows) if timestamp >= cutoff), len(rows))
+        if not split:
+            continue
+        buckets = {}
+        for timestamp, price in rows[:split]:
+            buckets[timestamp - timestamp % width] = price
+        merged = dict(_read_all(target_path))
+        merged.update(buckets)
+        _write_all(target_path, sorted(merged.items()))
+        _write_all(source_path, rows[split:])
+
+def compact(now=None):
+    now = time.time() if now is None else now
+    started = time.perf_counter()
+    try:
+        names = os.listdir(PRICE_HISTORY_DIR)
+    except FileNotFoundError:
+        return 0
+    digests = {name.split('.', 1)[0] for name in names if name.endswith('.bin')}
+    for digest in digests:
+        # Per-token lock hold keeps appends from the event loop waiting briefly
+        with _lock:
+            try:
+                _compact_token(digest, now)
+            except OSError as e:
+                logger.error(f"Error compacting price history {digest}: {str(e)}")
+    logger.info(f"Compacted price history for {len(digests)} tokens in {time.perf_counter() - started:.2f}s")
+    return len(digests)
+
+async def _compact_job(context):
+    await asyncio.to_thread(compact)
+
+def schedule(application):
+    if application.job_queue is None:
+        logger.warning("JobQueue is not available, price history will not be compacted")
+        return None
+    return application.job_queue.run_repeating(
+        _compact_job, interval=PRICE_HISTORY_COMPACT_INTERVAL, first=PRICE_HISTORY_COMPACT_INTERVAL,
+        name='price_history_compact'
+    )
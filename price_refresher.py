@@ -0,0 +1,100 @@
+import logging
+import time
+import alerts
+import metrics
+from config import PRICE_REFRESH_INTERVAL, PRICE_REFRESH_MAX_REQUESTS, PRICE_BATCH_SIZE
+from database import get_token_addresses
+from price_fetcher import batch_order, estimate_requests, fetch_token_prices
+
+logger = logging.getLogger(__name__)
+
+# Last time each token was shown to a user; the refresher spends its request
+# budget on the most recently viewed tokens first.
+_last_viewed = {}
+
+def within_budget(ordered):
+    # The longest prefix of `ordered` (most wanted first) whose lookup stays
+    # within PRICE_REFRESH_MAX_REQUESTS upstream requests, counting the
+    # per-chain requests of each batch, in the order it should be fetched
+    low, high = 0, min(len(ordered), PRICE_REFRESH_MAX_REQUESTS * PRICE_BATCH_SIZE)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_requests(sorted(ordered[:middle], key=batch_order)) <= PRICE_REFRESH_MAX_REQUESTS:
+            low = middle
+        else:
+            high = middle - 1
+    return sorted(ordered[:low], key=batch_order)
+
+stats = {
+    'runs': 0,
+    'errors': 0,
+    'tokens_refreshed': 0,
+    'tokens_failed': 0,
+    'tokens_skipped': 0,
+    'last_duration': 0.0,
+    'total_duration': 0.0,
+    'last_run': None,
+}
+
+metrics.register_source('price_refresh', lambda: stats)
+
+def mark_viewed(token_addresses):
+    now = time.time()
+    for token_address in token_addresses:
+        _last_viewed[token_address] = now
+
+async def refresh_prices(context=None):
+    started = time.perf_counter()
+    try:
+        token_addresses = await get_token_addresses()
+        # Tokens with alert rules come first so alerts are checked every cycle
+        try:
+            watched = await alerts.watched_token_addresses()
+        except Exception as e:
+            # Prices are still refreshed; the rules are loaded again next cycle
+            logger.error(f"Error loading alert rules: {str(e)}")
+            watched = set()
+        ordered = sorted(token_addresses | watched,
+                         key=lambda address: (address in watched, _last_viewed.get(address, 0)), reverse=True)
+        selected = within_budget(ordered)
+        prices = await fetch_token_prices(selected) if selected else {}
+        await alerts.evaluate(context.bot if context is not None else None, prices)
+        failed = sum(1 for price in prices.values() if price is None)
+        stats['tokens_refreshed'] += len(prices) - failed
+        stats['tokens_failed'] += failed
+        stats['tokens_skipped'] += len(ordered) - len(selected)
+        logger.info(f"Background refresh updated {len(prices) - failed} of {len(ordered)} tokens ({failed} failed)")
+    except Exception as e:
+        stats['errors'] += 1
+        logger.error(f"Background price refresh failed: {str(e)}")
+    finally:
+        duration = time.perf_counter() - started
+        stats['runs'] += 1
+        stats['last_duration'] = duration
+        stats['total_duration'] += duration
+        stats['last_run'] = time.time()
+
+async def prewarm():
+    # Fills the price cache for held tokens at startup, within one refresh
+    # cycle's request budget. Alerts are left to the regular refresh, which
+    # can notify users once the bot is running.
+    token_addresses = await get_token_addresses()
+    selected = within_budget(sorted(token_addresses))
+    if not selected:
+        return 0
+    prices = await fetch_token_prices(selected)
+    fetched = sum(1 for price in prices.values() if price is not None)
+    logger.info(f"Prewarmed prices for {fetched} of {len(token_addresses)} tokens")
+    return fetched
+
+def schedule(application, first=0):
+    # `first` delays the first run, e.g. when prices were just prewarmed
+    if PRICE_REFRESH_INTERVAL <= 0:
+        logger.info("Background price refresh disabled")
+        return None
+    if application.job_queue is None:
+        logger.warning("JobQueue is not available, install python-telegram-bot[job-queue] to enable background price refresh")
+        return None
+    return application.job_queue.run_repeating(
+        refresh_prices, interval=PRICE_REFRESH_INTERVAL, first=first, name='price_refresh'
+    )
@@ -0,0 +1,148 @@
+import asyncio
+import aiohttp
+import logging
+import token_metadata
+from config import GECKOTERMINAL_NETWORK
+
+logger = logging.getLogger(__name__)
+
+class PriceSourceError(Exception):
+    # A transient upstream failure (timeout, connection error, 429 or 5xx)
+    # that is worth retrying and counts against the source's circuit breaker
+    pass
+
+class PriceSource:
+    # One upstream price API. fetch() returns {token_address: price or None}
+    # for a batch of at most `max_batch` addresses; a token the source does
+    # not know is None, a failed request raises PriceSourceError.
+
+    name = None
+    max_batch = 30
+
+    async def fetch(self, session, batch, timeout):
+        raise NotImplementedError
+
+    def requests_for(self, batch):
+        # HTTP requests fetch() will make for `batch` when every one succeeds
+        return 1
+
+    async def _get_json(self, session, url, timeout):
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    return await response.json()
+                if response.status == 429 or response.status >= 500:
+                    raise PriceSourceError(f"{self.name} returned status {response.status}")
+                # Anything else is about the request itself; retrying won't help
+                error_data = await response.text()
+                logger.error(f"{self.name} rejected {url} with status {response.status}: {error_data}")
+                return None
+        except asyncio.TimeoutError:
+            raise PriceSourceError(f"{self.name} timed out after {timeout}s")
+        except aiohttp.ClientError as e:
+            raise PriceSourceError(f"Network error from {self.name}: {str(e)}")
+
+class DexScreenerSource(PriceSource):
+    # Tokens with a known best pair are priced through the pairs endpoint,
+    # which returns just those pairs. Unknown tokens, and tokens whose pair
+    # has disappeared, go through the tokens endpoint, which returns every
+    # pair of the token; the best one is picked and remembered.
+    name = 'dexscreener'
+    TOKENS_URL = 'https://api.dexscreener.com/latest/dex/tokens/'
+    PAIRS_URL = 'https://api.dexscreener.com/latest/dex/pairs/{chain_id}/{pair_addresses}'
+
+    def requests_for(self, batch):
+        # One pairs request per chain of the known tokens, plus a tokens
+        # request if any token is unknown
+        metadata = [token_metadata.get(token_address) for token_address in batch]
+        chains = {entry['chain_id'] for entry in metadata if entry is not None}
+        return len(chains) + (None in metadata)
+
+    async def fetch(self, session, batch, timeout):
+        results = dict.fromkeys(batch)
+        by_chain = {}
+        for token_address in batch:
+            metadata = token_metadata.get(token_address)
+            if metadata is not None:
+                by_chain.setdefault(metadata['chain_id'], {})[metadata['pair_address'].lower()] = token_address
+
+        for chain_id, pairs in by_chain.items():
+            url = self.PAIRS_URL.format(chain_id=chain_id, pair_addresses=','.join(
+                token_metadata.get(token_address)['pair_address'] for token_address in pairs.values()))
+            data = await self._get_json(session, url, timeout)
+            for pair_data in (data or {}).get('pairs') or []:
+                token_address = pairs.get((pair_data.get('pairAddress') or '').lower())
+                if token_address is not None:
+                    results[token_address] = self._price(pair_data, token_address)
+
+        discover = [token_address for token_address, price in results.items() if price is None]
+        if discover:
+            data = await self._get_json(session, self.TOKENS_URL + ','.join(discover), timeout)
+            if data is not None:
+                best_pairs = token_metadata.select_best_pairs(data.get('pairs') or [], discover)
+                for token_address, pair_data in best_pairs.items():
+                    if pair_data is None:
+                        token_metadata.forget(token_address)
+                        continue
+                    token_metadata.remember(token_address, pair_data)
+                    results[token_address] = self._price(pair_data, token_address)
+        return results
+
+    def _price(self, pair_data, token_address):
+        try:
+            return float(pair_data['priceUsd'])
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Invalid priceUsd for {token_address}: {pair_data.get('priceUsd')}")
+            return None
+
+class GeckoTerminalSource(PriceSource):
+    # GeckoTerminal prices tokens per network. The network comes from the
+    # token's DexScreener metadata when known; otherwise addresses that are
+    # not EVM style (0x...) are looked up on Solana, everything else on
+    # GECKOTERMINAL_NETWORK.
+    name = 'geckoterminal'
+    TOKEN_PRICE_URL = 'https://api.geckoterminal.com/api/v2/simple/networks/{network}/token_price/{addresses}'
+
+    def network_for(self, token_address):
+        network = token_metadata.geckoterminal_network(token_address)
+        if network is not None:
+            return network
+        return GECKOTERMINAL_NETWORK if token_address.startswith('0x') else 'solana'
+
+    def requests_for(self, batch):
+        return len({self.network_for(token_address) for token_address in batch})
+
+    async def fetch(self, session, batch, timeout):
+        results = dict.fromkeys(batch)
+        by_network = {}
+        for token_address in batch:
+            by_network.setdefault(self.network_for(token_address), []).append(token_address)
+        for network, addresses in by_network.items():
+            url = self.TOKEN_PRICE_URL.format(network=network, addresses=','.join(addresses))
+            data = await self._get_json(session, url, timeout)
+            if data is None:
+                continue
+            token_prices = ((data.get('data') or {}).get('attributes') or {}).get('token_prices') or {}
+            token_prices = {address.lower(): price for address, price in token_prices.items()}
+            for token_address in addresses:
+                price = token_prices.get(token_address.lower())
+                if price is None:
+                    continue
+                try:
+                    results[token_address] = float(price)
+                except (TypeError, ValueError):
+                    logger.warning(f"Invalid {self.name} price for {token_address}: {price}")
+        return results
+
+SOURCES = {
+    DexScreenerSource.name: DexScreenerSource,
+    GeckoTerminalSource.name: GeckoTerminalSource,
+}
+
+def create_sources(names):
+    sources = []
+    for name in names:
+        if name not in SOURCES:
+            raise ValueError(f"Unknown price source: {name}")
+        sources.append(SOURCES[name]())
+    return sources
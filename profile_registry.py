@@ -0,0 +1,104 @@
+import heapq
+import json
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+def stable_hash(name):
+    # Python's hash() is salted per process; shard and lock placement must not be
+    return zlib.crc32(name.encode('utf-8'))
+
+class ProfileRegistry:
+    # Maps profile names to the sheet cell holding their portfolio JSON.
+    #
+    # The index is split across `shards` JSON blobs (cells A1, A2, ...), each
+    # holding the profiles whose name hashes to it, so a profile mutation only
+    # rewrites one shard. A1 is shard 0, which keeps a legacy single-blob index
+    # readable; entries found in the wrong shard are moved on the next save.
+    # The shard count can be raised at any time but should not be lowered.
+    #
+    # Portfolio rows are allocated from a free-list of released rows before
+    # extending past the highest row in use, so a deleted profile's row is
+    # reused instead of colliding with a live one.
+
+    FIRST_ROW = 3
+    ROW_STEP = 2
+    PORTFOLIO_COL = 2
+
+    def __init__(self, shards=1):
+        self.shards = shards
+        self.slots = {}
+        self._shard_entries = [{} for _ in range(shards)]
+        self._free_rows = []
+        self._next_row = self.FIRST_ROW
+        self.dirty_shards = set()
+
+    @classmethod
+    def load(cls, shard_values, shards):
+        registry = cls(shards)
+        for index, value in enumerate(shard_values):
+            entries = json.loads(value) if value else {}
+            for name, address in entries.items():
+                shard = registry.shard_of(name)
+                if shard != index:
+                    registry.dirty_shards.update((index, shard))
+                registry.slots[name] = list(address)
+                registry._shard_entries[shard][name] = registry.slots[name]
+        registry._rebuild_free_rows()
+        return registry
+
+    def _rebuild_free_rows(self):
+        used = set()
+        for name, (row, col) in self.slots.items():
+            if row in used:
+                logger.warning(f"Profile {name} shares portfolio row {row} with another profile")
+            used.add(row)
+        highest = max(used, default=self.FIRST_ROW - self.ROW_STEP)
+        self._next_row = highest + self.ROW_STEP
+        self._free_rows = [row for row in range(self.FIRST_ROW, highest, self.ROW_STEP) if row not in used]
+        heapq.heapify(self._free_rows)
+
+    def shard_of(self, name):
+        return stable_hash(name) % self.shards
+
+    def __contains__(self, name):
+        return name in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, name):
+        return self.slots.get(name)
+
+    def allocate(self, name):
+        if self._free_rows:
+            row = heapq.heappop(self._free_rows)
+        else:
+            row = self._next_row
+            self._next_row += self.ROW_STEP
+        address = [row, self.PORTFOLIO_COL]
+        shard = self.shard_of(name)
+        self.slots[name] = address
+        self._shard_entries[shard][name] = address
+        self.dirty_shards.add(shard)
+        return address
+
+    def release(self, name):
+        address = self.slots.pop(name)
+        shard = self.shard_of(name)
+        self._shard_entries[shard].pop(name, None)
+        heapq.heappush(self._free_rows, address[0])
+        self.dirty_shards.add(shard)
+        return address
+
+    def shard_cell(self, index):
+        return index + 1, 1
+
+    def shard_payload(self, index):
+        return json.dumps(self._shard_entries[index])
+
+    def take_dirty(self):
+        dirty = sorted(self.dirty_shards)
+        self.dirty_shards.clear()
+        return dirty
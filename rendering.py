@@ -0,0 +1,80 @@
+import logging
+import metrics
+from collections import OrderedDict
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def paginate(header, lines, footer, limit=TELEGRAM_MESSAGE_LIMIT, reserve=100):
+    # Split `lines` into pages that each fit in one message together with the
+    # header, the footer and `reserve` characters left for per-page extras
+    # such as a timestamp or page counter.
+    fixed = len("\n".join(header)) + len("\n".join(footer)) + 2
+    budget = max(limit - fixed - reserve, 1)
+    pages = []
+    current = []
+    size = 0
+    for line in lines:
+        line = line[:budget]
+        if current and size + len(line) + 1 > budget:
+            pages.append(current)
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line) + 1
+    pages.append(current)
+    return ["\n".join(header + page + footer) for page in pages]
+
+def _markup_key(reply_markup):
+    if reply_markup is None:
+        return None
+    return tuple(
+        tuple((button.text, button.callback_data) for button in row)
+        for row in reply_markup.inline_keyboard
+    )
+
+class MessageRenderer:
+    # Remembers what each bot message currently shows so an edit that would
+    # not change anything visible is skipped instead of costing a round-trip
+    # and being rejected with "message is not modified".
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._rendered = OrderedDict()
+        self.edits = 0
+        self.skipped = 0
+
+    def _key(self, query):
+        if query.message is not None:
+            return query.message.chat_id, query.message.message_id
+        return query.inline_message_id
+
+    def forget(self, query):
+        self._rendered.pop(self._key(query), None)
+
+    async def edit(self, query, text, reply_markup=None, signature=None):
+        # `signature` identifies the content that matters; it defaults to the
+        # text, but callers can leave out parts like a "last updated" time.
+        key = self._key(query)
+        rendered = (text if signature is None else signature, _markup_key(reply_markup))
+        if self._rendered.get(key) == rendered:
+            self.skipped += 1
+            return False
+        try:
+            await query.edit_message_text(text, reply_markup=reply_markup)
+            self.edits += 1
+        except BadRequest as e:
+            if 'message is not modified' not in str(e).lower():
+                raise
+            self.skipped += 1
+        self._rendered[key] = rendered
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > self.max_entries:
+            self._rendered.popitem(last=False)
+        return True
+
+message_renderer = MessageRenderer()
+metrics.register_source('renderer', lambda: {'edits': message_renderer.edits, 'skipped': message_renderer.skipped,
+                                              'tracked': len(message_renderer._rendered)})
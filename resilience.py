@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    # Stops calling an upstream that keeps failing. After `failure_threshold`
+    # consecutive failures the circuit opens and calls fail immediately; after
+    # `reset_timeout` seconds a single trial call is let through (half-open),
+    # and its outcome closes the circuit again or re-opens it.
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._trial_running = False
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        finally:
+            # A cancelled trial is neither outcome, but must not leave the
+            # half-open circuit waiting on it for good
+            self._trial_running = False
+        self.record_success()
+        return result
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'rejected': self.rejected,
+        }
+
+def backoff_delay(attempt, base, cap):
+    # "Full jitter": a random delay up to the exponential backoff, so clients
+    # that failed together do not retry together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+async def retry(func, *args, retries=2, base_delay=0.25, max_delay=2.0, deadline=None, retry_on=(Exception,)):
+    # Calls `func` up to `retries + 1` times. `deadline` is a monotonic time
+    # after which no further attempt is started.
+    attempt = 0
+    while True:
+        try:
+            return await func(*args)
+        except retry_on:
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,178 @@
+import asyncio
+import contextlib
+import logging
+import time
+import metrics
+from collections import deque
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_RATE_PERIOD, TELEGRAM_GROUP_RATE,
+    TELEGRAM_GROUP_RATE_PERIOD, TELEGRAM_MAX_RETRIES, PROGRESS_MESSAGE_DELAY
+)
+
+logger = logging.getLogger(__name__)
+
+stats = {
+    'queued': 0,
+    'sent': 0,
+    'collapsed': 0,
+    'throttled': 0,
+    'waiting': 0,
+}
+
+metrics.register_source('send_queue', lambda: stats)
+
+class _Window:
+    # Sliding-window limiter: at most `max_rate` acquisitions per `period`
+    # seconds. Waiters are served in arrival order.
+
+    def __init__(self, max_rate, period):
+        self.max_rate = max_rate
+        self.period = period
+        self._times = deque()
+        self._lock = asyncio.Lock()
+
+    def _trim(self, now):
+        while self._times and now - self._times[0] >= self.period:
+            self._times.popleft()
+
+    def idle(self):
+        self._trim(time.monotonic())
+        return not self._times
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._trim(now)
+                if len(self._times) < self.max_rate:
+                    self._times.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - self._times[0]))
+
+class SendRateLimiter(BaseRateLimiter):
+    # Shapes every Bot API call made through the application: requests that
+    # target a chat wait for a slot in the global window and in that chat's
+    # own window (groups and channels have a much lower allowance than
+    # private chats). A 429 pauses all outgoing requests for its
+    # `retry_after` and the request is retried up to `max_retries` times.
+
+    MAX_CHAT_WINDOWS = 1024
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE,
+                 chat_period=TELEGRAM_CHAT_RATE_PERIOD, group_rate=TELEGRAM_GROUP_RATE,
+                 group_period=TELEGRAM_GROUP_RATE_PERIOD, max_retries=TELEGRAM_MAX_RETRIES):
+        self._global = _Window(global_rate, 1) if global_rate > 0 else None
+        self.chat_rate = chat_rate
+        self.chat_period = chat_period
+        self.group_rate = group_rate
+        self.group_period = group_period
+        self.max_retries = max_retries
+        self._chats = {}
+        self._resume = asyncio.Event()
+        self._resume.set()
+        self._first_response_since = None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def measure_first_response(self, since):
+        # Records the time from `since` (a perf_counter() reading) to the
+        # first request delivered to a chat as startup.first_response
+        self._first_response_since = since
+
+    def _chat_window(self, chat_id):
+        window = self._chats.get(chat_id)
+        if window is not None:
+            return window
+        if len(self._chats) >= self.MAX_CHAT_WINDOWS:
+            for key in [key for key, value in self._chats.items() if value.idle()]:
+                del self._chats[key]
+        # Negative ids and @usernames are groups, supergroups and channels
+        if isinstance(chat_id, str) or chat_id < 0:
+            rate, period = self.group_rate, self.group_period
+        else:
+            rate, period = self.chat_rate, self.chat_period
+        if rate <= 0:
+            return None
+        window = self._chats[chat_id] = _Window(rate, period)
+        return window
+
+    async def _acquire(self, chat_id):
+        if chat_id is None:
+            return
+        stats['waiting'] += 1
+        try:
+            window = self._chat_window(chat_id)
+            if window is not None:
+                await window.acquire()
+            if self._global is not None:
+                await self._global.acquire()
+        finally:
+            stats['waiting'] -= 1
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        stats['queued'] += 1
+        for attempt in range(max_retries + 1):
+            with metrics.timer('telegram.wait'):
+                await self._resume.wait()
+                await self._acquire(chat_id)
+            try:
+                with metrics.timer(f"telegram.{endpoint}"):
+                    result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                stats['throttled'] += 1
+                if attempt == max_retries:
+                    logger.error(f"Giving up on {endpoint} after {attempt + 1} rate-limited attempts")
+                    raise
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"Rate limited on {endpoint}, pausing sends for {retry_after}s")
+                self._resume.clear()
+                try:
+                    await asyncio.sleep(retry_after + 0.1)
+                finally:
+                    self._resume.set()
+                continue
+            stats['sent'] += 1
+            if self._first_response_since is not None and chat_id is not None:
+                metrics.observe('startup.first_response', time.perf_counter() - self._first_response_since)
+                self._first_response_since = None
+            return result
+
+class ProgressReply:
+    # A "working on it" reply that is only sent if the real answer is not
+    # ready within `delay` seconds. Fast operations then produce a single
+    # message instead of a progress line immediately followed by the result.
+
+    def __init__(self, message, text, delay=PROGRESS_MESSAGE_DELAY):
+        self.message = message
+        self._sending = False
+        self._task = asyncio.ensure_future(self._send_later(text, delay))
+
+    async def _send_later(self, text, delay):
+        await asyncio.sleep(delay)
+        self._sending = True
+        try:
+            await self.message.reply_text(text)
+        except Exception as e:
+            logger.error(f"Error sending progress message: {str(e)}")
+
+    async def finish(self, text, **kwargs):
+        if self._sending:
+            # Already on its way; keep the order progress -> result
+            await self._task
+        else:
+            self._task.cancel()
+            stats['collapsed'] += 1
+        return await self.message.reply_text(text, **kwargs)
+
+def progress(message, text):
+    return ProgressReply(message, text)
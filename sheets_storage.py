@@ -0,0 +1,317 @@
+import asyncio
+import copy
+import json
+import logging
+import metrics
+from gspread_asyncio import AsyncioGspreadClientManager
+import gspread
+from config import (GOOGLE_SHEETS_CRED_FILE, GOOGLE_SHEET_ID, SHEETS_WRITE_BEHIND, SHEETS_FLUSH_INTERVAL,
+                    SHEETS_FLUSH_MAX_PENDING, SHEETS_JOURNAL_PATH, PROFILE_INDEX_SHARDS)
+from profile_registry import ProfileRegistry
+from storage import Storage
+from write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+def get_creds():
+    # Called by gspread_asyncio in an executor thread, which keeps the
+    # google-auth import off the event loop too
+    from google.oauth2.service_account import Credentials
+    try:
+        creds = Credentials.from_service_account_file(GOOGLE_SHEETS_CRED_FILE)
+        scoped = creds.with_scopes([
+            "https://spreadsheets.google.com/feeds",
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive",
+        ])
+        return scoped
+    except Exception as e:
+        logger.error(f"Error loading credentials: {str(e)}")
+        raise
+
+class SheetsStorage(Storage):
+    # The profile index lives in column A as sharded JSON blobs (see
+    # ProfileRegistry); each profile's portfolio is a JSON blob in column B
+    # and its alert rules a JSON list in column C of the same row.
+
+    ALERTS_COL = 3
+    # Google Sheets rejects cells longer than this many characters
+    CELL_LIMIT = 50000
+
+    def __init__(self):
+        super().__init__()
+        self.agcm = AsyncioGspreadClientManager(get_creds)
+        # Spreadsheet handles resolved once and reused. agcm.authorize()
+        # returns its cached client until the credentials need refreshing, so
+        # a new client object is the signal to resolve the worksheet again.
+        self._client = None
+        self._worksheet = None
+        # In-memory copy of the profile index and each portfolio. Reads are
+        # served from memory once loaded. Writes update it and then either go
+        # straight to the sheet or, with write-behind enabled, are queued,
+        # coalesced and flushed in batches.
+        self._registry = None
+        self._registry_lock = asyncio.Lock()
+        self._portfolio_cache = {}
+        self._alerts_cache = {}
+        self._writes = None
+        if SHEETS_WRITE_BEHIND:
+            self._writes = WriteBehindQueue(
+                self.get_sheet,
+                interval=SHEETS_FLUSH_INTERVAL,
+                max_pending=SHEETS_FLUSH_MAX_PENDING,
+                journal_path=SHEETS_JOURNAL_PATH,
+            )
+            metrics.register_source('sheets_writes', self._writes.stats)
+
+    def reset_sheet(self):
+        self._client = None
+        self._worksheet = None
+
+    def _check_api_error(self, e):
+        # Drop the cached handles on auth or not-found errors so the next call
+        # re-authorizes and re-opens the worksheet.
+        if isinstance(e, (gspread.exceptions.SpreadsheetNotFound, gspread.exceptions.WorksheetNotFound)):
+            self.reset_sheet()
+        elif isinstance(e, gspread.exceptions.APIError) and e.response.status_code in (401, 403, 404):
+            self.reset_sheet()
+
+    async def get_sheet(self):
+        try:
+            agc = await self.agcm.authorize()
+            if self._worksheet is None or agc is not self._client:
+                sheet = await agc.open_by_key(GOOGLE_SHEET_ID)
+                self._worksheet = await sheet.worksheet("Portfolio")
+                self._client = agc
+                logger.info("Google Sheet worksheet resolved")
+            return self._worksheet
+        except gspread.exceptions.APIError as e:
+            self._check_api_error(e)
+            if e.response.status_code == 403:
+                logger.error("Permission denied when accessing Google Sheet. Please check your credentials and sheet permissions.")
+            else:
+                logger.error(f"API Error when accessing Google Sheet: {str(e)}")
+            raise
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Unexpected error when accessing Google Sheet: {str(e)}")
+            raise
+
+    async def prewarm(self):
+        # Authorize, open the worksheet and load the profile index up front so
+        # the first user interaction does not pay for it.
+        sheet = await self.get_sheet()
+        if self._writes is not None:
+            # Push anything replayed from the journal before reading
+            await self._writes.flush()
+        registry = await self._load_registry(sheet)
+        logger.info(f"Google Sheet prewarmed with {len(registry)} profiles")
+
+    async def close(self):
+        if self._writes is not None:
+            try:
+                await self._writes.close()
+            except Exception as e:
+                logger.error(f"Error flushing sheet writes on shutdown, they remain in the journal: {str(e)}")
+
+    async def _write_cell(self, sheet, row, col, value):
+        if self._writes is not None:
+            await self._writes.put(row, col, value)
+        else:
+            await sheet.update_cell(row, col, value)
+
+    async def _read_cell(self, sheet, row, col):
+        # A queued write is newer than whatever the sheet holds
+        if self._writes is not None:
+            value = self._writes.get(row, col)
+            if value is not None:
+                return value
+        cell = await sheet.cell(row, col)
+        return cell.value if cell and cell.value else '{}'
+
+    async def _read_column(self, sheet, col, rows):
+        cells = await sheet.range(1, col, rows, col)
+        values = {cell.row: cell.value for cell in cells}
+        if self._writes is not None:
+            for row in range(1, rows + 1):
+                value = self._writes.get(row, col)
+                if value is not None:
+                    values[row] = value
+        return [values.get(row) or '' for row in range(1, rows + 1)]
+
+    def invalidate_cache(self, profile_name=None):
+        if profile_name is None:
+            self._registry = None
+            self._portfolio_cache.clear()
+            self._alerts_cache.clear()
+        else:
+            self._portfolio_cache.pop(profile_name, None)
+            self._alerts_cache.pop(profile_name, None)
+
+    async def refresh(self):
+        if self._writes is not None:
+            await self._writes.flush()
+        self.invalidate_cache()
+        profiles = await self.get_profiles()
+        for profile_name in profiles:
+            await self.get_portfolio(profile_name)
+        logger.info(f"Cache refreshed with {len(profiles)} profiles")
+
+    async def _load_registry(self, sheet):
+        if self._registry is None:
+            async with self._registry_lock:
+                if self._registry is None:
+                    shard_values = await self._read_column(sheet, 1, PROFILE_INDEX_SHARDS)
+                    registry = ProfileRegistry.load(shard_values, PROFILE_INDEX_SHARDS)
+                    self._registry = registry
+                    if registry.dirty_shards:
+                        logger.info("Rewriting profile index into its shard layout")
+                        await self._save_registry(sheet)
+        return self._registry
+
+    async def _save_registry(self, sheet):
+        for index in self._registry.take_dirty():
+            await self._write_cell(sheet, *self._registry.shard_cell(index), self._registry.shard_payload(index))
+
+    async def get_profiles(self):
+        try:
+            if self._registry is None:
+                sheet = await self.get_sheet()
+                await self._load_registry(sheet)
+            return dict(sorted(self._registry.slots.items(), key=lambda item: item[1][0]))
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error getting profiles: {str(e)}")
+            return {}
+
+    async def get_portfolio(self, profile_name):
+        try:
+            if profile_name in self._portfolio_cache:
+                return copy.deepcopy(self._portfolio_cache[profile_name])
+            sheet = await self.get_sheet()
+            registry = await self._load_registry(sheet)
+            cell_address = registry.get(profile_name)
+            if cell_address is None:
+                return {}
+            cell_value = await self._read_cell(sheet, *cell_address)
+            portfolio = json.loads(cell_value)
+            self._portfolio_cache[profile_name] = portfolio
+            return copy.deepcopy(portfolio)
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error getting portfolio for profile {profile_name}: {str(e)}")
+            return {}
+
+    async def update_portfolio(self, profile_name, portfolio):
+        try:
+            sheet = await self.get_sheet()
+            registry = await self._load_registry(sheet)
+            cell_address = registry.get(profile_name)
+            if cell_address is None:
+                raise ValueError(f"Profile {profile_name} does not exist")
+            value = json.dumps(portfolio)
+            # Checked here rather than left to the API, where a queued
+            # write-behind batch would keep failing
+            if len(value) > self.CELL_LIMIT:
+                raise ValueError(f"Portfolio for profile {profile_name} is too large for one sheet cell "
+                                 f"({len(value)} of {self.CELL_LIMIT} characters); use STORAGE_BACKEND=sqlite")
+            await self._write_cell(sheet, *cell_address, value)
+            self._portfolio_cache[profile_name] = copy.deepcopy(portfolio)
+            logger.info(f"Portfolio for profile {profile_name} updated successfully")
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error updating portfolio for profile {profile_name}: {str(e)}")
+            raise
+
+    async def create_profile(self, profile_name):
+        try:
+            async with self.profile_lock(profile_name):
+                sheet = await self.get_sheet()
+                registry = await self._load_registry(sheet)
+                if profile_name in registry:
+                    raise ValueError(f"Profile {profile_name} already exists")
+                cell_address = registry.allocate(profile_name)
+                self._portfolio_cache[profile_name] = {}
+                await self._write_cell(sheet, *cell_address, '{}')  # Initialize empty portfolio
+                await self._save_registry(sheet)
+            logger.info(f"Profile {profile_name} created successfully")
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error creating profile {profile_name}: {str(e)}")
+            raise
+
+    async def delete_profile(self, profile_name):
+        try:
+            async with self.profile_lock(profile_name):
+                sheet = await self.get_sheet()
+                registry = await self._load_registry(sheet)
+                if profile_name not in registry:
+                    raise ValueError(f"Profile {profile_name} does not exist")
+                cell_address = registry.release(profile_name)
+                self._portfolio_cache.pop(profile_name, None)
+                # Unless the alerts are known to be empty, clear their cell too
+                had_alerts = bool(self._alerts_cache.pop(profile_name, True))
+                await self._save_registry(sheet)
+                await self._write_cell(sheet, *cell_address, '')  # Free the row for reuse
+                if had_alerts:
+                    await self._write_cell(sheet, cell_address[0], self.ALERTS_COL, '')
+            logger.info(f"Profile {profile_name} deleted successfully")
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error deleting profile {profile_name}: {str(e)}")
+            raise
+
+    async def get_alerts(self, profile_name):
+        try:
+            if profile_name in self._alerts_cache:
+                return copy.deepcopy(self._alerts_cache[profile_name])
+            sheet = await self.get_sheet()
+            registry = await self._load_registry(sheet)
+            cell_address = registry.get(profile_name)
+            if cell_address is None:
+                return []
+            cell_value = await self._read_cell(sheet, cell_address[0], self.ALERTS_COL)
+            alerts = json.loads(cell_value) if cell_value != '{}' else []
+            self._alerts_cache[profile_name] = alerts
+            return copy.deepcopy(alerts)
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error getting alerts for profile {profile_name}: {str(e)}")
+            return []
+
+    async def set_alerts(self, profile_name, alerts):
+        try:
+            sheet = await self.get_sheet()
+            registry = await self._load_registry(sheet)
+            cell_address = registry.get(profile_name)
+            if cell_address is None:
+                raise ValueError(f"Profile {profile_name} does not exist")
+            await self._write_cell(sheet, cell_address[0], self.ALERTS_COL, json.dumps(alerts) if alerts else '')
+            self._alerts_cache[profile_name] = copy.deepcopy(alerts)
+        except Exception as e:
+            self._check_api_error(e)
+            logger.error(f"Error updating alerts for profile {profile_name}: {str(e)}")
+            raise
+
+    async def get_all_alerts(self):
+        # One range read of column C instead of a cell read per profile
+        try:
+            profiles = await self.get_profiles()
+            if not profiles:
+                return {}
+            sheet = await self.get_sheet()
+            last_row = max(row for row, _ in profiles.values())
+            values = await self._read_column(sheet, self.ALERTS_COL, last_row)
+            all_alerts = {}
+            for profile_name, (row, _) in profiles.items():
+                alerts = json.loads(values[row - 1]) if values[row - 1] else []
+                self._alerts_cache[profile_name] = alerts
+                if alerts:
+                    all_alerts[profile_name] = copy.deepcopy(alerts)
+            return all_alerts
+        except Exception as e:
+            # Raised rather than read as "no alerts", which the alert index
+            # would otherwise keep as the real state
+            self._check_api_error(e)
+            logger.error(f"Error getting alerts: {str(e)}")
+            raise
@@ -0,0 +1,234 @@
+import json
+import logging
+import sqlite3
+from config import SQLITE_DB_PATH
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS assets (
+    profile_id INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    symbol TEXT NOT NULL,
+    amount REAL NOT NULL,
+    token_address TEXT NOT NULL,
+    PRIMARY KEY (profile_id, symbol)
+);
+CREATE INDEX IF NOT EXISTS idx_assets_token_address ON assets(token_address);
+CREATE TABLE IF NOT EXISTS alerts (
+    profile_id INTEGER PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+    rules TEXT NOT NULL
+);
+"""
+
+class SqliteStorage(Storage):
+    # Local single-file database. Queries are small indexed lookups that
+    # finish in microseconds, so they run directly on the event loop.
+
+    def __init__(self, path=SQLITE_DB_PATH):
+        super().__init__()
+        self.path = path
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            logger.info(f"SQLite database opened at {self.path}")
+        return self._conn
+
+    def _profile_id(self, conn, profile_name):
+        row = conn.execute("SELECT id FROM profiles WHERE name = ?", (profile_name,)).fetchone()
+        return row[0] if row else None
+
+    async def prewarm(self):
+        self._connect()
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            logger.info("SQLite database closed")
+
+    async def get_profiles(self):
+        try:
+            conn = self._connect()
+            return {name: profile_id for profile_id, name in conn.execute("SELECT id, name FROM profiles ORDER BY id")}
+        except Exception as e:
+            logger.error(f"Error getting profiles: {str(e)}")
+            return {}
+
+    async def get_portfolio(self, profile_name):
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT a.symbol, a.amount, a.token_address FROM assets a "
+                "JOIN profiles p ON p.id = a.profile_id WHERE p.name = ? ORDER BY a.rowid",
+                (profile_name,),
+            )
+            return {symbol: {'amount': amount, 'token_address': token_address} for symbol, amount, token_address in rows}
+        except Exception as e:
+            logger.error(f"Error getting portfolio for profile {profile_name}: {str(e)}")
+            return {}
+
+    async def get_token_addresses(self):
+        try:
+            conn = self._connect()
+            return {row[0] for row in conn.execute("SELECT DISTINCT token_address FROM assets")}
+        except Exception as e:
+            logger.error(f"Error getting token addresses: {str(e)}")
+            return set()
+
+    async def update_portfolio(self, profile_name, portfolio):
+        try:
+            conn = self._connect()
+            with conn:
+                profile_id = self._profile_id(conn, profile_name)
+                if profile_id is None:
+                    raise ValueError(f"Profile {profile_name} does not exist")
+                conn.execute("DELETE FROM assets WHERE profile_id = ?", (profile_id,))
+                conn.executemany(
+                    "INSERT INTO assets (profile_id, symbol, amount, token_address) VALUES (?, ?, ?, ?)",
+                    [(profile_id, symbol, asset_data['amount'], asset_data['token_address'])
+                     for symbol, asset_data in portfolio.items()],
+                )
+            logger.info(f"Portfolio for profile {profile_name} updated successfully")
+        except Exception as e:
+            logger.error(f"Error updating portfolio for profile {profile_name}: {str(e)}")
+            raise
+
+    async def create_profile(self, profile_name):
+        try:
+            conn = self._connect()
+            with conn:
+                if self._profile_id(conn, profile_name) is not None:
+                    raise ValueError(f"Profile {profile_name} already exists")
+                conn.execute("INSERT INTO profiles (name) VALUES (?)", (profile_name,))
+            logger.info(f"Profile {profile_name} created successfully")
+        except Exception as e:
+            logger.error(f"Error creating profile {profile_name}: {str(e)}")
+            raise
+
+    async def delete_profile(self, profile_name):
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute("DELETE FROM profiles WHERE name = ?", (profile_name,))
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Profile {profile_name} does not exist")
+            logger.info(f"Profile {profile_name} deleted successfully")
+        except Exception as e:
+            logger.error(f"Error deleting profile {profile_name}: {str(e)}")
+            raise
+
+    async def upsert_asset(self, profile_name, symbol, amount, token_address):
+        try:
+            conn = self._connect()
+            with conn:
+                profile_id = self._profile_id(conn, profile_name)
+                if profile_id is None:
+                    raise ValueError(f"Profile {profile_name} does not exist")
+                conn.execute(
+                    "INSERT INTO assets (profile_id, symbol, amount, token_address) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (profile_id, symbol) DO UPDATE SET amount = excluded.amount, token_address = excluded.token_address",
+                    (profile_id, symbol, amount, token_address),
+                )
+            logger.info(f"Asset {symbol} saved in profile {profile_name}")
+        except Exception as e:
+            logger.error(f"Error saving asset {symbol} in profile {profile_name}: {str(e)}")
+            raise
+
+    async def upsert_assets(self, profile_name, assets):
+        try:
+            conn = self._connect()
+            with conn:
+                profile_id = self._profile_id(conn, profile_name)
+                if profile_id is None:
+                    raise ValueError(f"Profile {profile_name} does not exist")
+                conn.executemany(
+                    "INSERT INTO assets (profile_id, symbol, amount, token_address) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (profile_id, symbol) DO UPDATE SET amount = excluded.amount, token_address = excluded.token_address",
+                    [(profile_id, symbol, asset_data['amount'], asset_data['token_address'])
+                     for symbol, asset_data in assets.items()],
+                )
+            logger.info(f"{len(assets)} assets saved in profile {profile_name}")
+        except Exception as e:
+            logger.error(f"Error saving {len(assets)} assets in profile {profile_name}: {str(e)}")
+            raise
+
+    async def set_asset_amount(self, profile_name, symbol, amount):
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE assets SET amount = ? WHERE symbol = ? "
+                    "AND profile_id = (SELECT id FROM profiles WHERE name = ?)",
+                    (amount, symbol, profile_name),
+                )
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error updating asset {symbol} in profile {profile_name}: {str(e)}")
+            raise
+
+    async def delete_asset(self, profile_name, symbol):
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM assets WHERE symbol = ? "
+                    "AND profile_id = (SELECT id FROM profiles WHERE name = ?)",
+                    (symbol, profile_name),
+                )
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error deleting asset {symbol} from profile {profile_name}: {str(e)}")
+            raise
+
+    async def get_alerts(self, profile_name):
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT r.rules FROM alerts r JOIN profiles p ON p.id = r.profile_id WHERE p.name = ?",
+                (profile_name,),
+            ).fetchone()
+            return json.loads(row[0]) if row else []
+        except Exception as e:
+            logger.error(f"Error getting alerts for profile {profile_name}: {str(e)}")
+            return []
+
+    async def set_alerts(self, profile_name, alerts):
+        try:
+            conn = self._connect()
+            with conn:
+                profile_id = self._profile_id(conn, profile_name)
+                if profile_id is None:
+                    raise ValueError(f"Profile {profile_name} does not exist")
+                if alerts:
+                    conn.execute(
+                        "INSERT INTO alerts (profile_id, rules) VALUES (?, ?) "
+                        "ON CONFLICT (profile_id) DO UPDATE SET rules = excluded.rules",
+                        (profile_id, json.dumps(alerts)),
+                    )
+                else:
+                    conn.execute("DELETE FROM alerts WHERE profile_id = ?", (profile_id,))
+        except Exception as e:
+            logger.error(f"Error updating alerts for profile {profile_name}: {str(e)}")
+            raise
+
+    async def get_all_alerts(self):
+        try:
+            conn = self._connect()
+            rows = conn.execute("SELECT p.name, r.rules FROM alerts r JOIN profiles p ON p.id = r.profile_id")
+            return {name: json.loads(rules) for name, rules in rows}
+        except Exception as e:
+            # Raised rather than read as "no alerts", which the alert index
+            # would otherwise keep as the real state
+            logger.error(f"Error getting alerts: {str(e)}")
+            raise
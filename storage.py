@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from config import PROFILE_LOCK_STRIPES
+from profile_registry import stable_hash
+
+logger = logging.getLogger(__name__)
+
+class Storage:
+    # Interface every persistence backend implements. Profiles map a name to
+    # a backend-specific location; portfolios map a symbol to
+    # {'amount': float, 'token_address': str}.
+
+    def __init__(self):
+        # A fixed pool of locks striped by profile name: edits to one profile
+        # serialize, edits to different profiles rarely contend, and memory
+        # stays flat however many profiles exist.
+        self._profile_locks = [asyncio.Lock() for _ in range(PROFILE_LOCK_STRIPES)]
+
+    def profile_lock(self, profile_name):
+        return self._profile_locks[stable_hash(profile_name) % len(self._profile_locks)]
+
+    async def prewarm(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def invalidate_cache(self, profile_name=None):
+        pass
+
+    async def refresh(self):
+        self.invalidate_cache()
+
+    async def get_profiles(self):
+        raise NotImplementedError
+
+    async def get_portfolio(self, profile_name):
+        raise NotImplementedError
+
+    async def update_portfolio(self, profile_name, portfolio):
+        raise NotImplementedError
+
+    async def create_profile(self, profile_name):
+        raise NotImplementedError
+
+    async def delete_profile(self, profile_name):
+        raise NotImplementedError
+
+    async def get_token_addresses(self):
+        token_addresses = set()
+        for profile_name in await self.get_profiles():
+            portfolio = await self.get_portfolio(profile_name)
+            token_addresses.update(asset_data['token_address'] for asset_data in portfolio.values())
+        return token_addresses
+
+    # Single-asset operations. Backends with a row-per-asset layout override
+    # these to touch one record; the defaults fall back to rewriting the whole
+    # portfolio, serialized per profile so concurrent edits are not lost.
+
+    async def upsert_asset(self, profile_name, symbol, amount, token_address):
+        async with self.profile_lock(profile_name):
+            portfolio = await self.get_portfolio(profile_name)
+            portfolio[symbol] = {'amount': amount, 'token_address': token_address}
+            await self.update_portfolio(profile_name, portfolio)
+
+    async def upsert_assets(self, profile_name, assets):
+        # Adds or replaces many assets ({symbol: asset_data}) with one write,
+        # e.g. for a bulk import
+        async with self.profile_lock(profile_name):
+            portfolio = await self.get_portfolio(profile_name)
+            portfolio.update(assets)
+            await self.update_portfolio(profile_name, portfolio)
+
+    async def set_asset_amount(self, profile_name, symbol, amount):
+        async with self.profile_lock(profile_name):
+            portfolio = await self.get_portfolio(profile_name)
+            if symbol not in portfolio:
+                return False
+            portfolio[symbol]['amount'] = amount
+            await self.update_portfolio(profile_name, portfolio)
+            return True
+
+    async def delete_asset(self, profile_name, symbol):
+        async with self.profile_lock(profile_name):
+            portfolio = await self.get_portfolio(profile_name)
+            if symbol not in portfolio:
+                return False
+            del portfolio[symbol]
+            await self.update_portfolio(profile_name, portfolio)
+            return True
+
+    # Price alert rules, stored per profile as a list of dicts (see alerts.py).
+    # As with assets, the defaults rewrite the whole list under the profile
+    # lock.
+
+    async def get_alerts(self, profile_name):
+        raise NotImplementedError
+
+    async def set_alerts(self, profile_name, alerts):
+        raise NotImplementedError
+
+    async def get_all_alerts(self):
+        all_alerts = {}
+        for profile_name in await self.get_profiles():
+            alerts = await self.get_alerts(profile_name)
+            if alerts:
+                all_alerts[profile_name] = alerts
+        return all_alerts
+
+    async def add_alert(self, profile_name, alert):
+        async with self.profile_lock(profile_name):
+            alerts = await self.get_alerts(profile_name)
+            alerts.append(alert)
+            await self.set_alerts(profile_name, alerts)
+
+    async def remove_alerts(self, profile_name, alert_ids):
+        async with self.profile_lock(profile_name):
+            alerts = await self.get_alerts(profile_name)
+            remaining = [alert for alert in alerts if alert['id'] not in alert_ids]
+            if len(remaining) == len(alerts):
+                return False
+            await self.set_alerts(profile_name, remaining)
+            return True
+
+def create_storage(backend):
+    # Backends are imported on demand so the unused one's dependencies are
+    # never loaded.
+    if backend == 'sheets':
+        from sheets_storage import SheetsStorage
+        return SheetsStorage()
+    if backend == 'sqlite':
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
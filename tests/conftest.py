@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# config.py reads the environment at import time, so the suite's settings
+# have to be in place before any module of the bot is imported. Nothing
+# reaches the network: prices come from a local DexScreener stub only.
+WORKDIR = tempfile.mkdtemp(prefix='portfolio-bot-tests-')
+os.environ.update({
+    'TELEGRAM_BOT_TOKEN': '0:test',
+    'AUTHORIZED_USER_ID': '1',
+    'MULTI_USER': 'true',
+    'ALLOWED_USER_IDS': ','.join(str(user_id) for user_id in range(1000, 1500)),
+    'STORAGE_BACKEND': 'sqlite',
+    'SQLITE_DB_PATH': os.path.join(WORKDIR, 'portfolio.db'),
+    'SHEETS_JOURNAL_PATH': os.path.join(WORKDIR, 'sheets_journal.jsonl'),
+    'GOOGLE_SHEET_ID': 'test',
+    'PRICE_HISTORY_DIR': os.path.join(WORKDIR, 'price_history'),
+    'PRICE_SOURCES': 'dexscreener',
+    'PRICE_REFRESH_INTERVAL': '0',
+    'PRICE_FETCH_TIMEOUT': '0.5',
+    'PRICE_FETCH_RETRIES': '1',
+    'PRICE_RETRY_BACKOFF': '0.01',
+    'PRICE_FETCH_DEADLINE': '1.5',
+    'BREAKER_FAILURE_THRESHOLD': '3',
+    'BREAKER_RESET_TIMEOUT': '60',
+    'PROGRESS_MESSAGE_DELAY': '1.0',
+})
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path):
+    # Every test gets an empty SQLite database and empty caches. Module-level
+    # asyncio primitives are recreated because each test runs its own loop.
+    import alerts
+    import database
+    import http_client
+    import price_fetcher
+    from cache import price_cache
+    from rendering import message_renderer
+    from sqlite_storage import SqliteStorage
+    from token_metadata import metadata_cache
+
+    database._storage = SqliteStorage(str(tmp_path / 'portfolio.db'))
+    price_cache.clear()
+    metadata_cache.clear()
+    price_fetcher._in_flight.clear()
+    price_fetcher._semaphore = None
+    price_fetcher._sources = None
+    price_fetcher._breakers.clear()
+    price_fetcher.stale_prices.clear()
+    alerts.reset()
+    alerts._load_lock = asyncio.Lock()
+    message_renderer._rendered.clear()
+    http_client._session = None
+    yield
+    conn = getattr(database._storage, '_conn', None)
+    if conn is not None:
+        conn.close()
+    database._storage = None
@@ -0,0 +1,68 @@
+import asyncio
+import contextlib
+from telegram.ext import Application
+import database
+import handlers
+import http_client
+from benchmarks.fakes import DexScreenerStub, FakeClientManager, FakeTelegramRequest
+from config import MAX_CONCURRENT_UPDATES
+from price_sources import DexScreenerSource, GeckoTerminalSource
+from sheets_storage import SheetsStorage
+from write_behind import WriteBehindQueue
+
+def run(coro):
+    # Runs one test scenario in a fresh event loop and closes the shared HTTP
+    # session it opened
+    async def main():
+        try:
+            return await coro
+        finally:
+            await http_client.close()
+    return asyncio.run(main())
+
+@contextlib.asynccontextmanager
+async def dexscreener(latency=0.0):
+    # Points the DexScreener and GeckoTerminal sources at a local stub for
+    # the duration of the block
+    stub = DexScreenerStub(latency)
+    await stub.start()
+    saved = DexScreenerSource.TOKENS_URL, DexScreenerSource.PAIRS_URL, GeckoTerminalSource.TOKEN_PRICE_URL
+    DexScreenerSource.TOKENS_URL = f"{stub.base_url}/latest/dex/tokens/"
+    DexScreenerSource.PAIRS_URL = f"{stub.base_url}/latest/dex/pairs/{{chain_id}}/{{pair_addresses}}"
+    GeckoTerminalSource.TOKEN_PRICE_URL = f"{stub.base_url}/api/v2/simple/networks/{{network}}/token_price/{{addresses}}"
+    try:
+        yield stub
+    finally:
+        DexScreenerSource.TOKENS_URL, DexScreenerSource.PAIRS_URL, GeckoTerminalSource.TOKEN_PRICE_URL = saved
+        await stub.stop()
+@contextlib.asynccontextmanager
+async def telegram_application(request):
+    # The bot's real Application and handlers; only the Bot API transport is
+    # faked by `request`
+    application = (
+        Application.builder()
+        .token('0:test')
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .updater(None)
+        .concurrent_updates(MAX_CONCURRENT_UPDATES)
+        .build()
+    )
+    handlers.setup_handlers(application)
+    await application.initialize()
+    await application.start()
+    try:
+        yield application
+    finally:
+        await application.stop()
+        await application.shutdown()
+
+def sheets_storage(worksheet, journal_path, write_behind=True):
+    # Makes a SheetsStorage over the fake `worksheet` the active storage
+    storage = SheetsStorage()
+    storage.agcm = FakeClientManager(worksheet)
+    # Flushed only when the test asks, so every API call is accounted for
+    storage._writes = WriteBehindQueue(storage.get_sheet, interval=3600, max_pending=1000,
+                                       journal_path=journal_path) if write_behind else None
+    database._storage = storage
+    return storage
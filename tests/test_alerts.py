@@ -0,0 +1,47 @@
+import sqlite3
+import pytest
+import alerts
+import database
+import price_refresher
+from support import dexscreener, run
+
+TOKEN = f"0xalerts{'0' * 33}1"
+
+async def seed():
+    await database.create_profile('main')
+    await database.upsert_asset('main', 'A', 1.0, TOKEN)
+    # Above any price the DexScreener stub reports
+    await alerts.create_price_alert('main', 'A', TOKEN, 1000.0, 1.0, 10)
+    alerts.reset()
+
+def failing_once(monkeypatch):
+    # The next storage query fails, as a transient error would
+    storage = database.get_storage()
+    connect = storage._connect
+    failures = []
+
+    def flaky_connect():
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return connect()
+    monkeypatch.setattr(storage, '_connect', flaky_connect)
+    return failures
+
+def test_failed_load_is_retried_instead_of_cached_empty(monkeypatch):
+    async def scenario():
+        await seed()
+        failing_once(monkeypatch)
+        with pytest.raises(sqlite3.OperationalError):
+            await alerts.get_index()
+        return await alerts.watched_token_addresses()
+    assert run(scenario()) == {TOKEN}
+
+def test_refresh_still_updates_prices_when_alerts_fail_to_load(monkeypatch):
+    async def scenario():
+        await seed()
+        failures = failing_once(monkeypatch)
+        async with dexscreener() as stub:
+            await price_refresher.refresh_prices()
+            return failures, stub.requests['tokens'], len(await alerts.get_index())
+    assert run(scenario()) == ([1], 1, 1)
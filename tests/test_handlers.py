@@ -0,0 +1,137 @@
+import glob
+import os
+import re
+import pytest
+import alerts
+import database
+import handlers
+from benchmarks.fakes import FakeBot, FakeUser
+from cache import price_cache
+from support import dexscreener, run
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKENS = [f"0xhandlers{i:032x}" for i in range(3)]
+
+def new_user():
+    user = FakeUser(FakeBot(), 1, 10)
+    user.context.user_data['active_profile'] = 'main'
+    return user
+
+async def seed():
+    await database.create_profile('main')
+    await database.upsert_assets('main', {f"T{i}": {'amount': 1.0, 'token_address': token}
+                                          for i, token in enumerate(TOKENS)})
+
+async def press(user, route, *args):
+    await handlers.handle_button(user.press(handlers.router.encode(route, *args)), user.context)
+
+@pytest.mark.parametrize('route', ['view_portfolio', 'view_all_portfolios'])
+def test_first_view_with_cached_prices_is_a_single_edit(route):
+    user = new_user()
+
+    async def scenario():
+        await seed()
+        for token in TOKENS:
+            price_cache.set(token, 2.0)
+        # No DexScreener stub: a fetch here would fail the view
+        await press(user, route)
+    run(scenario())
+    assert user.bot.calls['editMessageText'] == 1
+    assert 'Is taking the latest price' not in user.screen.text
+
+@pytest.mark.parametrize('route', ['view_portfolio', 'view_all_portfolios'])
+def test_view_with_a_cache_miss_shows_the_loading_text(route):
+    user = new_user()
+
+    async def scenario():
+        await seed()
+        price_cache.set(TOKENS[0], 2.0)
+        async with dexscreener():
+            await press(user, route)
+    run(scenario())
+    assert user.bot.calls['editMessageText'] == 2
+    assert 'Is taking the latest price' not in user.screen.text
+
+async def set_alerts():
+    await alerts.create_price_alert('main', 'T0', TOKENS[0], 5.0, 1.0, 10)
+    await alerts.create_price_alert('main', 'T1', TOKENS[1], 5.0, 1.0, 10)
+    await alerts.create_drop_alert('main', 10, 100.0, 10)
+
+async def fired_on_spike():
+    return await alerts.evaluate(None, {token: 10.0 for token in TOKENS})
+
+def test_deleting_a_profile_drops_its_alerts():
+    user = new_user()
+
+    async def scenario():
+        await seed()
+        await set_alerts()
+        await press(user, 'confirm_remove', 'main')
+        return len(await alerts.get_index()), await fired_on_spike()
+    assert run(scenario()) == (0, 0)
+
+def test_deleting_an_asset_drops_its_price_alerts():
+    user = new_user()
+
+    async def scenario():
+        await seed()
+        await set_alerts()
+        await press(user, 'remove', 'T0')
+        stored = await database.get_alerts('main')
+        return [rule['kind'] for rule in stored], await fired_on_spike()
+    # The T1 price rule and the portfolio rule are kept; only T1 fires
+    assert run(scenario()) == (['price', 'portfolio_drop'], 1)
+
+def test_refresh_reloads_the_alert_index():
+    user = new_user()
+
+    async def scenario():
+        await seed()
+        await set_alerts()
+        # Rules removed from storage behind the bot's back, e.g. by another instance
+        await database.remove_alerts('main', {rule['id'] for rule in await database.get_alerts('main')})
+        await handlers.refresh_command(user.send('/refresh'), user.context)
+        return await fired_on_spike()
+    assert run(scenario()) == 0
+
+# A valid argument for each router argument type
+SAMPLE_ARGS = {'int': 0, 'profile': 'main', 'symbol': 'T0'}
+
+def encode_call_sites():
+    # (file:line, route name, has argument) for every router.encode() with a
+    # literal route name in the bot's modules
+    pattern = re.compile(r"router\.encode\('(\w+)'(,[^)]*)?\)")
+    for path in sorted(glob.glob(os.path.join(ROOT, '*.py'))):
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                for match in pattern.finditer(line):
+                    yield f"{os.path.basename(path)}:{number}", match.group(1), match.group(2) is not None
+
+def test_every_encoded_button_resolves_to_a_route():
+    call_sites = list(encode_call_sites())
+    assert call_sites
+    names = {route.name: route for route in handlers.router.routes.values()}
+
+    async def resolve(name, has_arg):
+        route = names[name]
+        assert has_arg == (route.arg is not None)
+        arg = SAMPLE_ARGS[route.arg] if has_arg else None
+        return await handlers.router.decode(None, None, handlers.router.encode(name, arg))
+
+    for location, name, has_arg in call_sites:
+        assert name in names, f"{location}: no route named {name!r}"
+        route, arg = run(resolve(name, has_arg))
+        assert route.name == name, location
+
+@pytest.mark.parametrize('name', sorted(route.name for route in handlers.router.routes.values()))
+def test_every_button_answers_its_callback_once(name):
+    user = new_user()
+    route = next(route for route in handlers.router.routes.values() if route.name == name)
+
+    async def scenario():
+        await seed()
+        for token in TOKENS:
+            price_cache.set(token, 2.0)
+        await press(user, name, *([SAMPLE_ARGS[route.arg]] if route.arg else []))
+    run(scenario())
+    assert user.bot.calls['answerCallbackQuery'] == 1
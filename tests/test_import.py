@@ -0,0 +1,71 @@
+import database
+import handlers
+from benchmarks.fakes import FakeBot, FakeUser, FakeWorksheet
+from support import dexscreener, run, sheets_storage
+
+# Distinct tokens in the generated files; symbols are unique per row
+TOKENS = [f"0x{i:040x}" for i in range(20)]
+
+def new_user():
+    user = FakeUser(FakeBot(), 1, 10)
+    user.context.user_data['active_profile'] = 'main'
+    return user
+
+def csv_document(rows):
+    lines = ["symbol,amount,token_address"]
+    lines += [f"A{i},{i + 1},{TOKENS[i % len(TOKENS)]}" for i in range(rows)]
+    return "\n".join(lines).encode('utf-8')
+
+def count_calls(monkeypatch, storage, *names):
+    calls = {name: 0 for name in names}
+    for name in names:
+        method = getattr(storage, name)
+
+        async def counted(*args, _name=name, _method=method, **kwargs):
+            calls[_name] += 1
+            return await _method(*args, **kwargs)
+        monkeypatch.setattr(storage, name, counted)
+    return calls
+
+def import_file(user, file_name, data):
+    async def scenario():
+        async with dexscreener():
+            await handlers.import_document(user.upload(file_name, data), user.context)
+        return await database.get_portfolio('main')
+    portfolio = run(scenario())
+    return portfolio, [text for _, text in user.bot.sent]
+
+def test_large_import_is_one_storage_write(monkeypatch):
+    run(database.create_profile('main'))
+    calls = count_calls(monkeypatch, database.get_storage(), 'upsert_assets', 'upsert_asset', 'update_portfolio')
+    portfolio, replies = import_file(new_user(), 'import.csv', csv_document(5000))
+    assert len(portfolio) == 5000
+    assert calls == {'upsert_assets': 1, 'upsert_asset': 0, 'update_portfolio': 0}
+    assert replies[-1].startswith("Imported 5000 assets into profile 'main' (5000 new, 0 updated).")
+
+def test_rejected_rows_are_reported():
+    run(database.create_profile('main'))
+    data = b"A,1,0xa\nB,x,0xb\nC,1,0x\x00c\n"
+    portfolio, replies = import_file(new_user(), 'import.csv', data)
+    assert list(portfolio) == ['A']
+    assert "Rejected 2 of 3 rows:\nrow 2: amount 'x' is not a number\nrow 3: token address" in replies[-1]
+
+def test_unreadable_csv_gets_a_reply():
+    run(database.create_profile('main'))
+    portfolio, replies = import_file(new_user(), 'import.csv', b"A,1," + b"x" * 200000)
+    assert portfolio == {}
+    assert replies[-1].startswith("The file could not be imported: the CSV is malformed")
+
+def test_sheets_backend_holds_a_few_hundred_assets_per_profile(tmp_path):
+    # A profile is one sheet cell (SheetsStorage.CELL_LIMIT characters),
+    # about 500 assets; larger imports are refused without changes
+    storage = sheets_storage(FakeWorksheet(), str(tmp_path / 'journal.jsonl'))
+    run(database.create_profile('main'))
+    portfolio, _ = import_file(new_user(), 'import.csv', csv_document(500))
+    assert len(portfolio) == 500
+
+    portfolio, replies = import_file(new_user(), 'import.csv', csv_document(5000))
+    assert len(portfolio) == 500
+    assert "too large for one sheet cell" in replies[-1]
+    assert "No changes made" in replies[-1]
+    run(storage.close())
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from telegram import Update
+import database
+import handlers
+from benchmarks.fakes import FakeTelegramRequest, callback_update, message_update
+from benchmarks.run import summarize
+from support import dexscreener, run, telegram_application
+from users import namespace_for
+
+USERS = 300
+FIRST_USER_ID = 1000
+DEX_LATENCY = 0.1
+BOT_API_LATENCY = 0.01
+# Holdings come from a small set of popular tokens, as they do in practice,
+# so concurrent views share in-flight price requests
+TOKENS = [f"0xload{i:036x}" for i in range(16)]
+
+def test_hundreds_of_users_through_the_conversation_handler():
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + USERS)
+    update_ids = iter(range(1, 10 * USERS))
+
+    async def scenario():
+        for user_id in user_ids:
+            namespace = namespace_for(user_id)
+            await database.create_profile('main', namespace=namespace)
+            await database.upsert_assets('main', {
+                f"T{i}": {'amount': 1.0, 'token_address': TOKENS[(user_id + i) % len(TOKENS)]} for i in range(2)
+            }, namespace=namespace)
+
+        request = FakeTelegramRequest(latency=BOT_API_LATENCY)
+
+        async def step(user_id, data, reply):
+            done = request.wait_for(user_id, reply)
+            started = time.perf_counter()
+            await application.process_update(Update.de_json(data, application.bot))
+            return await asyncio.wait_for(done, timeout=30) - started
+
+        async def round_of(make_update, reply):
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(
+                step(user_id, make_update(next(update_ids), user_id), reply) for user_id in user_ids))
+            return latencies, time.perf_counter() - started
+
+        async with telegram_application(request) as application, dexscreener(DEX_LATENCY):
+            return {
+                'start': await round_of(lambda update_id, user_id: message_update(update_id, user_id, '/start'),
+                                        'Welcome'),
+                'set_profile': await round_of(lambda update_id, user_id: callback_update(
+                    update_id, user_id, handlers.router.encode('set_profile', 'main')), 'Welcome'),
+                'view_portfolio': await round_of(lambda update_id, user_id: callback_update(
+                    update_id, user_id, handlers.router.encode('view_portfolio')), 'Total Portfolio Value'),
+            }, request.calls
+
+    rounds, calls = run(scenario())
+    for name, (latencies, wall) in rounds.items():
+        summary = summarize(latencies)
+        print(f"{name}: {USERS} users in {wall:.2f}s, p50 {summary['p50_ms']:.0f}ms, p99 {summary['p99_ms']:.0f}ms")
+        assert summary['count'] == USERS
+        # Handled one after another the round would take at least
+        # USERS * BOT_API_LATENCY; side by side it takes a few round trips
+        assert wall < USERS * BOT_API_LATENCY / 3
+    # The slowest view still finishes well inside the time a single queue
+    # of USERS round trips would take
+    view = summarize(rounds['view_portfolio'][0])
+    assert view['p99_ms'] < 1500
+    # Every callback query answered exactly once
+    assert calls['answerCallbackQuery'] == 2 * USERS
@@ -0,0 +1,50 @@
+import json
+import pytest
+import portfolio_io
+
+PORTFOLIO = {
+    'ETH': {'amount': 1.5, 'token_address': '0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2'},
+    'SOL': {'amount': 20.0, 'token_address': 'So11111111111111111111111111111111111111112'},
+}
+
+@pytest.mark.parametrize('fmt', portfolio_io.FORMATS)
+def test_export_parses_back_to_the_same_portfolio(fmt):
+    data = portfolio_io.export_document(PORTFOLIO, fmt)
+    parsed = portfolio_io.parse_document(data, f"portfolio.{fmt}")
+    assert parsed == portfolio_io.ParsedImport(PORTFOLIO, [], len(PORTFOLIO))
+
+def test_bad_rows_are_rejected_and_the_rest_kept():
+    data = (
+        "token_address,symbol,amount\n"
+        "0xaaa,ok,1\n"
+        "0xbbb,bad amount,x\n"
+        "0xccc,NEG,-1\n"
+        "0xddd,OK,2\n"
+        "0x\x00eee,NUL,3\n"
+        "only,two\n"
+    ).encode('utf-8')
+    parsed = portfolio_io.parse_document(data, 'import.csv')
+    assert parsed.assets == {'OK': {'amount': 1.0, 'token_address': '0xaaa'}}
+    assert parsed.rows == 6
+    assert [label for label, _ in parsed.rejected] == ['row 3', 'row 4', 'row 5', 'row 6', 'row 7']
+    assert 'already appears in row 2' in parsed.rejected[2][1]
+
+def test_json_entries_are_validated_like_rows():
+    data = json.dumps([
+        {'symbol': 'A', 'amount': 1, 'token_address': '0xa'},
+        {'symbol': 'B', 'amount': 1, 'token_address': '0xb\x07'},
+        'not an object',
+    ]).encode('utf-8')
+    parsed = portfolio_io.parse_document(data, 'import.json')
+    assert list(parsed.assets) == ['A']
+    assert [label for label, _ in parsed.rejected] == ['entry 2', 'entry 3']
+
+def test_control_characters_are_rejected():
+    for symbol, token_address in (('A\x00', '0xa'), ('A', '0xa\x00'), ('A', '0x\x1ba')):
+        with pytest.raises(ValueError):
+            portfolio_io.validate_asset(symbol, 1, token_address)
+
+def test_oversized_csv_field_makes_the_document_unreadable():
+    data = b"A,1," + b"x" * 200000
+    with pytest.raises(ValueError, match='CSV is malformed'):
+        portfolio_io.parse_document(data, 'import.csv')
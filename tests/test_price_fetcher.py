@@ -0,0 +1,39 @@
+import asyncio
+import math
+import time
+import pytest
+import price_fetcher
+from config import PRICE_BATCH_SIZE, PRICE_FETCH_CONCURRENCY
+from support import dexscreener, run
+
+LATENCY = 0.2
+
+@pytest.mark.parametrize('batches', [PRICE_FETCH_CONCURRENCY, 2 * PRICE_FETCH_CONCURRENCY])
+def test_batches_are_fetched_concurrently(batches):
+    # Sequential lookups take `batches` round trips; concurrent ones
+    # ceil(batches / PRICE_FETCH_CONCURRENCY)
+    tokens = [f"0xconcurrent{batches:04x}{i:032x}" for i in range(batches * PRICE_BATCH_SIZE)]
+
+    async def scenario():
+        async with dexscreener(LATENCY) as stub:
+            started = time.perf_counter()
+            prices = await price_fetcher.fetch_token_prices(tokens)
+            return time.perf_counter() - started, prices, stub.requests['tokens']
+
+    elapsed, prices, requests = run(scenario())
+    assert all(prices[token] is not None for token in tokens)
+    assert requests == batches
+    rounds = math.ceil(batches / PRICE_FETCH_CONCURRENCY)
+    assert elapsed < (rounds + 1) * LATENCY < batches * LATENCY
+
+def test_concurrent_callers_share_in_flight_requests():
+    tokens = [f"0xshared{i:034x}" for i in range(5)]
+
+    async def scenario():
+        async with dexscreener(LATENCY) as stub:
+            results = await asyncio.gather(*(price_fetcher.fetch_token_prices(tokens) for _ in range(10)))
+            return results, stub.requests['tokens']
+
+    results, requests = run(scenario())
+    assert requests == 1
+    assert all(result == results[0] for result in results)
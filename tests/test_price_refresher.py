@@ -0,0 +1,33 @@
+import price_refresher
+import token_metadata
+from benchmarks.fakes import DexScreenerStub
+from support import dexscreener, run
+
+MAX_REQUESTS = 4
+CHAINS = ['ethereum', 'bsc', 'base', 'arbitrum', 'polygon', 'solana']
+
+def test_refresh_counts_per_chain_requests_against_the_budget(monkeypatch):
+    # 40 tokens spread over six chains would take seven pairs requests as
+    # two batches of PRICE_BATCH_SIZE; the cycle may only make MAX_REQUESTS
+    tokens = [f"0xrefresh{i:032x}" for i in range(40)]
+    for i, token_address in enumerate(tokens):
+        token_metadata.remember(token_address, dict(DexScreenerStub.pair_for(token_address), chainId=CHAINS[i % len(CHAINS)]))
+
+    async def get_token_addresses():
+        return set(tokens)
+
+    monkeypatch.setattr(price_refresher, 'get_token_addresses', get_token_addresses)
+    monkeypatch.setattr(price_refresher, 'PRICE_REFRESH_MAX_REQUESTS', MAX_REQUESTS)
+    skipped = price_refresher.stats['tokens_skipped']
+    refreshed = price_refresher.stats['tokens_refreshed']
+
+    async def scenario():
+        async with dexscreener() as stub:
+            await price_refresher.refresh_prices()
+            return sum(stub.requests.values())
+
+    requests = run(scenario())
+    assert 0 < requests <= MAX_REQUESTS
+    fetched = price_refresher.stats['tokens_refreshed'] - refreshed
+    assert fetched > 0
+    assert price_refresher.stats['tokens_skipped'] - skipped == len(tokens) - fetched
@@ -0,0 +1,92 @@
+import asyncio
+import time
+import pytest
+import price_fetcher
+from cache import price_cache
+from config import BREAKER_FAILURE_THRESHOLD, PRICE_BATCH_SIZE, PRICE_FETCH_CONCURRENCY, PRICE_FETCH_DEADLINE
+from resilience import CircuitBreaker
+from benchmarks.fakes import DexScreenerStub
+from support import dexscreener, run
+
+def tokens(name, count=3):
+    return [f"0x{name}{i:0{38 - len(name)}x}" for i in range(count)]
+
+async def timed_fetch(addresses):
+    started = time.perf_counter()
+    prices = await price_fetcher.fetch_token_prices(addresses)
+    return time.perf_counter() - started, prices
+
+def test_cancelled_half_open_trial_lets_the_next_one_through():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    async def scenario():
+        trial = asyncio.ensure_future(breaker.call(asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await breaker.call(asyncio.sleep, 0, 'recovered')
+    assert run(scenario()) == 'recovered'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+@pytest.mark.parametrize('count', [3, 4 * PRICE_FETCH_CONCURRENCY * PRICE_BATCH_SIZE])
+def test_slow_upstream_delays_a_lookup_by_at_most_the_deadline(count, monkeypatch):
+    # The larger lookup has batches queued behind PRICE_FETCH_CONCURRENCY
+    # that only reach the upstream after the deadline. The circuit is kept
+    # closed so it is the deadline, not the breaker, that bounds them.
+    monkeypatch.setattr(price_fetcher, 'BREAKER_FAILURE_THRESHOLD', 10 ** 6)
+    addresses = tokens(f"slow{count}", count)
+
+    async def scenario():
+        async with dexscreener(latency=10):
+            return await timed_fetch(addresses)
+    elapsed, prices = run(scenario())
+    assert prices == dict.fromkeys(addresses)
+    assert elapsed < PRICE_FETCH_DEADLINE + 0.5
+
+def test_failing_upstream_opens_the_circuit():
+    async def scenario():
+        async with dexscreener() as stub:
+            stub.fail_status['tokens'] = 503
+            for i in range(BREAKER_FAILURE_THRESHOLD):
+                await timed_fetch(tokens(f"fail{i}"))
+            requests = stub.requests['tokens']
+            elapsed, prices = await timed_fetch(tokens('open'))
+            return requests, stub.requests['tokens'], elapsed, prices
+    requests_before, requests_after, elapsed, prices = run(scenario())
+    assert price_fetcher.source_stats()['dexscreener']['state'] == CircuitBreaker.OPEN
+    # With the circuit open the lookup fails fast without calling upstream
+    assert requests_after == requests_before
+    assert elapsed < 0.1
+    assert set(prices.values()) == {None}
+
+def test_last_known_price_is_served_while_upstream_fails():
+    addresses = tokens('lastknown')
+
+    async def scenario():
+        async with dexscreener() as stub:
+            _, fresh = await timed_fetch(addresses)
+            price_cache.clear()
+            # Known tokens are looked up by pair address from now on
+            stub.fail_status.update(tokens=500, pairs=500)
+            _, served = await timed_fetch(addresses)
+            return fresh, served
+    fresh, served = run(scenario())
+    assert served == fresh
+    assert price_fetcher.stale_prices >= set(addresses)
+
+def test_next_source_answers_when_the_first_fails(monkeypatch):
+    monkeypatch.setattr(price_fetcher, 'PRICE_SOURCES', ['dexscreener', 'geckoterminal'])
+    addresses = tokens('fallback')
+
+    async def scenario():
+        async with dexscreener() as stub:
+            stub.fail_status['tokens'] = 502
+            _, prices = await timed_fetch(addresses)
+            return prices, stub.requests
+    prices, requests = run(scenario())
+    assert prices == {address: pytest.approx(DexScreenerStub.price_of(address)) for address in addresses}
+    assert requests['token_price'] == 1
+    assert price_fetcher.stale_prices.isdisjoint(addresses)
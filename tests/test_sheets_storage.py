@@ -0,0 +1,75 @@
+from collections import Counter
+import pytest
+import database
+import handlers
+from benchmarks.fakes import FakeBot, FakeUser, FakeWorksheet
+from support import dexscreener, run, sheets_storage
+
+@pytest.fixture
+def worksheet():
+    return FakeWorksheet()
+
+def new_user(profile):
+    user = FakeUser(FakeBot(), 1, 10)
+    user.context.user_data['active_profile'] = profile
+    return user
+
+async def add_assets(user, count):
+    for i in range(count):
+        await handlers.add_asset(user.send(f"T{i} {i + 1} 0xsheets{i:034x}"), user.context)
+
+async def view_portfolio(user):
+    await handlers.handle_button(user.press(handlers.router.encode('view_portfolio')), user.context)
+
+def calls_during(worksheet, flow):
+    before = Counter(worksheet.calls)
+    run(flow)
+    return worksheet.calls - before
+
+def test_views_and_edits_do_not_touch_the_sheet_until_flushed(worksheet, tmp_path):
+    storage = sheets_storage(worksheet, str(tmp_path / 'journal.jsonl'))
+    user = new_user('main')
+
+    assert calls_during(worksheet, storage.prewarm()) == Counter(range=1)
+    assert calls_during(worksheet, database.create_profile('main')) == Counter()
+
+    async def edit_and_view():
+        async with dexscreener():
+            await add_assets(user, 3)
+            for _ in range(3):
+                await view_portfolio(user)
+            user.context.user_data['updating_symbol'] = 'T0'
+            await handlers.process_asset_update(user.send('5'), user.context)
+    assert calls_during(worksheet, edit_and_view()) == Counter()
+
+    # Profile index shard and portfolio cell coalesced into one batch
+    assert calls_during(worksheet, storage._writes.flush()) == Counter(update_cells=1)
+
+def test_cold_portfolio_is_read_once(worksheet, tmp_path):
+    writer = sheets_storage(worksheet, str(tmp_path / 'journal.jsonl'))
+
+    async def seed():
+        await database.create_profile('main')
+        await add_assets(new_user('main'), 3)
+        await writer.close()
+    run(seed())
+
+    sheets_storage(worksheet, str(tmp_path / 'journal.jsonl'))
+    user = new_user('main')
+
+    async def view_twice():
+        async with dexscreener():
+            await view_portfolio(user)
+            await view_portfolio(user)
+    # One range read for the profile index and one cell read for the portfolio
+    assert calls_during(worksheet, view_twice()) == Counter(range=1, cell=1)
+
+def test_write_through_costs_one_cell_write_per_edit(worksheet, tmp_path):
+    storage = sheets_storage(worksheet, None, write_behind=False)
+    run(storage.prewarm())
+    run(database.create_profile('main'))
+    user = new_user('main')
+
+    assert calls_during(worksheet, add_assets(user, 1)) == Counter(update_cell=1)
+    user.context.user_data['updating_symbol'] = 'T0'
+    assert calls_during(worksheet, handlers.process_asset_update(user.send('7'), user.context)) == Counter(update_cell=1)
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# `import main` measured about 51ms locally; the budget leaves room for slower
+# machines while still catching a heavy dependency moving back to import time
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', 150))
+RUNS = 3
+
+# Imported only once startup is under way (main() or a background thread)
+DEFERRED = {'telegram', 'aiohttp', 'gspread', 'gspread_asyncio', 'google.oauth2', 'handlers', 'database'}
+
+def import_times(module):
+    # {module: cumulative microseconds} from `python -X importtime` in a fresh
+    # interpreter
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times.setdefault(name.strip(), int(cumulative))
+    return times
+
+def test_import_main_stays_within_budget():
+    # Best of a few runs, so one slow run on a busy machine does not fail it
+    best = min(import_times('main')['main'] for _ in range(RUNS)) / 1000
+    assert best < IMPORT_BUDGET_MS, f"import main took {best:.1f}ms, budget {IMPORT_BUDGET_MS:.0f}ms"
+
+def test_heavy_dependencies_are_deferred():
+    assert not DEFERRED & set(import_times('main'))
+
+def test_invalid_numbers_are_reported_by_validate():
+    # A bad value must not stop `import main`; validate() lists it with the
+    # other problems, without pulling in the deferred dependencies
+    script = (
+        "import sys, main, config\n"
+        "try:\n"
+        "    config.validate()\n"
+        "except config.ConfigError as e:\n"
+        "    print(e)\n"
+        "print(sorted(name for name in ('aiohttp', 'price_sources') if name in sys.modules))\n"
+    )
+    env = dict(os.environ, CACHE_EXPIRY='5m', PRICE_FETCH_TIMEOUT='fast')
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert "CACHE_EXPIRY must be a whole number, got '5m'" in result.stdout
+    assert "PRICE_FETCH_TIMEOUT must be a number, got 'fast'" in result.stdout
+    assert result.stdout.splitlines()[-1] == '[]'
+
+def test_price_source_names_match_the_sources():
+    import config
+    import price_sources
+    assert set(config.PRICE_SOURCE_NAMES) == set(price_sources.SOURCES)
@@ -0,0 +1,59 @@
+import json
+import os
+import token_metadata
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'dexscreener_tokens.json')
+
+TIE = '0xAB5801A7D398351B8BE11C439E05C5B3259AEC9B'
+QUOTE_ONLY = '0x1f9840a85d5af5bf1d1762f925bdaddc4201f984'
+PRICED = '0x6b175474e89094c44da98b954eedeac495271d0f'
+VOLUME_ONLY = 'So1VolumeOnlyToken1111111111111111111111111'
+UNLISTED = '0x0000000000000000000000000000000000000001'
+
+def load_pairs():
+    with open(FIXTURE) as f:
+        return json.load(f)['pairs']
+
+def best_pair_addresses(token_addresses):
+    best = token_metadata.select_best_pairs(load_pairs(), token_addresses)
+    return {token_address: pair and pair['pairAddress'] for token_address, pair in best.items()}
+
+def test_equal_liquidity_is_broken_by_volume():
+    # The busiest pair has far less liquidity, so it still loses
+    assert best_pair_addresses([TIE]) == {TIE: '0xPairTieHighVolume'}
+
+def test_addresses_match_in_any_case_and_keep_the_requested_form():
+    # The response mixes checksummed and lowercase forms of TIE
+    assert best_pair_addresses([TIE.lower()]) == {TIE.lower(): '0xPairTieHighVolume'}
+
+def test_pairs_where_the_token_is_only_the_quote_are_ignored():
+    # Their priceUsd is the price of the base token
+    assert best_pair_addresses([QUOTE_ONLY]) == {QUOTE_ONLY: None}
+
+def test_pairs_without_a_usable_price_are_skipped():
+    # The zero-priced and unpriced pairs are deeper but cannot price the token
+    assert best_pair_addresses([PRICED]) == {PRICED: '0xPairPriced'}
+
+def test_pairs_without_liquidity_are_ranked_by_volume():
+    assert best_pair_addresses([VOLUME_ONLY]) == {VOLUME_ONLY: 'PairNoLiquidityHigh'}
+
+def test_every_requested_token_gets_an_entry():
+    token_addresses = [TIE, QUOTE_ONLY, PRICED, VOLUME_ONLY, UNLISTED]
+    assert best_pair_addresses(token_addresses) == {
+        TIE: '0xPairTieHighVolume',
+        QUOTE_ONLY: None,
+        PRICED: '0xPairPriced',
+        VOLUME_ONLY: 'PairNoLiquidityHigh',
+        UNLISTED: None,
+    }
+
+def test_metadata_from_the_chosen_pair():
+    pair = token_metadata.select_best_pairs(load_pairs(), [TIE])[TIE]
+    assert token_metadata.metadata_from_pair(pair) == {
+        'chain_id': 'ethereum',
+        'pair_address': '0xPairTieHighVolume',
+        'symbol': 'TIE',
+        'dex_id': 'sushiswap',
+        'liquidity_usd': 50000.0,
+        'volume_h24': 900.0,
+    }
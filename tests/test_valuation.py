@@ -0,0 +1,25 @@
+import pytest
+from valuation import value_portfolio, value_portfolios
+
+PRICES = {'0xa': 2.0, '0xb': 0.5, '0xc': None}
+
+def test_values_allocation_and_missing_prices():
+    valuation = value_portfolio({
+        'A': {'amount': 3.0, 'token_address': '0xa'},
+        'B': {'amount': 12.0, 'token_address': '0xb'},
+        'C': {'amount': 1.0, 'token_address': '0xc'},
+    }, PRICES)
+    assert valuation.total == pytest.approx(12.0)
+    assert valuation.missing == [False, False, True]
+    assert list(valuation.rows()) == [('A', 3.0, 6.0, 50.0), ('B', 12.0, 6.0, 50.0), ('C', 1.0, None, 0.0)]
+
+def test_several_profiles_in_one_valuation():
+    valuation = value_portfolios({
+        'main': {'A': {'amount': 1.0, 'token_address': '0xa'}},
+        'side': {'B': {'amount': 4.0, 'token_address': '0xb'}, 'C': {'amount': 1.0, 'token_address': '0xc'}},
+        'empty': {},
+    }, PRICES)
+    assert valuation.profile_totals == [2.0, 2.0, 0.0]
+    assert valuation.profile_weights == [0.5, 0.5, 0.0]
+    assert valuation.profile_missing == [0, 1, 0]
+    assert [row[0] for row in valuation.rows('side')] == ['B', 'C']
@@ -0,0 +1,83 @@
+import asyncio
+import time
+import aiohttp
+import pytest
+import config
+import webhook
+from benchmarks.fakes import FakeTelegramRequest, message_update
+from support import run, telegram_application
+
+SECRET = 'test-secret'
+UPDATES = 500
+FIRST_USER_ID = 1000
+
+@pytest.fixture
+def webhook_config(monkeypatch):
+    monkeypatch.setattr(config, 'BOT_MODE', 'webhook')
+    monkeypatch.setattr(config, 'WEBHOOK_URL', 'https://bot.example')
+
+def test_webhook_mode_requires_a_secret_token(webhook_config, monkeypatch):
+    monkeypatch.setattr(config, 'WEBHOOK_SECRET_TOKEN', '')
+    with pytest.raises(config.ConfigError, match='WEBHOOK_SECRET_TOKEN must be set'):
+        config.validate()
+    monkeypatch.setattr(config, 'WEBHOOK_SECRET_TOKEN', 'not a valid token!')
+    with pytest.raises(config.ConfigError, match='WEBHOOK_SECRET_TOKEN must be 1-256 characters'):
+        config.validate()
+    monkeypatch.setattr(config, 'WEBHOOK_SECRET_TOKEN', SECRET)
+    config.validate()
+
+async def post_updates(server, updates, secret=SECRET):
+    url = f"http://127.0.0.1:{server.port}{server.path}"
+    headers = {webhook.SECRET_HEADER: secret} if secret is not None else {}
+    async with aiohttp.ClientSession() as session:
+        async def post(data):
+            async with session.post(url, json=data, headers=headers) as response:
+                return response.status
+        return await asyncio.gather(*(post(data) for data in updates))
+
+def test_updates_without_the_secret_are_rejected():
+    async def scenario():
+        async with telegram_application(FakeTelegramRequest()) as application:
+            server = webhook.WebhookServer(application, listen='127.0.0.1', port=0, secret_token=SECRET)
+            await server.start(set_webhook=False)
+            try:
+                update = message_update(1, FIRST_USER_ID, '/start')
+                statuses = [
+                    *await post_updates(server, [update], secret=None),
+                    *await post_updates(server, [update], secret='wrong'),
+                ]
+            finally:
+                await server.stop()
+            return statuses, server
+
+    statuses, server = run(scenario())
+    assert statuses == [403, 403]
+    assert (server.received, server.rejected) == (0, 2)
+
+def test_webhook_throughput():
+    # Synthetic /start updates from distinct users, posted concurrently, until
+    # every reply has gone out through the Bot API
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + UPDATES)
+
+    async def scenario():
+        request = FakeTelegramRequest(latency=0.01)
+        async with telegram_application(request) as application:
+            server = webhook.WebhookServer(application, listen='127.0.0.1', port=0, secret_token=SECRET)
+            await server.start(set_webhook=False)
+            try:
+                replies = [request.wait_for(user_id, 'Welcome') for user_id in user_ids]
+                started = time.perf_counter()
+                statuses = await post_updates(server, [
+                    message_update(update_id, user_id, '/start') for update_id, user_id in enumerate(user_ids, 1)])
+                await asyncio.wait_for(asyncio.gather(*replies), timeout=30)
+                elapsed = time.perf_counter() - started
+            finally:
+                await server.stop()
+            return statuses, elapsed, server
+
+    statuses, elapsed, server = run(scenario())
+    print(f"webhook: {UPDATES} updates in {elapsed:.2f}s ({UPDATES / elapsed:.0f} updates/s)")
+    assert statuses == [200] * UPDATES
+    assert (server.received, server.rejected) == (UPDATES, 0)
+    # Replies are sent side by side rather than one Bot API round trip each
+    assert elapsed < UPDATES * 0.01 / 2
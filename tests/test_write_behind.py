@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+from benchmarks.fakes import FakeWorksheet
+from support import run
+from write_behind import WriteBehindQueue
+
+def new_queue(journal_path, worksheet=None):
+    worksheet = worksheet or FakeWorksheet()
+
+    async def get_sheet():
+        return worksheet
+    return WriteBehindQueue(get_sheet, interval=3600, max_pending=1000, journal_path=journal_path)
+
+def test_concurrent_puts_share_journal_syncs(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    syncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: syncs.append(fd) or real_fsync(fd))
+
+    async def scenario():
+        queue = new_queue(journal_path)
+        await asyncio.gather(*(queue.put(row, 2, f"value {row}") for row in range(1, 51)))
+        await queue.close()
+    run(scenario())
+    # One group for the first put, one for the 49 queued while it synced
+    # at most, plus the journal rewrite after the flush
+    assert len(syncs) <= 3
+
+def test_put_returns_once_journaled_and_replays_after_a_crash(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+
+    async def scenario():
+        queue = new_queue(journal_path)
+        await queue.put(1, 2, 'a')
+        await queue.put(3, 2, 'b')
+        await queue.put(1, 2, 'c')
+        # No flush or close: the process "crashes" here
+        queue._loop_task.cancel()
+    run(scenario())
+
+    replayed = new_queue(journal_path)
+    assert replayed.pending == {(1, 2): 'c', (3, 2): 'b'}
+
+def test_flush_writes_one_batch_and_empties_the_journal(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    worksheet = FakeWorksheet()
+
+    async def scenario():
+        queue = new_queue(journal_path, worksheet)
+        for row in range(1, 11):
+            await queue.put(row, 2, str(row))
+        await queue.close()
+    run(scenario())
+    assert worksheet.calls['update_cells'] == 1
+    assert worksheet.cells[(10, 2)] == '10'
+    assert not os.path.exists(journal_path)
+
+def test_journal_sync_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, 'fsync', lambda fd: time.sleep(0.2))
+
+    async def scenario():
+        queue = new_queue(str(tmp_path / 'journal.jsonl'))
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        task = asyncio.ensure_future(ticker())
+        await queue.put(1, 2, 'a')
+        task.cancel()
+        queue._loop_task.cancel()
+        return ticks
+    assert run(scenario()) >= 5
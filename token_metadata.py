@@ -0,0 +1,76 @@
+import logging
+import metrics
+from cache import LRUCache
+from config import TOKEN_METADATA_TTL, CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Best DexScreener pair per token address:
+#   {'chain_id', 'pair_address', 'symbol', 'dex_id', 'liquidity_usd', 'volume_h24'}
+# Pairs change rarely, so entries live much longer than prices and let
+# refreshes query just the chosen pair instead of every pair of the token.
+metadata_cache = LRUCache(TOKEN_METADATA_TTL, CACHE_MAX_ENTRIES)
+metrics.register_source('token_metadata_cache', metadata_cache.stats)
+
+# DexScreener chain ids that GeckoTerminal names differently
+GECKOTERMINAL_NETWORKS = {
+    'ethereum': 'eth',
+    'polygon': 'polygon_pos',
+    'avalanche': 'avax',
+}
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def pair_rank(pair_data):
+    # Deepest liquidity wins; 24h volume breaks ties (and ranks pairs that
+    # report no liquidity at all)
+    return (
+        _number((pair_data.get('liquidity') or {}).get('usd')),
+        _number((pair_data.get('volume') or {}).get('h24')),
+    )
+
+def select_best_pairs(pairs, token_addresses):
+    # The best-ranked priced pair per token among those where it is the base
+    # token (None if there is none), in one pass over a response
+    requested = {address.lower(): address for address in token_addresses}
+    best = dict.fromkeys(token_addresses)
+    for pair_data in pairs:
+        token_address = requested.get(((pair_data.get('baseToken') or {}).get('address') or '').lower())
+        if token_address is None or _number(pair_data.get('priceUsd')) <= 0:
+            continue
+        if best[token_address] is None or pair_rank(pair_data) > pair_rank(best[token_address]):
+            best[token_address] = pair_data
+    return best
+
+def metadata_from_pair(pair_data):
+    liquidity, volume = pair_rank(pair_data)
+    return {
+        'chain_id': pair_data.get('chainId'),
+        'pair_address': pair_data.get('pairAddress'),
+        'symbol': (pair_data.get('baseToken') or {}).get('symbol'),
+        'dex_id': pair_data.get('dexId'),
+        'liquidity_usd': liquidity,
+        'volume_h24': volume,
+    }
+
+def get(token_address):
+    return metadata_cache.peek(token_address)
+
+def remember(token_address, pair_data):
+    metadata = metadata_from_pair(pair_data)
+    if metadata['chain_id'] and metadata['pair_address']:
+        metadata_cache.set(token_address, metadata)
+    return metadata
+
+def forget(token_address):
+    metadata_cache.delete(token_address)
+
+def geckoterminal_network(token_address):
+    metadata = get(token_address)
+    if metadata is None:
+        return None
+    return GECKOTERMINAL_NETWORKS.get(metadata['chain_id'], metadata['chain_id'])
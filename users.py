@@ -0,0 +1,20 @@
+from config import AUTHORIZED_USER_ID, MULTI_USER, ALLOWED_USER_IDS, ADMIN_USER_IDS
+
+ROLE_ADMIN = 'admin'
+ROLE_USER = 'user'
+
+def get_role(user_id):
+    if user_id is None:
+        return None
+    if user_id == AUTHORIZED_USER_ID or user_id in ADMIN_USER_IDS:
+        return ROLE_ADMIN
+    if MULTI_USER and user_id in ALLOWED_USER_IDS:
+        return ROLE_USER
+    return None
+
+def namespace_for(user_id):
+    # The original owner keeps the un-namespaced profiles so existing data
+    # stays theirs when multi-user mode is switched on.
+    if not MULTI_USER or user_id == AUTHORIZED_USER_ID:
+        return None
+    return str(user_id)
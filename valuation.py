@@ -0,0 +1,55 @@
+class Valuation:
+    # One or more portfolios valued together in plain Python lists: one
+    # entry per asset in `profile_index`/`symbols`/`amounts`/`values`, with
+    # `missing` marking assets that have no price (valued at 0). Each column
+    # is built with one comprehension per portfolio.
+
+    def __init__(self, portfolios, token_prices):
+        self.profile_names = list(portfolios)
+        self.profile_index = []
+        self.symbols = []
+        self.amounts = []
+        self.values = []
+        self.missing = []
+        self.profile_totals = [0.0] * len(self.profile_names)
+        self.profile_missing = [0] * len(self.profile_names)
+        for i, portfolio in enumerate(portfolios.values()):
+            assets = portfolio.values()
+            amounts = [asset_data['amount'] for asset_data in assets]
+            prices = [token_prices.get(asset_data['token_address']) for asset_data in assets]
+            values = [0.0 if price is None else amount * price for amount, price in zip(amounts, prices)]
+            missing = [price is None for price in prices]
+            self.profile_index += [i] * len(amounts)
+            self.symbols += portfolio
+            self.amounts += amounts
+            self.values += values
+            self.missing += missing
+            self.profile_totals[i] = sum(values)
+            self.profile_missing[i] = missing.count(True)
+        self.total = sum(self.profile_totals)
+
+        # Share of each asset within its own profile, and of each profile
+        # within the whole set
+        self.allocation = [
+            value / self.profile_totals[i] * 100 if self.profile_totals[i] > 0 else 0.0
+            for i, value in zip(self.profile_index, self.values)
+        ]
+        self.profile_weights = [
+            profile_total / self.total if self.total > 0 else 0.0 for profile_total in self.profile_totals
+        ]
+
+    def rows(self, profile_name=None):
+        # (symbol, amount, value or None, allocation %) per asset, optionally
+        # limited to one profile
+        wanted = None if profile_name is None else self.profile_names.index(profile_name)
+        for i, symbol in enumerate(self.symbols):
+            if wanted is not None and self.profile_index[i] != wanted:
+                continue
+            value = None if self.missing[i] else self.values[i]
+            yield symbol, float(self.amounts[i]), value, self.allocation[i]
+
+def value_portfolio(portfolio, token_prices):
+    return Valuation({None: portfolio}, token_prices)
+
+def value_portfolios(portfolios, token_prices):
+    return Valuation(portfolios, token_prices)
@@ -0,0 +1,79 @@
+import hmac
+import logging
+from aiohttp import web
+from telegram import Update
+from config import (WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+                    MAX_CONCURRENT_UPDATES)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    # Receives updates from Telegram over HTTPS POSTs and hands them to the
+    # application's update queue, where they are processed concurrently up to
+    # the application's concurrent_updates limit.
+
+    def __init__(self, application, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret_token=WEBHOOK_SECRET_TOKEN):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+        self._accepting = False
+        self._runner = None
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def handle_update(self, request):
+        if not self._accepting:
+            # Telegram retries non-2xx deliveries, so nothing is lost while draining
+            return web.Response(status=503)
+        if not self.secret_token or not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret_token):
+            self.rejected += 1
+            logger.warning(f"Rejected webhook request from {request.remote} with an invalid secret token")
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            self.rejected += 1
+            logger.error(f"Invalid webhook payload: {str(e)}")
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        self.received += 1
+        return web.Response()
+
+    async def start(self, set_webhook=True):
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        # Port 0 picks a free port; report the one actually bound
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._accepting = True
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+        if set_webhook:
+            await self.application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + self.path,
+                secret_token=self.secret_token or None,
+                max_connections=max(1, min(MAX_CONCURRENT_UPDATES, 100)),
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"Webhook registered at {WEBHOOK_URL.rstrip('/')}{self.path}")
+
+    async def stop(self):
+        # Stop taking new updates, then close the listener; cleanup() waits for
+        # in-flight requests to finish queueing. Draining the queue itself is
+        # left to Application.stop().
+        self._accepting = False
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        logger.info(f"Webhook server stopped ({self.received} updates received, {self.rejected} rejected)")
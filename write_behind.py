@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import os
+import metrics
+import gspread
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    # Buffers cell writes for a worksheet and flushes them in one batched
+    # update_cells call, either every `interval` seconds or once `max_pending`
+    # distinct cells are waiting. Repeated writes to a cell coalesce into the
+    # latest value. Every accepted write is appended to a local journal before
+    # put() returns, so edits acknowledged to the user survive a crash and are
+    # replayed on the next start. Journal appends run in a worker thread and
+    # are grouped: the writes issued while one append is being synced share
+    # the next one.
+
+    def __init__(self, get_sheet, interval=2.0, max_pending=50, journal_path=None):
+        self.get_sheet = get_sheet
+        self.interval = interval
+        self.max_pending = max_pending
+        self.journal_path = journal_path
+        self.pending = {}
+        self.flushes = 0
+        self.cells_written = 0
+        self.coalesced = 0
+        self.failures = 0
+        self._lock = asyncio.Lock()
+        self._journal_lock = asyncio.Lock()
+        self._journal_entries = []
+        self._journal_task = None
+        self._loop_task = None
+        self._flush_task = None
+        self._replay_journal()
+
+    def _replay_journal(self):
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-append
+                        logger.warning("Ignoring incomplete journal entry")
+                        continue
+                    self.pending[(entry['row'], entry['col'])] = entry['value']
+            if self.pending:
+                logger.info(f"Replaying {len(self.pending)} unflushed cell writes from {self.journal_path}")
+        except Exception as e:
+            logger.error(f"Error reading write journal {self.journal_path}: {str(e)}")
+
+    def _append_journal(self, entries):
+        # Runs in a worker thread
+        with open(self.journal_path, 'a') as f:
+            f.write(''.join(json.dumps({'row': row, 'col': col, 'value': value}) + '\n' for row, col, value in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _write_journal(self):
+        async with self._journal_lock:
+            # Writes queued from here on go into the next group
+            entries, self._journal_entries = self._journal_entries, []
+            self._journal_task = None
+            await asyncio.to_thread(self._append_journal, entries)
+
+    async def _journal(self, row, col, value):
+        if not self.journal_path:
+            return
+        self._journal_entries.append((row, col, value))
+        if self._journal_task is None:
+            self._journal_task = asyncio.ensure_future(self._write_journal())
+        # Shielded: a caller going away must not cancel the append for the
+        # rest of its group
+        await asyncio.shield(self._journal_task)
+
+    def _rewrite_journal(self, pending):
+        # Runs in a worker thread
+        if not pending:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for (row, col), value in pending.items():
+                f.write(json.dumps({'row': row, 'col': col, 'value': value}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def get(self, row, col):
+        return self.pending.get((row, col))
+
+    async def put(self, row, col, value):
+        # Queued before it is journaled: a flush that starts in between only
+        # leaves a redundant journal line, never a write missing from both
+        if (row, col) in self.pending:
+            self.coalesced += 1
+        self.pending[(row, col)] = value
+        self._ensure_running()
+        if len(self.pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self._flush_quietly())
+        await self._journal(row, col, value)
+
+    def _ensure_running(self):
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush_quietly()
+
+    async def _flush_quietly(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing pending sheet writes, will retry: {str(e)}")
+
+    async def flush(self):
+        async with self._lock:
+            if not self.pending:
+                return 0
+            batch = self.pending
+            self.pending = {}
+            try:
+                sheet = await self.get_sheet()
+                cells = [gspread.Cell(row, col, value) for (row, col), value in batch.items()]
+                with metrics.timer('sheets.flush'):
+                    await sheet.update_cells(cells, value_input_option='RAW')
+            except Exception:
+                self.failures += 1
+                # Put the batch back without clobbering anything written since
+                for key, value in batch.items():
+                    self.pending.setdefault(key, value)
+                raise
+            self.flushes += 1
+            self.cells_written += len(batch)
+            if self.journal_path:
+                async with self._journal_lock:
+                    await asyncio.to_thread(self._rewrite_journal, dict(self.pending))
+            logger.info(f"Flushed {len(batch)} cell writes to Google Sheet")
+            return len(batch)
+
+    async def close(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+    def stats(self):
+        return {
+            'pending': len(self.pending),
+            'flushes': self.flushes,
+            'cells_written': self.cells_written,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+        }